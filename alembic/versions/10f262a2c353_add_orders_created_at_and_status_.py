@@ -0,0 +1,35 @@
+"""add orders created_at and status created_at index
+
+Revision ID: 10f262a2c353
+Revises: 14ae685d781d
+Create Date: 2026-10-18 20:15:59.166557
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '10f262a2c353'
+down_revision: Union[str, None] = '14ae685d781d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing orders get the migration time; their real creation time was never recorded
+    with op.batch_alter_table("orders") as batch_op:
+        batch_op.add_column(
+            sa.Column("created_at", sa.DateTime(), nullable=False, server_default=sa.func.current_timestamp())
+        )
+    with op.batch_alter_table("orders") as batch_op:
+        batch_op.alter_column("created_at", existing_type=sa.DateTime(), server_default=None)
+    op.create_index("ix_orders_status_created_at", "orders", ["status", "created_at"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_orders_status_created_at", table_name="orders")
+    with op.batch_alter_table("orders") as batch_op:
+        batch_op.drop_column("created_at")
@@ -0,0 +1,116 @@
+"""move order line items to order_items table
+
+Revision ID: 166dff9ea904
+Revises: 3c8f27f61f41
+Create Date: 2026-10-18 20:04:16.786416
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+BATCH_SIZE = 1000
+
+orders = sa.table("orders", sa.column("id", sa.Integer), sa.column("products", sa.JSON))
+products = sa.table("products", sa.column("id", sa.Integer), sa.column("price", sa.Float))
+order_items = sa.table(
+    "order_items",
+    sa.column("id", sa.Integer),
+    sa.column("order_id", sa.Integer),
+    sa.column("product_id", sa.Integer),
+    sa.column("quantity", sa.Integer),
+    sa.column("unit_price", sa.Float),
+)
+
+# revision identifiers, used by Alembic.
+revision: str = '166dff9ea904'
+down_revision: Union[str, None] = '3c8f27f61f41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "order_items",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("order_id", sa.Integer(), nullable=False),
+        sa.Column("product_id", sa.Integer(), nullable=False),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.Column("unit_price", sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(["order_id"], ["orders.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["product_id"], ["products.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_order_items_order_id"), "order_items", ["order_id"], unique=False)
+    op.create_index(op.f("ix_order_items_product_id"), "order_items", ["product_id"], unique=False)
+    backfill_order_items(op.get_bind())
+    with op.batch_alter_table("orders") as batch_op:
+        batch_op.drop_column("products")
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("orders") as batch_op:
+        batch_op.add_column(sa.Column("products", sa.JSON(), nullable=True))
+    rebuild_order_products(op.get_bind())
+    with op.batch_alter_table("orders") as batch_op:
+        batch_op.alter_column("products", existing_type=sa.JSON(), nullable=False)
+    op.drop_index(op.f("ix_order_items_product_id"), table_name="order_items")
+    op.drop_index(op.f("ix_order_items_order_id"), table_name="order_items")
+    op.drop_table("order_items")
+
+
+def iter_order_batches(connection, *columns):
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(orders.c.id, *columns).where(orders.c.id > last_id).order_by(orders.c.id).limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield rows
+
+
+def backfill_order_items(connection):
+    """Copy the JSON line items into order_items, one batch of orders at a time.
+
+    Historical unit prices were never stored, so the current product price is used as the
+    snapshot. Lines referring to products that no longer exist are dropped.
+    """
+    for rows in iter_order_batches(connection, orders.c.products):
+        lines = [(order_id, line) for order_id, order_products in rows for line in order_products or []]
+        product_ids = {line["product_id"] for _, line in lines}
+        prices = dict(
+            connection.execute(sa.select(products.c.id, products.c.price).where(products.c.id.in_(product_ids))).all()
+        )
+        items = [
+            {
+                "order_id": order_id,
+                "product_id": line["product_id"],
+                "quantity": line["quantity"],
+                "unit_price": prices[line["product_id"]],
+            }
+            for order_id, line in lines
+            if line["product_id"] in prices
+        ]
+        if items:
+            connection.execute(order_items.insert(), items)
+
+
+def rebuild_order_products(connection):
+    for rows in iter_order_batches(connection):
+        order_ids = [order_id for order_id, in rows]
+        order_products = {order_id: [] for order_id in order_ids}
+        items = connection.execute(
+            sa.select(order_items.c.order_id, order_items.c.product_id, order_items.c.quantity)
+            .where(order_items.c.order_id.in_(order_ids))
+            .order_by(order_items.c.id)
+        ).all()
+        for order_id, product_id, quantity in items:
+            order_products[order_id].append({"product_id": product_id, "quantity": quantity})
+        connection.execute(
+            orders.update().where(orders.c.id == sa.bindparam("order_id")).values(products=sa.bindparam("products")),
+            [{"order_id": order_id, "products": lines} for order_id, lines in order_products.items()],
+        )
@@ -0,0 +1,26 @@
+"""add unique index on product name
+
+Revision ID: 3c8f27f61f41
+Revises: 91cbdbd440b4
+Create Date: 2026-10-18 20:03:20.313209
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c8f27f61f41'
+down_revision: Union[str, None] = '91cbdbd440b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Fails if the table already holds duplicate names; those must be renamed first.
+    op.create_index(op.f("ix_products_name"), "products", ["name"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_products_name"), table_name="products")
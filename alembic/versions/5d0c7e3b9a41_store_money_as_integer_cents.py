@@ -0,0 +1,45 @@
+"""store money as integer cents
+
+Revision ID: 5d0c7e3b9a41
+Revises: a520e506d939
+Create Date: 2026-10-18 20:24:37.402118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d0c7e3b9a41'
+down_revision: Union[str, None] = 'a520e506d939'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (table, float column, cents column)
+MONEY_COLUMNS = [
+    ("products", "price", "price_cents"),
+    ("orders", "total_price", "total_price_cents"),
+    ("order_items", "unit_price", "unit_price_cents"),
+]
+
+
+def upgrade() -> None:
+    for table, amount, cents in MONEY_COLUMNS:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column(cents, sa.BigInteger(), nullable=True))
+        op.execute(f"UPDATE {table} SET {cents} = CAST(ROUND({amount} * 100) AS BIGINT)")
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column(cents, existing_type=sa.BigInteger(), nullable=False)
+            batch_op.drop_column(amount)
+
+
+def downgrade() -> None:
+    for table, amount, cents in MONEY_COLUMNS:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column(amount, sa.Float(), nullable=True))
+        op.execute(f"UPDATE {table} SET {amount} = {cents} / 100.0")
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column(amount, existing_type=sa.Float(), nullable=False)
+            batch_op.drop_column(cents)
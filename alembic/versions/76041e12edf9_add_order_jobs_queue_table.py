@@ -0,0 +1,41 @@
+"""add order_jobs queue table
+
+Revision ID: 76041e12edf9
+Revises: 10f262a2c353
+Create Date: 2026-10-18 20:17:46.418853
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '76041e12edf9'
+down_revision: Union[str, None] = '10f262a2c353'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "order_jobs",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("order_id", sa.Integer(), nullable=False),
+        sa.Column("status", sa.String(length=16), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("available_at", sa.DateTime(), nullable=False),
+        sa.Column("last_error", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["order_id"], ["orders.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_order_jobs_order_id"), "order_jobs", ["order_id"], unique=False)
+    op.create_index("ix_order_jobs_status_available_at", "order_jobs", ["status", "available_at"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_order_jobs_status_available_at", table_name="order_jobs")
+    op.drop_index(op.f("ix_order_jobs_order_id"), table_name="order_jobs")
+    op.drop_table("order_jobs")
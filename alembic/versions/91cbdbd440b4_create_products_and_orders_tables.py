@@ -0,0 +1,50 @@
+"""create products and orders tables
+
+Revision ID: 91cbdbd440b4
+Revises: 
+Create Date: 2026-10-18 20:03:19.423704
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '91cbdbd440b4'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Baseline schema; databases created before migrations existed should be
+    # stamped with this revision instead of upgraded through it.
+    op.create_table(
+        "products",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("description", sa.String(), nullable=True),
+        sa.Column("price", sa.Float(), nullable=False),
+        sa.Column("stock", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_products_id"), "products", ["id"], unique=False)
+    op.create_table(
+        "orders",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("products", sa.JSON(), nullable=False),
+        sa.Column("total_price", sa.Float(), nullable=False),
+        sa.Column("status", sa.Enum("pending", "completed", name="orderstatus"), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_orders_id"), "orders", ["id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_orders_id"), table_name="orders")
+    op.drop_table("orders")
+    op.drop_index(op.f("ix_products_id"), table_name="products")
+    op.drop_table("products")
+    sa.Enum(name="orderstatus").drop(op.get_bind(), checkfirst=True)
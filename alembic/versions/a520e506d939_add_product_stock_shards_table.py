@@ -0,0 +1,38 @@
+"""add product_stock_shards table
+
+Revision ID: a520e506d939
+Revises: 76041e12edf9
+Create Date: 2026-10-18 20:20:14.770573
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a520e506d939'
+down_revision: Union[str, None] = '76041e12edf9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "product_stock_shards",
+        sa.Column("product_id", sa.Integer(), nullable=False),
+        sa.Column("shard", sa.Integer(), nullable=False),
+        sa.Column("stock", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["product_id"], ["products.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("product_id", "shard"),
+    )
+
+
+def downgrade() -> None:
+    # Fold sharded stock back into products.stock before dropping the counters
+    op.execute(
+        "UPDATE products SET stock = stock + COALESCE("
+        "(SELECT SUM(stock) FROM product_stock_shards WHERE product_stock_shards.product_id = products.id), 0)"
+    )
+    op.drop_table("product_stock_shards")
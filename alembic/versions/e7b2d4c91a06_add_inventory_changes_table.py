@@ -0,0 +1,42 @@
+"""add inventory_changes table
+
+Revision ID: e7b2d4c91a06
+Revises: c3f1a9d27e58
+Create Date: 2026-10-18 20:38:05.113472
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7b2d4c91a06'
+down_revision: Union[str, None] = 'c3f1a9d27e58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "inventory_changes",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("product_id", sa.Integer(), nullable=False),
+        sa.Column("order_id", sa.Integer(), nullable=True),
+        sa.Column("reason", sa.String(length=16), nullable=False),
+        sa.Column("delta", sa.Integer(), nullable=False),
+        sa.Column("stock", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["order_id"], ["orders.id"], ondelete="SET NULL"),
+        sa.ForeignKeyConstraint(["product_id"], ["products.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_inventory_changes_created_at"), "inventory_changes", ["created_at"], unique=False)
+    op.create_index(op.f("ix_inventory_changes_product_id"), "inventory_changes", ["product_id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_inventory_changes_product_id"), table_name="inventory_changes")
+    op.drop_index(op.f("ix_inventory_changes_created_at"), table_name="inventory_changes")
+    op.drop_table("inventory_changes")
@@ -0,0 +1,42 @@
+"""order inventory changes by commit
+
+Revision ID: f4c9a2e7b318
+Revises: e7b2d4c91a06
+Create Date: 2026-10-18 22:14:37.402915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4c9a2e7b318'
+down_revision: Union[str, None] = 'e7b2d4c91a06'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        # SQLite serializes writers, so ids already follow commit order; AUTOINCREMENT keeps
+        # the id of a purged newest change from being handed out again
+        with op.batch_alter_table(
+            "inventory_changes", recreate="always", table_kwargs={"sqlite_autoincrement": True}
+        ):
+            pass
+        return
+    # Every change of a transaction gets that transaction's id, see src.changes
+    op.execute("ALTER TABLE inventory_changes ADD COLUMN txid bigint NOT NULL DEFAULT txid_current()")
+    op.execute("CREATE INDEX ix_inventory_changes_txid_id ON inventory_changes (txid, id)")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        with op.batch_alter_table(
+            "inventory_changes", recreate="always", table_kwargs={"sqlite_autoincrement": False}
+        ):
+            pass
+        return
+    op.drop_index("ix_inventory_changes_txid_id", table_name="inventory_changes")
+    op.drop_column("inventory_changes", "txid")
@@ -0,0 +1,76 @@
+"""Compare product ingestion throughput: one create_product per row vs the bulk import path.
+
+Usage: python -m benchmarks.bench_bulk_import [--rows 200000] [--single-rows 2000] [--batch-size 1000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from db import Base
+from src.service import ProductService
+
+
+def make_rows(count, prefix):
+    return [
+        {"name": f"{prefix} {i}", "description": f"Supplier item {i}", "price": i * 0.5, "stock": i % 100}
+        for i in range(count)
+    ]
+
+
+def fresh_session_factory(directory, name):
+    engine = create_engine(f"sqlite:///{os.path.join(directory, name)}")
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)
+
+
+def run_single(session_factory, rows):
+    service = ProductService()
+    session = session_factory()
+    start = time.perf_counter()
+    for row in rows:
+        service.create_product(session, **row)
+    elapsed = time.perf_counter() - start
+    session.close()
+    return elapsed
+
+
+def run_bulk(session_factory, rows, batch_size):
+    service = ProductService()
+    session = session_factory()
+    start = time.perf_counter()
+    for offset in range(0, len(rows), batch_size):
+        inserted, errors = service.import_products(session, rows[offset:offset + batch_size], offset)
+        assert not errors, errors[:3]
+    elapsed = time.perf_counter() - start
+    session.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200000, help="rows loaded through the bulk path")
+    parser.add_argument("--single-rows", type=int, default=2000, help="rows loaded one request at a time")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        single = run_single(fresh_session_factory(directory, "single.db"), make_rows(args.single_rows, "Single"))
+        bulk = run_bulk(fresh_session_factory(directory, "bulk.db"), make_rows(args.rows, "Bulk"), args.batch_size)
+
+    single_rate = args.single_rows / single
+    bulk_rate = args.rows / bulk
+    print(f"{'path':>14} {'rows':>8} {'seconds':>8} {'rows/s':>10}")
+    print(f"{'create_product':>14} {args.single_rows:>8} {single:>8.2f} {single_rate:>10.0f}")
+    print(f"{'bulk import':>14} {args.rows:>8} {bulk:>8.2f} {bulk_rate:>10.0f}")
+    print(f"speedup: {bulk_rate / single_rate:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
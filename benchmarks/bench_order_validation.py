@@ -0,0 +1,58 @@
+"""Compare per-line validation cost of order bodies: CreateOrderRequest vs the one-pass parser.
+
+Usage: python -m benchmarks.bench_order_validation [--sizes 10 1000 10000] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import orjson
+
+from src.request import CreateOrderRequest, OrderLines, parse_order_request
+
+
+def make_body(lines):
+    # Every tenth line repeats an earlier product, as merged B2B baskets often do
+    products = [{"product_id": (i if i % 10 else i // 10) + 1, "quantity": i % 7 + 1} for i in range(lines)]
+    return orjson.dumps({"status": "pending", "products": products})
+
+
+def model_path(body):
+    order = CreateOrderRequest.parse_obj(orjson.loads(body))
+    return OrderLines.from_products(order.products)
+
+
+def fast_path(body):
+    _, lines = parse_order_request(orjson.loads(body))
+    return lines
+
+
+def best_of(function, body, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(body)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'lines':>8} {'model us/line':>14} {'one-pass us/line':>17} {'speedup':>8}")
+    for size in args.sizes:
+        body = make_body(size)
+        assert model_path(body).quantities == fast_path(body).quantities
+        model = best_of(model_path, body, args.repeat)
+        fast = best_of(fast_path, body, args.repeat)
+        print(f"{size:>8} {model / size * 1e6:>14.2f} {fast / size * 1e6:>17.2f} {model / fast:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Time ranked product search over a seeded catalog, first page and following pages.
+
+Usage: python -m benchmarks.bench_search [--products 1000000] [--queries 200] [--database-url URL]
+
+The scratch database is migrated to head, so on PostgreSQL searches run against the
+search_vector GIN index and the name trigram index; that is the path sized for large
+catalogs. SQLite runs through the in-process inverted index, whose build time is reported
+separately and is paid again after every catalog write.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from alembic import command
+from alembic.config import Config as AlembicConfig
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from db import Base
+from src.model import Product
+from src.request import ProductSearchRequest
+from src.search import ProductSearchService, search_index
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+ADJECTIVES = ["red", "blue", "green", "wooden", "steel", "cotton", "leather", "compact", "vintage", "outdoor"]
+NOUNS = ["lamp", "desk", "chair", "shoe", "shirt", "table", "kettle", "backpack", "jacket", "shelf"]
+QUERIES = ["lamp", "red sho", "wooden tab", "steel kettle 42", "vintage leather jacket", "backp"]
+
+
+def seed(url, products, batch_size=10000):
+    engine = create_engine(url)
+    Base.metadata.drop_all(engine)
+    with engine.begin() as connection:
+        connection.exec_driver_sql("DROP TABLE IF EXISTS alembic_version")
+    alembic_config = AlembicConfig(os.path.join(ROOT, "alembic.ini"))
+    alembic_config.set_main_option("script_location", os.path.join(ROOT, "alembic"))
+    alembic_config.set_main_option("sqlalchemy.url", url)
+    command.upgrade(alembic_config, "head")
+
+    generator = random.Random(0)
+    with engine.begin() as connection:
+        for offset in range(0, products, batch_size):
+            connection.execute(insert(Product.__table__), [
+                {
+                    "name": f"{generator.choice(ADJECTIVES).title()} {generator.choice(NOUNS)} {i}",
+                    "description": f"{generator.choice(ADJECTIVES)} {generator.choice(NOUNS)} for everyday use",
+                    "price": 1.0,
+                    "stock": 1,
+                }
+                for i in range(offset, min(offset + batch_size, products))
+            ])
+    return sessionmaker(bind=engine)
+
+
+def percentile(timings, fraction):
+    return sorted(timings)[min(len(timings) - 1, int(len(timings) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=200, help="timed searches per query string")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--database-url", help="scratch database, dropped and recreated")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        url = args.database_url or f"sqlite:///{os.path.join(directory, 'search.db')}"
+        session_factory = seed(url, args.products)
+        service = ProductSearchService(index_max_age=3600)
+
+        with session_factory() as session:
+            if session.get_bind().dialect.name != "postgresql":
+                start = time.perf_counter()
+                service.search(session, ProductSearchRequest(q="warm up"))
+                print(f"in-process index built in {time.perf_counter() - start:.2f}s")
+
+            print(f"{'query':>24} {'page':>5} {'p50 ms':>8} {'p95 ms':>8}")
+            for query in QUERIES:
+                for page in ("first", "next"):
+                    request = ProductSearchRequest(q=query, limit=args.limit)
+                    if page == "next":
+                        _, cursor = service.search(session, request)
+                        if cursor is None:
+                            continue
+                        request = ProductSearchRequest(q=query, limit=args.limit, cursor=cursor)
+                    timings = []
+                    for _ in range(args.queries):
+                        start = time.perf_counter()
+                        service.search(session, request)
+                        timings.append((time.perf_counter() - start) * 1000)
+                    print(f"{query:>24} {page:>5} {statistics.median(timings):>8.2f} {percentile(timings, 0.95):>8.2f}")
+        search_index.clear()
+
+
+if __name__ == "__main__":
+    main()
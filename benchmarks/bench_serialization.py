@@ -0,0 +1,73 @@
+"""Compare the marshmallow/JSONResponse product list path with the column/orjson path.
+
+Usage: python -m benchmarks.bench_serialization [--sizes 1000 10000 100000] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from db import Base
+from src.model import Product
+from src.schema import ProductSchema
+from src.service import ProductService
+
+
+def seed_catalog(size):
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(
+            insert(Product),
+            [
+                {"name": f"Product {i}", "description": f"Description of product {i}", "price": i * 0.25, "stock": i % 50}
+                for i in range(size)
+            ],
+        )
+    return sessionmaker(bind=engine)
+
+
+def marshmallow_path(session):
+    products = session.query(Product).all()
+    return JSONResponse(content=ProductSchema(many=True).dump(products)).body
+
+
+def fast_path(session):
+    products = ProductService().get_all_products(session)
+    return ORJSONResponse(content=products).body
+
+
+def best_of(fn, session_factory, repeat):
+    timings = []
+    for _ in range(repeat):
+        session = session_factory()
+        start = time.perf_counter()
+        body = fn(session)
+        timings.append(time.perf_counter() - start)
+        session.close()
+    return min(timings), body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'products':>10} {'marshmallow ms':>15} {'fast path ms':>13} {'speedup':>8} {'identical':>10}")
+    for size in args.sizes:
+        session_factory = seed_catalog(size)
+        slow, slow_body = best_of(marshmallow_path, session_factory, args.repeat)
+        fast, fast_body = best_of(fast_path, session_factory, args.repeat)
+        print(f"{size:>10} {slow * 1000:>15.1f} {fast * 1000:>13.1f} {slow / fast:>7.1f}x {str(slow_body == fast_body):>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Compare order throughput on one hot product with its stock in 1, 4 or 16 shards.
+
+Usage: python -m benchmarks.bench_stock_shards [--shards 1 4 16] [--threads 32] [--orders 2000] [--database-url URL]
+
+Shards only pay off where concurrent row locks do, so point --database-url at a scratch
+PostgreSQL database. SQLite serialises every writer on the whole file and shows no scaling.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from db import Base
+from src.exception import OrderValidationError
+from src.inventory import StockShardService
+from src.model import Product
+from src.service import OrderService
+
+
+class Line:
+    def __init__(self, product_id, quantity):
+        self.product_id = product_id
+        self.quantity = quantity
+
+
+def fresh_session_factory(url, threads):
+    engine = create_engine(url, pool_size=threads, max_overflow=0, pool_timeout=60)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)
+
+
+def run(session_factory, shards, threads, orders):
+    with session_factory() as session:
+        session.add(Product(id=1, name="Hot item", price=10.0, stock=orders))
+        session.flush()
+        if shards > 1:
+            StockShardService().shard_product(session, 1, shards)
+        session.commit()
+
+    per_thread = orders // threads
+    failed = []
+
+    def place_orders():
+        service = OrderService()
+        for _ in range(per_thread):
+            with session_factory() as session:
+                try:
+                    service.create_order(session, status="pending", products=[Line(1, 1)])
+                except OrderValidationError:
+                    failed.append(1)
+
+    workers = [threading.Thread(target=place_orders) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return per_thread * threads, len(failed), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--database-url", help="scratch database, dropped and recreated for every run")
+    args = parser.parse_args()
+    os.environ["STOCK_SHARDING"] = "true"
+
+    print(f"{'shards':>6} {'orders':>7} {'failed':>7} {'seconds':>8} {'orders/s':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        for shards in args.shards:
+            url = args.database_url or f"sqlite:///{os.path.join(directory, f'shards{shards}.db')}"
+            placed, failed, elapsed = run(fresh_session_factory(url, args.threads), shards, args.threads, args.orders)
+            print(f"{shards:>6} {placed:>7} {failed:>7} {elapsed:>8.2f} {placed / elapsed:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
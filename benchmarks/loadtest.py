@@ -0,0 +1,377 @@
+"""Load-test harness for the store API.
+
+Generates (or records) a JSONL traffic mix, replays it against main:app in-process or
+against a running server, and reports latency percentiles and throughput per route.
+
+    python -m benchmarks.loadtest generate --requests 5000 --mix list=60,order=30,create=5,batch=5 \
+        --output benchmarks/traffic.jsonl
+    python -m benchmarks.loadtest run --traffic benchmarks/traffic.jsonl --catalog-size 10000 \
+        --concurrency 32 --processes 2 --output results.json
+    python -m benchmarks.loadtest compare baseline.json results.json --threshold 10
+
+`run` seeds a fresh SQLite database (or --database-url, e.g. a scratch PostgreSQL database)
+with a deterministic catalog before replaying. --url replays against a running server
+instead of the in-process app; the server's database is then left untouched.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import math
+import multiprocessing
+import os
+import queue
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import httpx
+from sqlalchemy import insert
+from starlette.datastructures import Headers
+
+DEFAULT_MIX = {"list": 60, "order": 30, "create": 5, "batch": 5}
+
+
+def generate_traffic(count, mix, catalog_size, seed):
+    """Build a deterministic list of request entries for the given {kind: weight} mix."""
+    rng = random.Random(seed)
+    kinds, weights = zip(*mix.items())
+    entries = []
+    for index in range(count):
+        kind = rng.choices(kinds, weights)[0]
+        entries.append(TRAFFIC_KINDS[kind](rng, index, catalog_size))
+    return entries
+
+
+def _list_entry(rng, index, catalog_size):
+    after_id = rng.randrange(max(catalog_size - 100, 1))
+    return {"method": "GET", "path": f"/products?limit=100&after_id={after_id}", "body": None}
+
+
+def _order_lines(rng, catalog_size):
+    product_ids = rng.sample(range(1, catalog_size + 1), k=min(rng.randint(1, 5), catalog_size))
+    return [{"product_id": product_id, "quantity": 1} for product_id in product_ids]
+
+
+def _order_entry(rng, index, catalog_size):
+    body = {"status": "pending", "products": _order_lines(rng, catalog_size)}
+    return {"method": "POST", "path": "/orders", "body": body}
+
+
+def _batch_entry(rng, index, catalog_size):
+    orders = [{"status": "pending", "products": _order_lines(rng, catalog_size)} for _ in range(10)]
+    return {"method": "POST", "path": "/orders/batch", "body": {"orders": orders}}
+
+
+def _create_entry(rng, index, catalog_size):
+    body = {"name": f"Load test product {index}-{rng.getrandbits(32)}", "description": "Load test", "price": 9.99, "stock": 100}
+    return {"method": "POST", "path": "/products", "body": body}
+
+
+TRAFFIC_KINDS = {
+    "list": _list_entry,
+    "order": _order_entry,
+    "batch": _batch_entry,
+    "create": _create_entry,
+}
+
+
+def write_traffic(path, entries):
+    with open(path, "w") as traffic_file:
+        for entry in entries:
+            traffic_file.write(json.dumps(entry) + "\n")
+
+
+def read_traffic(path):
+    with open(path) as traffic_file:
+        return [json.loads(line) for line in traffic_file if line.strip()]
+
+
+def recorded_entry(scope, body):
+    """Traffic entry for a request seen by TrafficRecorder.
+
+    JSON bodies are stored decoded, as generated traffic is. Any other body (forms, uploads,
+    malformed JSON) is stored base64 encoded with its Content-Type and replayed byte for byte.
+    """
+    path = scope["path"] + (f"?{scope['query_string'].decode()}" if scope["query_string"] else "")
+    entry = {"method": scope["method"], "path": path, "body": None}
+    if not body:
+        return entry
+    content_type = Headers(scope=scope).get("content-type")
+    if content_type is None or "json" in content_type:
+        try:
+            entry["body"] = json.loads(body)
+            return entry
+        except ValueError:
+            pass
+    entry["body_base64"] = base64.b64encode(body).decode()
+    if content_type is not None:
+        entry["content_type"] = content_type
+    return entry
+
+
+def request_options(entry):
+    """httpx.request keyword arguments replaying an entry's body."""
+    if "body_base64" not in entry:
+        return {"json": entry["body"]}
+    headers = {"Content-Type": entry["content_type"]} if "content_type" in entry else {}
+    return {"content": base64.b64decode(entry["body_base64"]), "headers": headers}
+
+
+class TrafficRecorder:
+    """ASGI middleware appending every request it sees to a JSONL traffic file for replay.
+
+    Lines go through a queue to a writer thread, so recording adds no file I/O to the event
+    loop of the requests it records. Call close() to write out what is still queued.
+    """
+
+    def __init__(self, app, path):
+        self.app = app
+        self.path = path
+        self._lines = queue.SimpleQueue()
+        self._writer = threading.Thread(target=self._write_lines, name="traffic-recorder", daemon=True)
+        self._writer.start()
+
+    def _write_lines(self):
+        with open(self.path, "a") as traffic_file:
+            while True:
+                line = self._lines.get()
+                if line is None:
+                    return
+                traffic_file.write(line)
+                if self._lines.empty():
+                    traffic_file.flush()
+
+    def close(self):
+        self._lines.put(None)
+        self._writer.join()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        chunks = []
+
+        async def recording_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                chunks.append(message.get("body", b""))
+            return message
+
+        await self.app(scope, recording_receive, send)
+        self._lines.put(json.dumps(recorded_entry(scope, b"".join(chunks))) + "\n")
+
+
+def seed_catalog(database_url, size, seed):
+    from db import Base, create_db_engine
+    from src.model import Product
+
+    engine = create_db_engine(database_url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    rng = random.Random(seed)
+    with engine.begin() as connection:
+        for offset in range(0, size, 5000):
+            connection.execute(
+                insert(Product.__table__),
+                [
+                    {
+                        "name": f"Product {i}",
+                        "description": f"Seeded product {i}",
+                        "price": round(rng.uniform(1, 500), 2),
+                        "stock": 1_000_000,
+                    }
+                    for i in range(offset, min(offset + 5000, size))
+                ],
+            )
+    engine.dispose()
+
+
+def build_app(database_url):
+    """main:app with its engine, sessions and background jobs pointed at the benchmark database."""
+    from db import reset_engines
+    from main import app
+
+    os.environ["DATABASE_URL"] = database_url
+    reset_engines()
+    return app
+
+
+def route_of(entry):
+    return f"{entry['method']} {urlsplit(entry['path']).path}"
+
+
+async def replay(entries, concurrency, app=None, url=None):
+    """Replay entries with `concurrency` clients; returns (route, status, seconds) samples."""
+    transport = httpx.ASGITransport(app=app) if app is not None else None
+    samples = []
+    next_index = 0
+
+    async with httpx.AsyncClient(transport=transport, base_url=url or "http://loadtest", timeout=60) as client:
+        async def worker():
+            nonlocal next_index
+            while next_index < len(entries):
+                entry = entries[next_index]
+                next_index += 1
+                start = time.perf_counter()
+                try:
+                    response = await client.request(entry["method"], entry["path"], **request_options(entry))
+                    status = response.status_code
+                except httpx.HTTPError:
+                    status = 0
+                samples.append((route_of(entry), status, time.perf_counter() - start))
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples
+
+
+def _run_slice(arguments):
+    entries, concurrency, database_url, url = arguments
+    app = None if url else build_app(database_url)
+    return asyncio.run(replay(entries, concurrency, app=app, url=url))
+
+
+def run_load(entries, concurrency, processes, database_url=None, url=None):
+    """Replay the traffic across `processes` driver processes; returns samples and wall time."""
+    start = time.perf_counter()
+    if processes <= 1:
+        samples = _run_slice((entries, concurrency, database_url, url))
+    else:
+        slices = [(entries[i::processes], concurrency, database_url, url) for i in range(processes)]
+        with multiprocessing.get_context("spawn").Pool(processes) as pool:
+            samples = [sample for result in pool.map(_run_slice, slices) for sample in result]
+    return samples, time.perf_counter() - start
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    # Nearest-rank percentile
+    index = min(len(sorted_values), max(1, math.ceil(fraction * len(sorted_values)))) - 1
+    return sorted_values[index]
+
+
+def summarize(samples, elapsed):
+    by_route = defaultdict(list)
+    for route, status, seconds in samples:
+        by_route[route].append((status, seconds))
+    report = {"elapsed_seconds": elapsed, "requests": len(samples), "throughput_rps": len(samples) / elapsed, "routes": {}}
+    for route, route_samples in sorted(by_route.items()):
+        latencies = sorted(seconds * 1000 for _, seconds in route_samples)
+        statuses = defaultdict(int)
+        for status, _ in route_samples:
+            statuses[str(status)] += 1
+        report["routes"][route] = {
+            "requests": len(route_samples),
+            "throughput_rps": len(route_samples) / elapsed,
+            "p50_ms": percentile(latencies, 0.50),
+            "p95_ms": percentile(latencies, 0.95),
+            "p99_ms": percentile(latencies, 0.99),
+            "statuses": dict(statuses),
+        }
+    return report
+
+
+def print_report(report):
+    print(f"{report['requests']} requests in {report['elapsed_seconds']:.2f}s ({report['throughput_rps']:.0f} req/s)")
+    print(f"{'route':<22} {'count':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  statuses")
+    for route, stats in report["routes"].items():
+        print(
+            f"{route:<22} {stats['requests']:>7} {stats['throughput_rps']:>8.1f} {stats['p50_ms']:>8.2f} "
+            f"{stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f}  {stats['statuses']}"
+        )
+
+
+def compare_reports(baseline, current, threshold):
+    """Return (lines, regressed) comparing p95 latency and throughput per route."""
+    lines = [f"{'route':<22} {'p95 base':>9} {'p95 now':>9} {'change':>8} {'rps base':>9} {'rps now':>9} {'change':>8}"]
+    regressed = False
+    for route in sorted(set(baseline["routes"]) | set(current["routes"])):
+        if route not in baseline["routes"] or route not in current["routes"]:
+            lines.append(f"{route:<22} only in {'current' if route in current['routes'] else 'baseline'} run")
+            continue
+        base, now = baseline["routes"][route], current["routes"][route]
+        p95_change = (now["p95_ms"] - base["p95_ms"]) / base["p95_ms"] * 100 if base["p95_ms"] else 0.0
+        rps_change = (now["throughput_rps"] - base["throughput_rps"]) / base["throughput_rps"] * 100
+        flag = ""
+        if p95_change > threshold or rps_change < -threshold:
+            regressed = True
+            flag = "  REGRESSION"
+        lines.append(
+            f"{route:<22} {base['p95_ms']:>9.2f} {now['p95_ms']:>9.2f} {p95_change:>+7.1f}% "
+            f"{base['throughput_rps']:>9.1f} {now['throughput_rps']:>9.1f} {rps_change:>+7.1f}%{flag}"
+        )
+    return lines, regressed
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in TRAFFIC_KINDS:
+            raise argparse.ArgumentTypeError(f"unknown traffic kind {kind}, expected one of {', '.join(TRAFFIC_KINDS)}")
+        mix[kind] = int(weight or 1)
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test harness for the store API")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate = commands.add_parser("generate", help="write a synthetic traffic mix to a JSONL file")
+    generate.add_argument("--requests", type=int, default=5000)
+    generate.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX)
+    generate.add_argument("--catalog-size", type=int, default=10000)
+    generate.add_argument("--seed", type=int, default=0)
+    generate.add_argument("--output", default="benchmarks/traffic.jsonl")
+
+    run = commands.add_parser("run", help="seed a catalog and replay a traffic file")
+    run.add_argument("--traffic", default="benchmarks/traffic.jsonl")
+    run.add_argument("--catalog-size", type=int, default=10000)
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--concurrency", type=int, default=16, help="concurrent clients per driver process")
+    run.add_argument("--processes", type=int, default=1, help="driver processes")
+    run.add_argument("--database-url", help="scratch database to seed (default: a temporary SQLite file)")
+    run.add_argument("--url", help="replay against a running server instead of the in-process app")
+    run.add_argument("--output", help="write the JSON report here")
+
+    compare = commands.add_parser("compare", help="compare two run reports")
+    compare.add_argument("baseline")
+    compare.add_argument("current")
+    compare.add_argument("--threshold", type=float, default=10.0, help="allowed regression in percent")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        write_traffic(args.output, generate_traffic(args.requests, args.mix, args.catalog_size, args.seed))
+        print(f"wrote {args.requests} requests to {args.output}")
+        return 0
+
+    if args.command == "compare":
+        with open(args.baseline) as baseline_file, open(args.current) as current_file:
+            lines, regressed = compare_reports(json.load(baseline_file), json.load(current_file), args.threshold)
+        print("\n".join(lines))
+        return 1 if regressed else 0
+
+    entries = read_traffic(args.traffic)
+    with tempfile.TemporaryDirectory() as directory:
+        database_url = args.database_url or f"sqlite:///{os.path.join(directory, 'loadtest.db')}"
+        if not args.url:
+            seed_catalog(database_url, args.catalog_size, args.seed)
+        samples, elapsed = run_load(entries, args.concurrency, args.processes, database_url, args.url)
+    report = summarize(samples, elapsed)
+    report["config"] = {key: getattr(args, key) for key in ("catalog_size", "seed", "concurrency", "processes")}
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,108 @@
 import json
-from pydantic import BaseModel
+import os
+from functools import lru_cache
+from typing import List, Literal, Optional
+from pydantic import BaseModel, validator
 
 
 class Config(BaseModel):
     DATABASE_URL: str
+    # Connection pool tuning (sqlalchemy QueuePool)
+    POOL_SIZE: int = 10
+    POOL_MAX_OVERFLOW: int = 20
+    POOL_TIMEOUT: float = 30
+    POOL_RECYCLE: int = 1800
+    POOL_PRE_PING: bool = True
+    # Open POOL_SIZE connections at startup so the first requests skip the connect cost
+    POOL_WARMUP: bool = True
+    # Read replicas for catalog reads (comma separated in an environment variable); replicas
+    # lagging more than REPLICA_MAX_LAG seconds are skipped until the next health check, and a
+    # client that wrote reads from the primary for READ_YOUR_WRITES_WINDOW seconds afterwards
+    REPLICA_DATABASE_URLS: List[str] = []
+    REPLICA_MAX_LAG: float = 5
+    REPLICA_HEALTH_CHECK_INTERVAL: float = 10
+    READ_YOUR_WRITES_WINDOW: float = 15
+    # Opt-in async stack; ASYNC_DATABASE_URL defaults to DATABASE_URL with an async driver
+    USE_ASYNC_DB: bool = False
+    ASYNC_DATABASE_URL: Optional[str] = None
+    # Catalog read cache: "memory" (per process), "redis" (shared) or "none"
+    CACHE_BACKEND: Literal["memory", "redis", "none"] = "memory"
+    CACHE_MAX_SIZE: int = 1024
+    CACHE_TTL: float = 30
+    REDIS_URL: Optional[str] = None
+    # Rows validated, checked for duplicates and inserted per round-trip by POST /products/bulk
+    BULK_IMPORT_BATCH_SIZE: int = 1000
+    # Idempotency-Key responses are replayed for this long, then purged in the background
+    IDEMPOTENCY_TTL: int = 86400
+    IDEMPOTENCY_CACHE_SIZE: int = 10000
+    IDEMPOTENCY_CLEANUP_INTERVAL: int = 300
+    # gzip (or brotli, when installed) for responses of at least COMPRESSION_MINIMUM_SIZE bytes
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MINIMUM_SIZE: int = 1024
+    # POST /orders and /orders/batch: lines per order and request body size accepted
+    ORDER_MAX_LINES: int = 10000
+    ORDER_MAX_BODY_BYTES: int = 2 * 1024 * 1024
+    # Request timing/SQL instrumentation behind /metrics; when off neither middleware nor engine hooks are installed
+    METRICS_ENABLED: bool = True
+    # A request executing the same statement this many times is logged as a likely N+1 pattern
+    METRICS_N_PLUS_ONE_THRESHOLD: int = 20
+    # Lets hot products keep their stock in several counter rows (python -m src.inventory);
+    # fold shards back with `unshard` before turning this off or their stock becomes invisible
+    STOCK_SHARDING: bool = False
+    # Inventory change feed (GET /inventory/changes, /inventory/stream); python -m src.changes purge
+    # drops changes older than the retention. The stream sends low_stock events at
+    # LOW_STOCK_THRESHOLD unless overridden
+    INVENTORY_CHANGE_RETENTION_DAYS: float = 7
+    INVENTORY_STREAM_POLL_INTERVAL: float = 1.0
+    INVENTORY_STREAM_HEARTBEAT_INTERVAL: float = 15
+    LOW_STOCK_THRESHOLD: int = 10
+    # Orders are created pending and completed by python -m src.worker through this queue;
+    # "memory" is per process (tests, local runs) and is worked by threads inside the API process
+    ORDER_QUEUE_BACKEND: Literal["database", "memory"] = "database"
+    ORDER_JOB_MAX_ATTEMPTS: int = 5
+    WORKER_CONCURRENCY: int = 4
+    WORKER_BATCH_SIZE: int = 10
+    WORKER_POLL_INTERVAL: float = 1.0
+    # python -m server; SERVER_WORKERS = 0 starts one worker per CPU, each with its own pool
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8005
+    SERVER_WORKERS: int = 1
+    SERVER_KEEP_ALIVE: int = 5
+    SERVER_ACCESS_LOG: bool = True
+    # Seconds in-flight requests get to finish after SIGTERM before connections are dropped
+    SERVER_GRACEFUL_TIMEOUT: float = 30
 
+    @validator("REPLICA_DATABASE_URLS", pre=True)
+    def split_replica_urls(cls, value):
+        if isinstance(value, str):
+            return [url.strip() for url in value.split(",") if url.strip()]
+        return value
 
 
+
+@lru_cache(maxsize=None)
 def get_config():
-    with open("env.json") as json_env_file:
-        env_config = json.load(json_env_file)
+    """Settings from env.json (or the file named by ENV_FILE), overridden by environment variables.
+
+    Loaded on first use and cached; call get_config.cache_clear() to pick up changes.
+    """
+    env_config = {}
+    env_file = os.environ.get("ENV_FILE", "env.json")
+    if os.path.exists(env_file):
+        with open(env_file) as json_env_file:
+            env_config = json.load(json_env_file)
+    for name in Config.__fields__:
+        if name in os.environ:
+            env_config[name] = os.environ[name]
     config_data = Config(**env_config)
     return config_data
 
 
-config: Config = get_config()
+class LazyConfig:
+    """Stand-in for the settings object that defers loading them to the first attribute access."""
+
+    def __getattr__(self, name):
+        return getattr(get_config(), name)
+
+
+config: Config = LazyConfig()
@@ -1,8 +1,405 @@
-from sqlalchemy import create_engine
+import logging
+import os
+import threading
+import time
+from functools import lru_cache
+
+from sqlalchemy import Select, create_engine, event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.ext.declarative import declarative_base
-from config import config
+from sqlalchemy.pool import QueuePool
+from starlette.requests import Request
+from config import config, get_config
+from src.metrics import instrument_engine
 Base = declarative_base()
+logger = logging.getLogger(__name__)
+
+
+class PoolMetrics:
+    """Counters for connection pool checkouts and the time spent waiting for them."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.connects = 0
+            self.checkouts = 0
+            self.checkins = 0
+            self.checked_out = 0
+            self.timeouts = 0
+            self.connect_errors = 0
+            self.wait_count = 0
+            self.wait_seconds_total = 0.0
+            self.wait_seconds_max = 0.0
+
+    def record_wait(self, seconds, timed_out=False, connect_failed=False):
+        with self._lock:
+            self.wait_count += 1
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+            if connect_failed:
+                self.connect_errors += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "checked_out": self.checked_out,
+                "timeouts": self.timeouts,
+                "connect_errors": self.connect_errors,
+                "wait_count": self.wait_count,
+                "wait_seconds_total": self.wait_seconds_total,
+                "wait_seconds_max": self.wait_seconds_max,
+            }
+
+
+pool_metrics = PoolMetrics()
+
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool that reports how long callers block waiting for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        timed_out = connect_failed = False
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            timed_out = True
+            raise
+        except Exception:
+            # The pool had room but opening a new connection failed (unreachable server, auth, ...)
+            connect_failed = True
+            raise
+        finally:
+            pool_metrics.record_wait(time.perf_counter() - start, timed_out, connect_failed)
+
+
+def create_db_engine(database_url, **overrides):
+    options = dict(
+        poolclass=MeteredQueuePool,
+        pool_size=config.POOL_SIZE,
+        max_overflow=config.POOL_MAX_OVERFLOW,
+        pool_timeout=config.POOL_TIMEOUT,
+        pool_recycle=config.POOL_RECYCLE,
+        pool_pre_ping=config.POOL_PRE_PING,
+    )
+    options.update(overrides)
+    db_engine = create_engine(database_url, **options)
+    _register_pool_events(db_engine)
+    if config.METRICS_ENABLED:
+        instrument_engine(db_engine)
+    return db_engine
+
+
+def _register_pool_events(db_engine):
+    @event.listens_for(db_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        with pool_metrics._lock:
+            pool_metrics.connects += 1
+
+    @event.listens_for(db_engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        with pool_metrics._lock:
+            pool_metrics.checkouts += 1
+            pool_metrics.checked_out += 1
+
+    @event.listens_for(db_engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        with pool_metrics._lock:
+            pool_metrics.checkins += 1
+            pool_metrics.checked_out -= 1
+
+
+def warm_up_pool(db_engine, connections):
+    """Open `connections` pooled connections up front so the first requests skip the connect cost."""
+    held = []
+    try:
+        for _ in range(connections):
+            connection = db_engine.connect()
+            connection.exec_driver_sql("SELECT 1")
+            held.append(connection)
+    finally:
+        for connection in held:
+            connection.close()
+
+
+@lru_cache(maxsize=None)
+def get_engine():
+    """This process's engine, created on first use rather than at import."""
+    return create_db_engine(config.DATABASE_URL)
+
+
+REPLICA_LAG_QUERY = (
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() "
+    "THEN 0 ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+def replica_lag(db_engine):
+    """Seconds the replica's replay is behind its primary (0 for databases without replication)."""
+    with db_engine.connect() as connection:
+        if connection.dialect.name == "postgresql":
+            return float(connection.exec_driver_sql(REPLICA_LAG_QUERY).scalar() or 0)
+        connection.exec_driver_sql("SELECT 1")
+        return 0.0
+
+
+class ReplicaSet:
+    """Round-robin over the read replicas that passed their last health check.
+
+    Replicas are re-checked at most every `check_interval` seconds, by whichever request
+    notices the check is due; one that cannot be reached or lags more than `max_lag`
+    seconds is skipped until a later check finds it healthy again.
+    """
+
+    def __init__(self, engines, max_lag, check_interval):
+        self.engines = engines
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._check_lock = threading.Lock()
+        self._healthy = list(engines)
+        self._next = 0
+        self._checked_at = None
+
+    def pick(self):
+        """Next healthy replica engine, or None when reads must go to the primary."""
+        self._check_if_due()
+        with self._lock:
+            if not self._healthy:
+                return None
+            replica = self._healthy[self._next % len(self._healthy)]
+            self._next += 1
+            return replica
+
+    def check(self):
+        healthy = [replica for replica in self.engines if self._is_healthy(replica)]
+        with self._lock:
+            self._healthy = healthy
+            self._checked_at = time.monotonic()
+        return healthy
+
+    def _check_if_due(self):
+        checked_at = self._checked_at
+        if checked_at is not None and time.monotonic() - checked_at < self.check_interval:
+            return
+        if self._check_lock.acquire(blocking=False):
+            try:
+                self.check()
+            finally:
+                self._check_lock.release()
+
+    def _is_healthy(self, replica):
+        try:
+            lag = replica_lag(replica)
+        except Exception:
+            logger.warning("Read replica %s failed its health check", replica.url, exc_info=True)
+            return False
+        if lag > self.max_lag:
+            logger.warning("Read replica %s is %.1fs behind, routing reads to other servers", replica.url, lag)
+            return False
+        return True
+
+    def dispose(self, close=True):
+        for replica in self.engines:
+            replica.dispose(close=close)
+
+
+@lru_cache(maxsize=None)
+def get_replica_set():
+    """Replicas from REPLICA_DATABASE_URLS, or None when none are configured."""
+    if not config.REPLICA_DATABASE_URLS:
+        return None
+    return ReplicaSet(
+        [create_db_engine(url) for url in config.REPLICA_DATABASE_URLS],
+        max_lag=config.REPLICA_MAX_LAG,
+        check_interval=config.REPLICA_HEALTH_CHECK_INTERVAL,
+    )
+
+
+class RoutingSession(Session):
+    """Session that sends plain SELECTs to the replica stored in info["replica"], if any.
+
+    Flushes, DML, text() statements and SELECT ... FOR UPDATE always use the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        replica = self.info.get("replica")
+        if (
+            replica is not None
+            and not self._flushing
+            and isinstance(clause, Select)
+            and clause._for_update_arg is None
+        ):
+            return replica
+        return super().get_bind(mapper=mapper, clause=clause, **kw)
+
+
+@lru_cache(maxsize=None)
+def get_session_factory():
+    return sessionmaker(bind=get_engine(), class_=RoutingSession)
+
+
+def get_session():
+    """FastAPI dependency yielding a session scoped to a single request."""
+    session: Session = get_session_factory()()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+READ_PRIMARY_COOKIE = "read_primary_until"
+
+
+def wrote_recently(cookies):
+    """Whether the client made a write recent enough that a replica may not have it yet."""
+    try:
+        return float(cookies.get(READ_PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def remember_write(response):
+    """Pin the client's reads to the primary for READ_YOUR_WRITES_WINDOW seconds."""
+    if config.REPLICA_DATABASE_URLS:
+        window = config.READ_YOUR_WRITES_WINDOW
+        response.set_cookie(READ_PRIMARY_COOKIE, str(time.time() + window), max_age=int(window) + 1, httponly=True)
+    return response
+
+
+def get_read_session(request: Request):
+    """Like get_session, but SELECTs go to a healthy replica unless this client wrote recently."""
+    session: Session = get_session_factory()()
+    replicas = get_replica_set()
+    if replicas is not None and not wrote_recently(request.cookies):
+        session.info["replica"] = replicas.pick()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def to_async_url(database_url):
+    """Swap the sync DBAPI driver of a database URL for its asyncio counterpart."""
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend} databases")
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+def create_async_db_engine(database_url, **overrides):
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    options = dict(
+        pool_size=config.POOL_SIZE,
+        max_overflow=config.POOL_MAX_OVERFLOW,
+        pool_timeout=config.POOL_TIMEOUT,
+        pool_recycle=config.POOL_RECYCLE,
+        pool_pre_ping=config.POOL_PRE_PING,
+    )
+    options.update(overrides)
+    db_engine = create_async_engine(database_url, **options)
+    if config.METRICS_ENABLED:
+        instrument_engine(db_engine.sync_engine)
+    return db_engine
+
+
+@lru_cache(maxsize=None)
+def get_async_engine():
+    """This process's async engine, or None when USE_ASYNC_DB is off."""
+    if not config.USE_ASYNC_DB:
+        return None
+    return create_async_db_engine(config.ASYNC_DATABASE_URL or to_async_url(config.DATABASE_URL))
+
+
+@lru_cache(maxsize=None)
+def get_async_session_factory():
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    async_engine = get_async_engine()
+    if async_engine is None:
+        return None
+    return async_sessionmaker(bind=async_engine, expire_on_commit=False)
+
+
+async def warm_up_async_pool(db_engine, connections):
+    held = []
+    try:
+        for _ in range(connections):
+            connection = await db_engine.connect()
+            await connection.exec_driver_sql("SELECT 1")
+            held.append(connection)
+    finally:
+        for connection in held:
+            await connection.close()
+
+
+def reset_engines():
+    """Forget this process's engines (and the cached settings) so the next use rebuilds them.
+
+    Lets tests and benchmarks point the app at another database, e.g. after changing DATABASE_URL.
+    """
+    _drop_engines(close=True)
+    get_config.cache_clear()
+
+
+def _drop_engines(close):
+    if get_engine.cache_info().currsize:
+        get_engine().dispose(close=close)
+    if get_async_engine.cache_info().currsize and get_async_engine() is not None:
+        get_async_engine().sync_engine.dispose(close=close)
+    if get_replica_set.cache_info().currsize and get_replica_set() is not None:
+        get_replica_set().dispose(close=close)
+    for factory in (get_engine, get_session_factory, get_async_engine, get_async_session_factory, get_replica_set):
+        factory.cache_clear()
+
+
+def _dispose_pools_after_fork():
+    # A forked child must never reuse the parent's sockets; drop the pooled connections
+    # without closing them so the parent's copies stay usable, the child builds its own engine
+    _drop_engines(close=False)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_dispose_pools_after_fork)
+
+
+async def get_async_session():
+    """FastAPI dependency yielding an AsyncSession scoped to a single request."""
+    session_factory = get_async_session_factory()
+    if session_factory is None:
+        raise RuntimeError("Async database access is disabled, set USE_ASYNC_DB to enable it")
+    async with session_factory() as session:
+        yield session
+
+
+_LAZY_ATTRIBUTES = {
+    "engine": get_engine,
+    "SessionLocal": get_session_factory,
+    "async_engine": get_async_engine,
+    "AsyncSessionLocal": get_async_session_factory,
+}
+
 
-engine = create_engine(config.DATABASE_URL)
-SESSION: Session = sessionmaker(bind=engine)()
\ No newline at end of file
+def __getattr__(name):
+    # db.engine, db.SessionLocal, ... used to be built at import; they now resolve on first use
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,6 +1,15 @@
+import threading
+
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from src.router import router as store_router
+from src.async_router import router as async_store_router
 from fastapi.middleware.cors import CORSMiddleware
+from config import config
+from db import get_async_engine, get_engine, warm_up_async_pool, warm_up_pool
+from src.compression import CompressionMiddleware
+from src.limits import BodySizeLimitMiddleware
+from src.metrics import MetricsMiddleware
 
 import uvicorn
 
@@ -12,4 +21,53 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(
+    BodySizeLimitMiddleware, max_size=config.ORDER_MAX_BODY_BYTES, paths=["/orders", "/orders/batch"]
+)
+if config.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+if config.COMPRESSION_ENABLED:
+    # Outermost, so compression time is left out of the request timings
+    app.add_middleware(CompressionMiddleware, minimum_size=config.COMPRESSION_MINIMUM_SIZE)
+if config.USE_ASYNC_DB:
+    # Async handlers take precedence; routes they do not cover fall through to the sync router
+    app.include_router(async_store_router, tags=["E-COMMERCE"])
 app.include_router(store_router, tags=["E-COMMERCE"])
+
+
+@app.on_event("startup")
+async def warm_up_pools():
+    if config.POOL_WARMUP:
+        await run_in_threadpool(warm_up_pool, get_engine(), config.POOL_SIZE)
+        async_engine = get_async_engine()
+        if async_engine is not None:
+            await warm_up_async_pool(async_engine, config.POOL_SIZE)
+
+
+# Stops the in-process order workers started for the memory queue backend
+order_workers_stop = threading.Event()
+
+
+@app.on_event("startup")
+async def start_order_workers():
+    # The memory queue only exists inside this process, so it is worked from here;
+    # the database queue is worked by separate python -m src.worker processes
+    if config.ORDER_QUEUE_BACKEND == "memory":
+        from src.worker import start_workers
+
+        order_workers_stop.clear()
+        start_workers(config.WORKER_CONCURRENCY, order_workers_stop)
+
+
+@app.on_event("shutdown")
+async def stop_order_workers():
+    order_workers_stop.set()
+
+
+@app.on_event("shutdown")
+async def close_pools():
+    # Runs after the server has drained in-flight requests
+    get_engine().dispose()
+    async_engine = get_async_engine()
+    if async_engine is not None:
+        await async_engine.dispose()
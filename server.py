@@ -0,0 +1,77 @@
+"""Production entry point: python -m server [--workers N] [--host HOST] [--port PORT]"""
+import argparse
+import importlib.util
+import logging
+import os
+import threading
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class GracefulServer(uvicorn.Server):
+    """uvicorn server that stops waiting for in-flight requests once the drain timeout expires."""
+
+    def __init__(self, uvicorn_config, graceful_timeout):
+        super().__init__(uvicorn_config)
+        self.graceful_timeout = graceful_timeout
+
+    def handle_exit(self, sig, frame):
+        if not self.should_exit:
+            # uvicorn stops accepting connections and waits for open ones to finish their
+            # responses; this bounds that wait so a stuck client cannot block the shutdown
+            timer = threading.Timer(self.graceful_timeout, self._force_exit)
+            timer.daemon = True
+            timer.start()
+        super().handle_exit(sig, frame)
+
+    def _force_exit(self):
+        if self.server_state.connections:
+            logger.warning(
+                "Drain timeout of %ss reached, closing %d open connections",
+                self.graceful_timeout, len(self.server_state.connections),
+            )
+        self.force_exit = True
+
+
+def worker_count(workers):
+    return workers if workers > 0 else os.cpu_count() or 1
+
+
+def build_uvicorn_config(host, port, workers):
+    return uvicorn.Config(
+        "main:app",
+        host=host,
+        port=port,
+        workers=workers,
+        loop="uvloop" if importlib.util.find_spec("uvloop") else "asyncio",
+        http="httptools" if importlib.util.find_spec("httptools") else "h11",
+        proxy_headers=True,
+        timeout_keep_alive=config.SERVER_KEEP_ALIVE,
+        access_log=config.SERVER_ACCESS_LOG,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the store API with production settings")
+    parser.add_argument("--host", default=config.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=config.SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=config.SERVER_WORKERS, help="0 = one per CPU")
+    args = parser.parse_args(argv)
+
+    uvicorn_config = build_uvicorn_config(args.host, args.port, worker_count(args.workers))
+    server = GracefulServer(uvicorn_config, graceful_timeout=config.SERVER_GRACEFUL_TIMEOUT)
+    if uvicorn_config.workers > 1:
+        # Workers are spawned, so each one imports main and builds its own engine and pool
+        sock = uvicorn_config.bind_socket()
+        Multiprocess(uvicorn_config, target=server.run, sockets=[sock]).run()
+    else:
+        server.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import logging
+from typing import Optional
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, Request
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.service import ProductService, OrderService, IdempotencyService
+from src.request import CreateProductRequest, ProductQueryRequest, ProductFormat, query_params
+from src.request import ORDER_BODY_OPENAPI, order_body
+from config import config
+from db import get_async_session, remember_write
+from src.jobs import get_order_queue
+from src.model import OrderStatus
+from src.cache import get_catalog_cache, get_idempotency_cache
+from src.changes import InventoryChangeService
+from src.compression import etag_matches, strong_etag
+from src.exception import OrderValidationError,ProductNameDuplicateError
+from src.exception import IdempotencyKeyConflictError, IdempotencyKeyInUseError
+from src.router import _replay_response, purge_idempotency_keys
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+@router.get("/products")
+async def get_all_products_async(request: Request, args: ProductQueryRequest = Depends(query_params(ProductQueryRequest)), SESSION: AsyncSession = Depends(get_async_session)):
+    try:
+        version = await SESSION.run_sync(InventoryChangeService().catalog_version)
+        headers = {"ETag": strong_etag(f"{version}:products:{args.json()}")}
+        if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+        if args.format == ProductFormat.ndjson:
+            return StreamingResponse(
+                ProductService().stream_products_async(SESSION=SESSION, filters=args),
+                media_type="application/x-ndjson",
+                headers=headers,
+            )
+        products, next_after_id = await ProductService(cache=get_catalog_cache()).get_products_page_async(
+            SESSION=SESSION, filters=args, version=version
+        )
+        if next_after_id is not None:
+            headers["X-Next-Cursor"] = str(next_after_id)
+        return ORJSONResponse(status_code=200, content=products, headers=headers)
+    except Exception as e:
+        logger.exception("Failed to list products")
+        await SESSION.rollback()
+        return ORJSONResponse(status_code=500, content=str(e))
+
+
+@router.post("/products")
+async def create_product_async(args: CreateProductRequest, SESSION: AsyncSession = Depends(get_async_session)):
+    try:
+        new_product = await ProductService(cache=get_catalog_cache()).create_product_async(
+            SESSION=SESSION,
+            name=args.name,
+            description=args.description,
+            price=args.price,
+            stock=args.stock,
+        )
+        return remember_write(ORJSONResponse(status_code=200, content=new_product))
+    except ProductNameDuplicateError as e:
+        await SESSION.rollback()
+        return ORJSONResponse(status_code=409, content=str(e.message))
+    except Exception as e:
+        logger.exception("Failed to create product")
+        await SESSION.rollback()
+        return ORJSONResponse(status_code=500, content=str(e))
+
+
+@router.post("/orders", openapi_extra=ORDER_BODY_OPENAPI)
+async def create_order_async(
+    background_tasks: BackgroundTasks,
+    body: tuple = Depends(order_body),
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+    SESSION: AsyncSession = Depends(get_async_session),
+):
+    status, lines = body
+    idempotency_service = IdempotencyService(cache=get_idempotency_cache(), ttl=config.IDEMPOTENCY_TTL)
+    idempotency = None
+    try:
+        if idempotency_key is not None:
+            request_hash = idempotency_service.hash_request({"status": status, "products": lines.as_dicts()})
+            replay = await SESSION.run_sync(idempotency_service.get_response, idempotency_key, request_hash)
+            if replay is not None:
+                return _replay_response(replay)
+            idempotency = (idempotency_service, idempotency_key, request_hash)
+            if IdempotencyService.purge_due(config.IDEMPOTENCY_CLEANUP_INTERVAL):
+                background_tasks.add_task(purge_idempotency_keys)
+        await OrderService(cache=get_catalog_cache(), queue=get_order_queue()).create_order_async(
+            SESSION=SESSION, status=OrderStatus.pending.value, products=lines, idempotency=idempotency
+        )
+        return remember_write(ORJSONResponse(status_code=200, content=OrderService.CREATED_RESPONSE))
+    except IdempotencyKeyConflictError as e:
+        await SESSION.rollback()
+        return ORJSONResponse(status_code=422, content=str(e.message))
+    except IdempotencyKeyInUseError as e:
+        replay = await SESSION.run_sync(idempotency_service.get_response, idempotency_key, idempotency[2])
+        if replay is not None:
+            return _replay_response(replay)
+        return ORJSONResponse(status_code=409, content=str(e.message))
+    except OrderValidationError as e:
+        await SESSION.rollback()
+        return ORJSONResponse(status_code=409, content=str(e.message))
+    except Exception as e:
+        logger.exception("Failed to create order")
+        await SESSION.rollback()
+        return ORJSONResponse(status_code=500, content=str(e))
@@ -0,0 +1,175 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+import orjson
+
+from config import config
+
+
+class CacheStats:
+    """Hit/miss/eviction counters shared by the cache backends."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.expirations = 0
+            self.invalidations = 0
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+class LRUTTLCache:
+    """In-process cache bounded by entry count, evicting least recently used entries first."""
+
+    def __init__(self, max_size, ttl, stats=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stats = stats or CacheStats()
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._counters = {}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.stats.incr("expirations")
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats.incr("evictions")
+
+    def get_counter(self, key):
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def incr_counter(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            # Entries written under older counter values can never be read again
+            self._entries.clear()
+            return self._counters[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisCache:
+    """Cache stored in Redis (or anything exposing get/set(ex=)/incr), shared across workers."""
+
+    def __init__(self, client, ttl, prefix="ecommerce:", stats=None):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.stats = stats or CacheStats()
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return None if value is None else orjson.loads(value)
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, orjson.dumps(value), ex=max(1, int(self.ttl)))
+
+    def get_counter(self, key):
+        return int(self.client.get(self.prefix + key) or 0)
+
+    def incr_counter(self, key):
+        return int(self.client.incr(self.prefix + key))
+
+
+class CatalogCache:
+    """Read-through cache for catalog reads.
+
+    Keys are namespaced by a catalog version that writers bump, so invalidation is a
+    single counter increment and entries loaded before a write are never served after it.
+    """
+
+    VERSION_KEY = "catalog:version"
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.stats = backend.stats
+
+    @property
+    def version(self):
+        return self.backend.get_counter(self.VERSION_KEY)
+
+    def get_or_load(self, key, loader):
+        namespaced_key, value = self._lookup(key)
+        if value is None:
+            value = loader()
+            self.backend.set(namespaced_key, value)
+        return value
+
+    async def get_or_load_async(self, key, loader):
+        """get_or_load for a coroutine loader; backend calls run in a thread, as Redis blocks."""
+        namespaced_key, value = await asyncio.to_thread(self._lookup, key)
+        if value is None:
+            value = await loader()
+            await asyncio.to_thread(self.backend.set, namespaced_key, value)
+        return value
+
+    def _lookup(self, key):
+        namespaced_key = f"catalog:{self.version}:{key}"
+        value = self.backend.get(namespaced_key)
+        self.stats.incr("hits" if value is not None else "misses")
+        return namespaced_key, value
+
+    def invalidate(self):
+        self.stats.incr("invalidations")
+        return self.backend.incr_counter(self.VERSION_KEY)
+
+
+def create_catalog_cache():
+    if config.CACHE_BACKEND == "none":
+        return None
+    if config.CACHE_BACKEND == "redis":
+        import redis
+
+        client = redis.Redis.from_url(config.REDIS_URL)
+        return CatalogCache(RedisCache(client, ttl=config.CACHE_TTL))
+    return CatalogCache(LRUTTLCache(max_size=config.CACHE_MAX_SIZE, ttl=config.CACHE_TTL))
+
+
+@lru_cache(maxsize=None)
+def get_catalog_cache():
+    """The process-wide catalog cache (None when CACHE_BACKEND is "none"), built on first use."""
+    return create_catalog_cache()
+
+
+@lru_cache(maxsize=None)
+def get_idempotency_cache():
+    # Fast path for Idempotency-Key replays; entries are only written for committed responses
+    return LRUTTLCache(max_size=config.IDEMPOTENCY_CACHE_SIZE, ttl=config.IDEMPOTENCY_TTL)
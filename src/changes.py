@@ -0,0 +1,251 @@
+"""Inventory change feed: python -m src.changes purge --days N
+
+Product creation (single and bulk) and order placement append one inventory_changes row per
+product whose stock they change, in the same transaction as the change itself. Consumers
+follow the log by id through GET /inventory/changes?since= or the /inventory/stream
+Server-Sent Events stream instead of re-reading the catalog.
+
+Consumers must see the changes in the order they became visible. SQLite serializes writers,
+so ids follow commit order. On PostgreSQL ids come from a sequence and a transaction can
+commit id 11 after another one already committed id 12, so every row also records the id of
+the transaction that wrote it (a txid column, PostgreSQL only). Changes are read in (txid, id)
+order and only up to the oldest transaction still in progress: nothing committed later can
+sort before what was already returned, however long a write transaction runs.
+"""
+import argparse
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+
+import orjson
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import BigInteger, DateTime, delete, func, insert, literal, literal_column, select, tuple_
+
+from config import config
+from src.inventory import total_stock
+from src.model import InventoryChange, OrderItem, Product
+
+logger = logging.getLogger(__name__)
+
+changes_table = InventoryChange.__table__
+products_table = Product.__table__
+items_table = OrderItem.__table__
+
+# Column and index created by migration on PostgreSQL only and not declared on the model
+CHANGE_LOG_SCHEMA_OBJECTS = frozenset({"txid", "ix_inventory_changes_txid_id"})
+
+CHANGE_COLUMNS = (
+    changes_table.c.id,
+    changes_table.c.product_id,
+    changes_table.c.order_id,
+    changes_table.c.reason,
+    changes_table.c.delta,
+    changes_table.c.stock,
+    changes_table.c.created_at,
+)
+
+
+def created_change(stock):
+    """Log row for a new product, saved along with it through Product.inventory_changes."""
+    return InventoryChange(reason=InventoryChange.CREATED, delta=stock, stock=stock)
+
+
+def available_stock():
+    return total_stock() if config.STOCK_SHARDING else products_table.c.stock
+
+
+def record_created(SESSION, names):
+    """Log the creation of the products just inserted under these names."""
+    SESSION.execute(
+        insert(changes_table).from_select(
+            ["product_id", "reason", "delta", "stock", "created_at"],
+            select(
+                products_table.c.id,
+                literal(InventoryChange.CREATED),
+                products_table.c.stock,
+                products_table.c.stock,
+                literal(datetime.utcnow(), DateTime),
+            ).where(products_table.c.name.in_(names)),
+        )
+    )
+
+
+def record_order(SESSION, order_id):
+    """Log the stock an order took, from its just written items.
+
+    One INSERT ... SELECT, so the stock after the change is read by the database in the
+    same statement however many lines the order has.
+    """
+    SESSION.execute(
+        insert(changes_table).from_select(
+            ["product_id", "order_id", "reason", "delta", "stock", "created_at"],
+            select(
+                items_table.c.product_id,
+                items_table.c.order_id,
+                literal(InventoryChange.ORDERED),
+                -items_table.c.quantity,
+                available_stock(),
+                literal(datetime.utcnow(), DateTime),
+            )
+            .join(products_table, products_table.c.id == items_table.c.product_id)
+            .where(items_table.c.order_id == order_id)
+            .order_by(items_table.c.product_id),
+        )
+    )
+
+
+def is_low_stock(change, threshold):
+    """Whether the change took the product to threshold or below (or created it there)."""
+    if change["stock"] > threshold:
+        return False
+    return change["reason"] == InventoryChange.CREATED or change["stock"] - change["delta"] > threshold
+
+
+def format_event(event, data, event_id=None):
+    lines = [] if event_id is None else [f"id: {event_id}"]
+    lines.append(f"event: {event}")
+    lines.append("data: " + orjson.dumps(data).decode())
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+def txid(table):
+    return literal_column(f"{table.name}.txid", BigInteger)
+
+
+def committed_horizon():
+    """Oldest transaction still in progress; every txid below it has finished."""
+    return func.txid_snapshot_xmin(func.txid_current_snapshot())
+
+
+class InventoryChangeService:
+    def list_changes(self, SESSION, since, limit):
+        """Return up to limit changes after change `since`, in the order they were committed."""
+        query = select(*CHANGE_COLUMNS)
+        if SESSION.get_bind().dialect.name == "postgresql":
+            # A `since` that was purged (or 0) resolves to no txid and reads from the start
+            previous = changes_table.alias("previous")
+            since_txid = select(txid(previous)).where(previous.c.id == since).scalar_subquery()
+            query = query.where(
+                txid(changes_table) < committed_horizon(),
+                tuple_(txid(changes_table), changes_table.c.id) > tuple_(func.coalesce(since_txid, 0), since),
+            ).order_by(txid(changes_table), changes_table.c.id)
+        else:
+            query = query.where(changes_table.c.id > since).order_by(changes_table.c.id)
+        return [dict(row._mapping) for row in SESSION.execute(query.limit(limit))]
+
+    def _last_committed(self, SESSION):
+        """(txid, id) of the last change in commit order below the horizon, or None."""
+        return SESSION.execute(
+            select(txid(changes_table), changes_table.c.id)
+            .where(txid(changes_table) < committed_horizon())
+            .order_by(txid(changes_table).desc(), changes_table.c.id.desc())
+            .limit(1)
+        ).first()
+
+    def latest_id(self, SESSION):
+        """Id of the last committed change, to follow the log from its current end."""
+        if SESSION.get_bind().dialect.name != "postgresql":
+            return SESSION.execute(select(func.max(changes_table.c.id))).scalar() or 0
+        last = self._last_committed(SESSION)
+        return 0 if last is None else last.id
+
+    def catalog_version(self, SESSION):
+        """Value that changes whenever a committed catalog write becomes visible.
+
+        Every write that changes what the catalog shows appends to this log. On PostgreSQL a
+        change committed ahead of an older open transaction is visible before the horizon
+        reaches it, so the changes beyond the last committed one are counted too; that set
+        only grows until the horizon moves on.
+        """
+        if SESSION.get_bind().dialect.name != "postgresql":
+            return str(self.latest_id(SESSION))
+        last = self._last_committed(SESSION)
+        after = (0, 0) if last is None else tuple(last)
+        beyond = SESSION.execute(
+            select(func.count()).select_from(changes_table).where(
+                tuple_(txid(changes_table), changes_table.c.id) > tuple_(*after)
+            )
+        ).scalar()
+        return f"{after[1]}+{beyond}"
+
+    def _read(self, session_factory, since, limit):
+        SESSION = session_factory()
+        try:
+            return self.list_changes(SESSION, since, limit)
+        finally:
+            SESSION.close()
+
+    async def stream(self, session_factory, since, low_stock_threshold, low_stock_only, is_disconnected,
+                     poll_interval=1.0, heartbeat_interval=15.0, batch_size=500):
+        """Yield Server-Sent Events for the changes after `since` until the client disconnects.
+
+        Each change is an "inventory_change" event, followed by a "low_stock" event when it
+        took the product to low_stock_threshold or below. The last event of a change carries
+        its id, so a reconnecting client resumes after it through Last-Event-ID.
+        """
+        # Sent right away so the client sees the stream open before the first change
+        yield f"retry: {int(poll_interval * 1000)}\n\n".encode()
+        last_sent = time.monotonic()
+        while not await is_disconnected():
+            # A short-lived session per poll, so an idle stream holds no pooled connection
+            changes = await run_in_threadpool(self._read, session_factory, since, batch_size)
+            events = []
+            for change in changes:
+                low_stock = is_low_stock(change, low_stock_threshold)
+                if not low_stock_only:
+                    events.append(format_event("inventory_change", change, None if low_stock else change["id"]))
+                if low_stock:
+                    events.append(format_event("low_stock", change, change["id"]))
+                since = change["id"]
+            if events:
+                yield b"".join(events)
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= heartbeat_interval:
+                # Comment line that keeps proxies from closing an idle stream
+                yield b": keep-alive\n\n"
+                last_sent = time.monotonic()
+            if len(changes) < batch_size:
+                await asyncio.sleep(poll_interval)
+
+    def purge_older_than(self, SESSION, days, batch_size=10000):
+        """Delete changes older than `days` days in batches; returns the number deleted.
+
+        The last committed change is always kept, so the catalog version never goes back.
+        """
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        latest_id = self.latest_id(SESSION)
+        deleted = 0
+        while True:
+            ids = (
+                select(changes_table.c.id)
+                .where(changes_table.c.created_at < cutoff, changes_table.c.id != latest_id)
+                .limit(batch_size)
+            )
+            result = SESSION.execute(delete(changes_table).where(changes_table.c.id.in_(ids.scalar_subquery())))
+            SESSION.commit()
+            deleted += result.rowcount
+            if result.rowcount < batch_size:
+                return deleted
+
+
+def main(argv=None):
+    from db import get_session_factory
+
+    parser = argparse.ArgumentParser(description="Maintain the inventory change log")
+    commands = parser.add_subparsers(dest="command", required=True)
+    purge = commands.add_parser("purge", help="delete changes older than --days days")
+    purge.add_argument("--days", type=float, default=config.INVENTORY_CHANGE_RETENTION_DAYS)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    SESSION = get_session_factory()()
+    try:
+        deleted = InventoryChangeService().purge_older_than(SESSION, args.days)
+        logger.info("Deleted %d inventory changes older than %s days", deleted, args.days)
+    finally:
+        SESSION.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import hashlib
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # optional, responses fall back to gzip
+    brotli = None
+
+
+class GzipEncoder:
+    name = "gzip"
+
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+    def compress(self, data):
+        # Sync-flush so every streamed chunk reaches the client as soon as it is produced
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data=b""):
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class BrotliEncoder:
+    name = "br"
+
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self, data=b""):
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+def accepted_encodings(accept_encoding):
+    """{coding: q} from an Accept-Encoding header, leaving out codings refused with q=0."""
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted[coding] = quality
+    return accepted
+
+
+def strong_etag(validator):
+    """Quoted strong ETag for a representation identified by the validator string."""
+    return '"' + hashlib.sha256(validator.encode()).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match, etag):
+    """Whether an If-None-Match header matches etag, including the variants sent compressed."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        # Weak comparison, as If-None-Match requires
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        for encoding in (GzipEncoder.name, BrotliEncoder.name):
+            suffix = f'-{encoding}"'
+            if candidate.endswith(suffix):
+                candidate = candidate[: -len(suffix)] + '"'
+                break
+        if candidate == etag:
+            return True
+    return False
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses with brotli (when installed) or gzip.
+
+    Responses smaller than minimum_size, already encoded, of an excluded media type, or sent
+    to clients that accept neither coding pass through untouched. Event streams and NDJSON
+    are excluded by default: their consumers read them line by line as they arrive. A compressed response is a different
+    representation, so its strong ETag gets the coding appended ("<etag>-gzip"), which
+    etag_matches strips again when the client revalidates.
+    """
+
+    def __init__(self, app, minimum_size=1024, gzip_level=6, brotli_quality=4,
+                 excluded_media_types=("text/event-stream", "application/x-ndjson")):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.excluded_media_types = frozenset(excluded_media_types)
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def choose_encoder(self, accept_encoding):
+        accepted = accepted_encodings(accept_encoding)
+        candidates = [
+            (accepted.get(name, accepted.get("*", 0)), preference, name)
+            for preference, name in enumerate(["gzip", "br"] if brotli is not None else ["gzip"])
+        ]
+        quality, _, name = max(candidates)
+        if quality <= 0:
+            return None
+        if name == "br":
+            return BrotliEncoder(self.brotli_quality)
+        return GzipEncoder(self.gzip_level)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        encoder = self.choose_encoder(Headers(scope=scope).get("accept-encoding"))
+        if encoder is None:
+            return await self.app(scope, receive, send)
+
+        start_message = None
+        compressing = None
+
+        async def compressed_send(message):
+            nonlocal start_message, compressing
+            if message["type"] == "http.response.start":
+                # Held back until the first body chunk shows whether compression is worth it
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                return await send(message)
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressing is None:
+                headers = MutableHeaders(raw=list(start_message.get("headers", [])))
+                compressing = (
+                    "content-encoding" not in headers
+                    and start_message["status"] not in (204, 304)
+                    and headers.get("content-type", "").partition(";")[0].strip() not in self.excluded_media_types
+                    and (more_body or len(body) >= self.minimum_size)
+                )
+                if compressing:
+                    headers["Content-Encoding"] = encoder.name
+                    headers.add_vary_header("Accept-Encoding")
+                    etag = headers.get("etag")
+                    if etag and etag.endswith('"'):
+                        headers["ETag"] = f'{etag[:-1]}-{encoder.name}"'
+                    if more_body:
+                        del headers["Content-Length"]
+                    else:
+                        body = encoder.finish(body)
+                        headers["Content-Length"] = str(len(body))
+                        await send({**start_message, "headers": headers.raw})
+                        return await send({**message, "body": body})
+                start_message = {**start_message, "headers": headers.raw}
+                await send(start_message)
+            if compressing:
+                body = encoder.compress(body) if more_body else encoder.finish(body)
+            await send({**message, "body": body})
+
+        await self.app(scope, receive, compressed_send)
@@ -10,4 +10,25 @@ class ProductNameDuplicateError(Exception):
     message = None
 
     def __init__(self, message):
-        self.message = message
\ No newline at end of file
+        self.message = message
+
+class IdempotencyKeyConflictError(Exception):
+    code =422
+    message = None
+
+    def __init__(self, message):
+        self.message = message
+
+class IdempotencyKeyInUseError(Exception):
+    code =409
+    message = None
+
+    def __init__(self, message):
+        self.message = message
+
+class OrderNotFoundError(Exception):
+    code =404
+    message = None
+
+    def __init__(self, message):
+        self.message = message
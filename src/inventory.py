@@ -0,0 +1,219 @@
+"""Sharded stock for hot products: python -m src.inventory {shard,unshard,rebalance}
+
+With STOCK_SHARDING on, a product's stock can be split across N rows of
+product_stock_shards. Concurrent orders then decrement different rows instead of all
+queueing on the single products.stock row lock. A product's available stock is always
+products.stock plus the sum of its shards.
+"""
+import argparse
+import logging
+import random
+import time
+
+from sqlalchemy import bindparam, func, select, update
+
+from src.model import Product, ProductStockShard
+
+logger = logging.getLogger(__name__)
+
+shards_table = ProductStockShard.__table__
+products_table = Product.__table__
+
+
+def total_stock():
+    """SQL expression for a product's available stock, base row plus shards."""
+    shard_stock = (
+        select(func.sum(shards_table.c.stock))
+        .where(shards_table.c.product_id == products_table.c.id)
+        .scalar_subquery()
+    )
+    return products_table.c.stock + func.coalesce(shard_stock, 0)
+
+
+def split_evenly(total, count):
+    base, remainder = divmod(total, count)
+    return [base + (1 if shard < remainder else 0) for shard in range(count)]
+
+
+class StockShardService:
+    def shard_counts(self, SESSION, product_ids):
+        """{product_id: number of shards} for the sharded products among product_ids."""
+        return dict(
+            SESSION.execute(
+                select(shards_table.c.product_id, func.count())
+                .where(shards_table.c.product_id.in_(sorted(product_ids)))
+                .group_by(shards_table.c.product_id)
+            ).all()
+        )
+
+    def shard_product(self, SESSION, product_id, count):
+        """Move all of a product's stock into `count` evenly filled shards."""
+        shards, base = self._lock_stock(SESSION, product_id)
+        total = base + sum(stock for _, stock in shards)
+        SESSION.execute(shards_table.delete().where(shards_table.c.product_id == product_id))
+        SESSION.execute(
+            shards_table.insert(),
+            [{"product_id": product_id, "shard": shard, "stock": stock} for shard, stock in enumerate(split_evenly(total, count))],
+        )
+        SESSION.execute(update(products_table).where(products_table.c.id == product_id).values(stock=0))
+
+    def unshard_product(self, SESSION, product_id):
+        shards, base = self._lock_stock(SESSION, product_id)
+        total = base + sum(stock for _, stock in shards)
+        SESSION.execute(shards_table.delete().where(shards_table.c.product_id == product_id))
+        SESSION.execute(update(products_table).where(products_table.c.id == product_id).values(stock=total))
+
+    def rebalance(self, SESSION, product_id):
+        """Spread the product's stock evenly again, so no shard runs dry long before the others."""
+        shards, base = self._lock_stock(SESSION, product_id)
+        if not shards:
+            return False
+        stocks = [stock for _, stock in shards]
+        target = split_evenly(base + sum(stocks), len(stocks))
+        if base == 0 and sorted(stocks) == sorted(target):
+            return False
+        SESSION.execute(
+            update(shards_table)
+            .where(shards_table.c.product_id == product_id, shards_table.c.shard == bindparam("target_shard"))
+            .values(stock=bindparam("target_stock")),
+            [{"target_shard": shard, "target_stock": stock} for shard, stock in enumerate(target)],
+        )
+        SESSION.execute(update(products_table).where(products_table.c.id == product_id).values(stock=0))
+        return True
+
+    def reserve(self, SESSION, quantities, shard_counts):
+        """Decrement sharded stock for {product_id: quantity}; returns the ids short of stock.
+
+        Each product is taken from one randomly chosen shard holding enough stock. Only when
+        no single shard can cover the quantity are all of the product's shards locked and
+        drained together.
+        """
+        out_of_stock = []
+        postgresql = SESSION.get_bind().dialect.name == "postgresql"
+        for product_id in sorted(quantities):
+            quantity = quantities[product_id]
+            if postgresql:
+                reserved = self._reserve_unlocked_shard(SESSION, product_id, quantity)
+            else:
+                reserved = self._reserve_random_shard(SESSION, product_id, quantity, shard_counts[product_id])
+            if not reserved and not self._reserve_across_shards(SESSION, product_id, quantity):
+                out_of_stock.append(product_id)
+        return out_of_stock
+
+    @staticmethod
+    def _reserve_unlocked_shard(SESSION, product_id, quantity):
+        # SKIP LOCKED passes over shards other orders are holding instead of waiting for them
+        shard = SESSION.execute(
+            select(shards_table.c.shard)
+            .where(shards_table.c.product_id == product_id, shards_table.c.stock >= quantity)
+            .order_by(func.random())
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        ).scalar()
+        if shard is None:
+            return False
+        SESSION.execute(StockShardService._decrement(product_id, shard, quantity))
+        return True
+
+    @staticmethod
+    def _reserve_random_shard(SESSION, product_id, quantity, count):
+        shards = list(range(count))
+        random.shuffle(shards)
+        for shard in shards:
+            if SESSION.execute(StockShardService._decrement(product_id, shard, quantity)).rowcount == 1:
+                return True
+        return False
+
+    @staticmethod
+    def _decrement(product_id, shard, quantity):
+        return (
+            update(shards_table)
+            .where(
+                shards_table.c.product_id == product_id,
+                shards_table.c.shard == shard,
+                shards_table.c.stock >= quantity,
+            )
+            .values(stock=shards_table.c.stock - quantity)
+        )
+
+    def _reserve_across_shards(self, SESSION, product_id, quantity):
+        shards, base = self._lock_stock(SESSION, product_id)
+        if base + sum(stock for _, stock in shards) < quantity:
+            return False
+        taken = min(base, quantity)
+        remaining = quantity - taken
+        SESSION.execute(
+            update(products_table).where(products_table.c.id == product_id).values(stock=products_table.c.stock - taken)
+        )
+        for shard, stock in shards:
+            if remaining == 0:
+                break
+            taken = min(stock, remaining)
+            remaining -= taken
+            SESSION.execute(self._decrement(product_id, shard, taken))
+        return True
+
+    @staticmethod
+    def _lock_stock(SESSION, product_id):
+        """Lock and return ([(shard, stock)], base stock) for a product.
+
+        Shards are locked in shard order before the product row on every path that locks
+        more than one of them, so these paths can not deadlock with each other.
+        """
+        shards = SESSION.execute(
+            select(shards_table.c.shard, shards_table.c.stock)
+            .where(shards_table.c.product_id == product_id)
+            .order_by(shards_table.c.shard)
+            .with_for_update()
+        ).all()
+        base = SESSION.execute(
+            select(products_table.c.stock).where(products_table.c.id == product_id).with_for_update()
+        ).scalar_one()
+        return shards, base
+
+
+def rebalance_all(session_factory):
+    """Rebalance every sharded product, one short transaction each; returns how many changed."""
+    with session_factory() as session:
+        product_ids = session.execute(select(shards_table.c.product_id).distinct()).scalars().all()
+    changed = 0
+    for product_id in product_ids:
+        with session_factory() as session:
+            if StockShardService().rebalance(session, product_id):
+                changed += 1
+            session.commit()
+    return changed
+
+
+def main(argv=None):
+    from db import get_session_factory
+
+    parser = argparse.ArgumentParser(description="Manage sharded product stock")
+    commands = parser.add_subparsers(dest="command", required=True)
+    shard = commands.add_parser("shard", help="split a product's stock across counter rows")
+    shard.add_argument("product_id", type=int)
+    shard.add_argument("--shards", type=int, default=8)
+    unshard = commands.add_parser("unshard", help="fold a product's shards back into products.stock")
+    unshard.add_argument("product_id", type=int)
+    rebalance = commands.add_parser("rebalance", help="even out shards, once or every --interval seconds")
+    rebalance.add_argument("--interval", type=float)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    session_factory = get_session_factory()
+    if args.command == "rebalance":
+        while True:
+            logger.info("Rebalanced %d sharded products", rebalance_all(session_factory))
+            if args.interval is None:
+                return
+            time.sleep(args.interval)
+    with session_factory() as session:
+        if args.command == "shard":
+            StockShardService().shard_product(session, args.product_id, args.shards)
+        else:
+            StockShardService().unshard_product(session, args.product_id)
+        session.commit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from sqlalchemy import delete, event, select, update
+from sqlalchemy.orm import Session
+
+from config import config
+from src.model import OrderJob
+
+
+def retry_delay(attempts):
+    """Exponential backoff between attempts, capped at five minutes."""
+    return min(2 ** attempts, 300)
+
+
+class DatabaseOrderQueue:
+    """Order jobs stored in the order_jobs table.
+
+    Jobs are inserted in the same transaction as their order, so a job exists exactly when
+    its order was committed. Workers claim them with SELECT ... FOR UPDATE SKIP LOCKED and
+    keep the row locks until their transaction ends, so any number of worker processes can
+    poll the table without handing the same job out twice, and a crashed worker's jobs are
+    simply unlocked for the next one.
+    """
+
+    def __init__(self, max_attempts):
+        self.max_attempts = max_attempts
+
+    def enqueue(self, SESSION, order_id):
+        SESSION.add(OrderJob(order_id=order_id))
+
+    def claim(self, SESSION, batch_size):
+        return SESSION.execute(
+            select(OrderJob.id, OrderJob.order_id, OrderJob.attempts)
+            .where(OrderJob.status == OrderJob.QUEUED, OrderJob.available_at <= datetime.utcnow())
+            .order_by(OrderJob.available_at, OrderJob.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).all()
+
+    def complete(self, SESSION, job):
+        SESSION.execute(delete(OrderJob).where(OrderJob.id == job.id))
+
+    def fail(self, SESSION, job, error):
+        attempts = job.attempts + 1
+        values = {"attempts": attempts, "last_error": str(error)[:1000]}
+        if attempts >= self.max_attempts:
+            values["status"] = OrderJob.FAILED
+        else:
+            values["available_at"] = datetime.utcnow() + timedelta(seconds=retry_delay(attempts))
+        SESSION.execute(update(OrderJob).where(OrderJob.id == job.id).values(**values))
+
+
+class MemoryJob:
+    def __init__(self, order_id, attempts=0, available_at=0.0):
+        self.order_id = order_id
+        self.attempts = attempts
+        self.available_at = available_at
+        self.last_error = None
+
+
+class MemoryOrderQueue:
+    """Per-process queue for tests and local runs; jobs become visible when their order commits."""
+
+    def __init__(self, max_attempts):
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._jobs = deque()
+        self.failed = []
+
+    def enqueue(self, SESSION, order_id):
+        transaction = SESSION.get_nested_transaction() or SESSION.get_transaction()
+        SESSION.info.setdefault("queued_order_jobs", []).append((self, order_id, transaction))
+
+    def push(self, job):
+        with self._lock:
+            self._jobs.append(job)
+
+    def claim(self, SESSION, batch_size):
+        now = time.monotonic()
+        claimed = []
+        with self._lock:
+            for _ in range(len(self._jobs)):
+                if len(claimed) == batch_size:
+                    break
+                job = self._jobs.popleft()
+                if job.available_at <= now:
+                    claimed.append(job)
+                else:
+                    self._jobs.append(job)
+        return claimed
+
+    def complete(self, SESSION, job):
+        pass
+
+    def fail(self, SESSION, job, error):
+        job.attempts += 1
+        job.last_error = str(error)
+        if job.attempts >= self.max_attempts:
+            self.failed.append(job)
+        else:
+            job.available_at = time.monotonic() + retry_delay(job.attempts)
+            self.push(job)
+
+    def __len__(self):
+        return len(self._jobs)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_memory_jobs(session):
+    for queue, order_id, _ in session.info.pop("queued_order_jobs", []):
+        queue.push(MemoryJob(order_id))
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_memory_jobs(session, previous_transaction):
+    # Drop the jobs of orders written inside the transaction or savepoint that was rolled back
+    jobs = session.info.get("queued_order_jobs")
+    if jobs:
+        session.info["queued_order_jobs"] = [
+            job for job in jobs if not _within(job[2], previous_transaction)
+        ]
+
+
+def _within(transaction, ancestor):
+    while transaction is not None:
+        if transaction is ancestor:
+            return True
+        transaction = transaction.parent
+    return False
+
+
+@lru_cache(maxsize=None)
+def get_order_queue():
+    """The configured order queue (ORDER_QUEUE_BACKEND), built on first use."""
+    if config.ORDER_QUEUE_BACKEND == "memory":
+        return MemoryOrderQueue(max_attempts=config.ORDER_JOB_MAX_ATTEMPTS)
+    return DatabaseOrderQueue(max_attempts=config.ORDER_JOB_MAX_ATTEMPTS)
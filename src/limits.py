@@ -0,0 +1,52 @@
+from fastapi.responses import ORJSONResponse
+from starlette.datastructures import Headers
+
+
+class BodySizeLimitMiddleware:
+    """ASGI middleware answering 413 for POST bodies over max_size bytes on the given paths.
+
+    A declared Content-Length is rejected before anything is read. Otherwise the body is read
+    here, at most max_size bytes of it, before the route runs: a route that parses its body
+    through FastAPI would turn an error raised mid-read into a 400.
+    """
+
+    def __init__(self, app, max_size, paths):
+        self.app = app
+        self.max_size = max_size
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+        content_length = Headers(scope=scope).get("content-length", "")
+        if content_length.isdigit() and int(content_length) > self.max_size:
+            return await self.reject(scope, receive, send)
+
+        chunks = []
+        received = 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                # Nobody is left to answer
+                return
+            chunks.append(message.get("body", b""))
+            received += len(chunks[-1])
+            if received > self.max_size:
+                return await self.reject(scope, receive, send)
+            if not message.get("more_body", False):
+                break
+
+        replayed = False
+
+        async def buffered_receive():
+            nonlocal replayed
+            if replayed:
+                return await receive()
+            replayed = True
+            return {"type": "http.request", "body": b"".join(chunks), "more_body": False}
+
+        await self.app(scope, buffered_receive, send)
+
+    async def reject(self, scope, receive, send):
+        response = ORJSONResponse(status_code=413, content=f"Request body is larger than {self.max_size} bytes")
+        await response(scope, receive, send)
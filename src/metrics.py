@@ -0,0 +1,201 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Cumulative Prometheus-style histogram over fixed bucket bounds."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            yield bound, total
+
+
+class RequestStats:
+    """SQL work done on behalf of the current request."""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.statements = Counter()
+
+
+_request_stats: ContextVar = ContextVar("request_stats", default=None)
+
+
+class RequestMetrics:
+    """Per-route latency histograms, status counters and SQL totals for the /metrics endpoint."""
+
+    def __init__(self, n_plus_one_threshold=None):
+        # None reads METRICS_N_PLUS_ONE_THRESHOLD from the settings when a request finishes
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.in_flight = 0
+            self.latency = defaultdict(Histogram)
+            self.sql_latency = defaultdict(Histogram)
+            self.responses = Counter()
+            self.sql_queries = Counter()
+            self.n_plus_one = Counter()
+
+    def request_started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def request_finished(self, method, route, status_code, seconds, stats):
+        threshold = self.n_plus_one_threshold or config.METRICS_N_PLUS_ONE_THRESHOLD
+        repeated = [
+            (statement, count) for statement, count in stats.statements.items() if count >= threshold
+        ]
+        with self._lock:
+            self.in_flight -= 1
+            self.latency[(method, route)].observe(seconds)
+            self.sql_latency[(method, route)].observe(stats.sql_seconds)
+            self.responses[(method, route, status_code)] += 1
+            self.sql_queries[(method, route)] += stats.queries
+            if repeated:
+                self.n_plus_one[(method, route)] += 1
+        for statement, count in repeated:
+            logger.warning(
+                "Possible N+1 query on %s %s: statement executed %d times: %s",
+                method, route, count, statement[:200],
+            )
+
+    def render(self, extra_gauges=None):
+        """Prometheus text exposition format."""
+        with self._lock:
+            lines = [
+                "# HELP http_requests_in_flight Requests currently being handled",
+                "# TYPE http_requests_in_flight gauge",
+                f"http_requests_in_flight {self.in_flight}",
+                "# HELP http_responses_total Responses by route and status code",
+                "# TYPE http_responses_total counter",
+            ]
+            for (method, route, status_code), count in sorted(self.responses.items()):
+                lines.append(
+                    f'http_responses_total{{method="{method}",route="{route}",status="{status_code}"}} {count}'
+                )
+            lines += _render_histograms(
+                "http_request_duration_seconds", "Request latency by route", self.latency
+            )
+            lines += _render_histograms(
+                "http_request_sql_duration_seconds", "Time spent in SQL per request", self.sql_latency
+            )
+            lines += ["# HELP http_request_sql_queries_total SQL statements executed by route",
+                      "# TYPE http_request_sql_queries_total counter"]
+            for (method, route), count in sorted(self.sql_queries.items()):
+                lines.append(f'http_request_sql_queries_total{{method="{method}",route="{route}"}} {count}')
+            lines += ["# HELP http_request_n_plus_one_total Requests repeating one statement past the N+1 threshold",
+                      "# TYPE http_request_n_plus_one_total counter"]
+            for (method, route), count in sorted(self.n_plus_one.items()):
+                lines.append(f'http_request_n_plus_one_total{{method="{method}",route="{route}"}} {count}')
+        for name, (help_text, value) in (extra_gauges or {}).items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+def _render_histograms(name, help_text, histograms):
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for (method, route), histogram in sorted(histograms.items()):
+        labels = f'method="{method}",route="{route}"'
+        for bound, total in histogram.cumulative():
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f'{name}_bucket{{{labels},le="{le}"}} {total}')
+        lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+        lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+    return lines
+
+
+request_metrics = RequestMetrics()
+
+
+def instrument_engine(db_engine):
+    """Attribute statement counts and time to the request being handled, if any."""
+
+    @event.listens_for(db_engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _request_stats.get() is not None:
+            conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(db_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        stats = _request_stats.get()
+        if stats is None or not conn.info.get("query_start"):
+            return
+        stats.sql_seconds += time.perf_counter() - conn.info["query_start"].pop()
+        stats.queries += 1
+        stats.statements[statement] += 1
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing each request and adding a Server-Timing header."""
+
+    def __init__(self, app, metrics=None):
+        self.app = app
+        self.metrics = metrics or request_metrics
+        self._routes = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def timed_send(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                server_timing = (
+                    f'db;dur={stats.sql_seconds * 1000:.2f};desc="{stats.queries} queries", '
+                    f"app;dur={(time.perf_counter() - start) * 1000:.2f}"
+                )
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", server_timing.encode())
+                ]
+            await send(message)
+
+        self.metrics.request_started()
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            _request_stats.reset(token)
+            self.metrics.request_finished(
+                scope["method"], self._route(scope), status_code, time.perf_counter() - start, stats
+            )
+
+    def _route(self, scope):
+        # Label by path template rather than raw path to keep the metric cardinality bounded
+        if self._routes is None and "app" in scope:
+            self._routes = {
+                getattr(route, "endpoint", None): route.path for route in scope["app"].routes
+            }
+        return (self._routes or {}).get(scope.get("endpoint"), "unmatched")
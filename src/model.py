@@ -1,15 +1,60 @@
-from sqlalchemy import Column, Integer, String, Float, Enum, JSON
+from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal
+from sqlalchemy import BigInteger, Column, Integer, String, Enum, ForeignKey, JSON, DateTime, Index
+from sqlalchemy.orm import relationship
+from sqlalchemy.types import TypeDecorator
 from db import Base
 import enum
 
 
+def to_cents(amount, rounding=ROUND_HALF_UP):
+    """Whole cents for a decimal amount (float, str, Decimal), rounding half up by default."""
+    return int((Decimal(str(amount)) * 100).quantize(Decimal(1), rounding=rounding))
+
+
+def from_cents(cents):
+    return cents / 100
+
+
+class Money(TypeDecorator):
+    """Amount stored as an integer number of cents and exposed in currency units.
+
+    Arithmetic on amounts in Python should go through to_cents so it stays exact.
+    """
+
+    impl = BigInteger
+    cache_ok = True
+
+    @property
+    def python_type(self):
+        return float
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else to_cents(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else from_cents(value)
+
+
 class Product(Base):
     __tablename__ = "products"
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    name = Column(String, nullable=False)
+    name = Column(String, nullable=False, unique=True, index=True)
     description = Column(String, nullable=True)
-    price = Column(Float, nullable=False)
+    price = Column("price_cents", Money, key="price", nullable=False)
+    stock = Column(Integer, nullable=False)
+
+    inventory_changes = relationship("InventoryChange", passive_deletes=True)
+
+
+class ProductStockShard(Base):
+    """One of N counters holding part of a hot product's stock (see src.inventory)."""
+
+    __tablename__ = "product_stock_shards"
+
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    shard = Column(Integer, primary_key=True)
     stock = Column(Integer, nullable=False)
 
 
@@ -21,6 +66,74 @@ class Order(Base):
     __tablename__ = "orders"
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    products = Column(JSON, nullable=False)
-    total_price = Column(Float, nullable=False)
+    total_price = Column("total_price_cents", Money, key="total_price", nullable=False)
     status = Column(Enum(OrderStatus), default=OrderStatus.pending, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    items = relationship("OrderItem", back_populates="order", passive_deletes=True)
+
+    # Serves GET /orders listings filtered by status and ordered by creation time
+    __table_args__ = (Index("ix_orders_status_created_at", "status", "created_at"),)
+
+
+class OrderItem(Base):
+    __tablename__ = "order_items"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    order_id = Column(Integer, ForeignKey("orders.id", ondelete="CASCADE"), nullable=False, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False, index=True)
+    quantity = Column(Integer, nullable=False)
+    # Price of one unit when the order was placed
+    unit_price = Column("unit_price_cents", Money, key="unit_price", nullable=False)
+    order = relationship("Order", back_populates="items")
+
+
+class OrderJob(Base):
+    """Post-processing queued for a pending order, claimed by workers with FOR UPDATE SKIP LOCKED."""
+
+    __tablename__ = "order_jobs"
+
+    QUEUED = "queued"
+    FAILED = "failed"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    order_id = Column(Integer, ForeignKey("orders.id", ondelete="CASCADE"), nullable=False, index=True)
+    status = Column(String(16), default=QUEUED, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    # Retries are pushed back by setting this into the future
+    available_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (Index("ix_order_jobs_status_available_at", "status", "available_at"),)
+
+
+class InventoryChange(Base):
+    """Append-only log of stock changes, read through GET /inventory/changes and /inventory/stream."""
+
+    __tablename__ = "inventory_changes"
+
+    # Ids are never reused, so a consumer's cursor stays valid after the newest change is purged
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    CREATED = "created"
+    ORDERED = "ordered"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False, index=True)
+    order_id = Column(Integer, ForeignKey("orders.id", ondelete="SET NULL"), nullable=True)
+    reason = Column(String(16), nullable=False)
+    delta = Column(Integer, nullable=False)
+    # The product's available stock right after this change
+    stock = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String(255), primary_key=True)
+    # sha256 of the request body, so a key reused for a different request is rejected
+    request_hash = Column(String(64), nullable=False)
+    status_code = Column(Integer, nullable=False)
+    response = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
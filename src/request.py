@@ -1,8 +1,39 @@
+import csv
+import inspect
+import math
+import re
+from datetime import datetime
+from decimal import Decimal
+import orjson
 from pydantic import BaseModel, HttpUrl
-from typing import List
+from typing import List, Optional
 from enum import Enum
+from fastapi import Request
+from fastapi.exceptions import RequestValidationError
+from pydantic.error_wrappers import ErrorWrapper
+
+from config import config
+
+from pydantic import BaseModel, root_validator, validator, ValidationError, conint, constr
+
+PRODUCT_FIELDS = ("id", "name", "description", "price", "stock")
+MAX_PRODUCTS_PAGE_SIZE = 1000
+# Largest value the integer id/quantity columns hold
+MAX_DB_INTEGER = 2 ** 31 - 1
+# Largest number of cents the BIGINT money columns hold
+MAX_DB_CENTS = 2 ** 63 - 1
+
+
+def check_amount(cls, amount, field):
+    """Money inputs must be finite and fit the cents columns, checked before to_cents sees them."""
+    if amount is None:
+        return amount
+    if not math.isfinite(amount):
+        raise ValueError(f'{field.name} must be a finite number')
+    if abs(Decimal(str(amount)) * 100) > MAX_DB_CENTS:
+        raise ValueError(f'{field.name} is too large')
+    return amount
 
-from pydantic import BaseModel, root_validator, ValidationError
 
 class CreateProductRequest(BaseModel):
     name: str
@@ -10,13 +41,19 @@ class CreateProductRequest(BaseModel):
     price: float
     stock: int
 
-    @root_validator(pre=True)
+    check_price = validator('price', allow_reuse=True)(check_amount)
+
+    # Runs after field coercion so string inputs (csv uploads) are compared as numbers
+    @root_validator(skip_on_failure=True)
     def check_non_negative(cls, values):
         price = values.get('price')
         stock = values.get('stock')
         
         if price is not None and price < 0:
             raise ValueError('Price cannot be negative')
+        # Prices are stored in whole cents
+        if price is not None and Decimal(str(price)).as_tuple().exponent < -2:
+            raise ValueError('Price cannot have more than 2 decimal places')
         if stock is not None and stock < 0:
             raise ValueError('Stock cannot be negative')
         
@@ -25,8 +62,8 @@ class CreateProductRequest(BaseModel):
 
 
 class Products(BaseModel):
-    product_id: int
-    quantity: int
+    product_id: conint(le=MAX_DB_INTEGER)
+    quantity: conint(le=MAX_DB_INTEGER)
     @root_validator(pre=True)
     def check_non_negative(cls, values):
         quantity = values.get('quantity')
@@ -42,11 +79,371 @@ class Status(Enum):
     completed = "completed"
 
 class CreateOrderRequest(BaseModel):
-    status: Status
+    # Ignored: orders are always created pending and completed by the order workers
+    status: Status = Status.pending
     products: List[Products]
     @root_validator(pre=True)
     def check_products(cls, values):
         products = values.get('products', [])
         if not products:
             raise ValueError('There must be at least one product in the order')
+        if len(products) > config.ORDER_MAX_LINES:
+            raise ValueError(f'An order can contain at most {config.ORDER_MAX_LINES} lines')
+        return values
+
+
+class OrderLines:
+    """Order lines as parallel product_ids/quantities lists, one entry per distinct product.
+
+    Lines naming the same product are merged, keeping the position of its first line.
+    """
+
+    __slots__ = ("product_ids", "quantities")
+
+    def __init__(self, product_ids, quantities):
+        self.product_ids = product_ids
+        self.quantities = quantities
+
+    @classmethod
+    def from_products(cls, products):
+        """Merge lines given as objects with product_id and quantity (e.g. Products models)."""
+        if isinstance(products, cls):
+            return products
+        positions = {}
+        product_ids = []
+        quantities = []
+        for product in products:
+            position = positions.get(product.product_id)
+            if position is None:
+                positions[product.product_id] = len(product_ids)
+                product_ids.append(product.product_id)
+                quantities.append(product.quantity)
+            else:
+                quantities[position] += product.quantity
+        return cls(product_ids, quantities)
+
+    def items(self):
+        return zip(self.product_ids, self.quantities)
+
+    def as_dicts(self):
+        return [{"product_id": product_id, "quantity": quantity} for product_id, quantity in self.items()]
+
+    def __len__(self):
+        return len(self.product_ids)
+
+
+STATUS_VALUES = frozenset(status.value for status in Status)
+
+
+def _parse_order_lines(payload):
+    """OrderLines for a well-formed order body, or None to leave validation to CreateOrderRequest.
+
+    One pass over the raw JSON lines: JSON ints are type and range checked in place and
+    duplicate products merged, without a model per line.
+    """
+    if type(payload) is not dict:
+        return None
+    status = payload.get("status", Status.pending.value)
+    # Lists and dicts are unhashable, so the type is checked before the membership test
+    if type(status) is not str or status not in STATUS_VALUES:
+        return None
+    lines = payload.get("products")
+    if type(lines) is not list or not lines or len(lines) > config.ORDER_MAX_LINES:
+        return None
+    positions = {}
+    product_ids = []
+    quantities = []
+    for line in lines:
+        if type(line) is not dict:
+            return None
+        product_id = line.get("product_id")
+        quantity = line.get("quantity")
+        # type() rather than isinstance() so booleans take the model path like any other coercion
+        if type(product_id) is not int or type(quantity) is not int:
+            return None
+        if product_id > MAX_DB_INTEGER or not 0 <= quantity <= MAX_DB_INTEGER:
+            return None
+        position = positions.get(product_id)
+        if position is None:
+            positions[product_id] = len(product_ids)
+            product_ids.append(product_id)
+            quantities.append(quantity)
+        else:
+            quantities[position] += quantity
+            if quantities[position] > MAX_DB_INTEGER:
+                return None
+    return OrderLines(product_ids, quantities)
+
+
+def parse_order_request(payload):
+    """Validate a decoded POST /orders body into (Status, OrderLines).
+
+    Bodies the one-pass parser does not accept as they are (strings needing coercion,
+    missing fields, bad values) are validated by CreateOrderRequest instead, so coercion
+    and error messages are those of the model. Raises RequestValidationError.
+    """
+    lines = _parse_order_lines(payload)
+    if lines is None:
+        try:
+            order = CreateOrderRequest.parse_obj(payload)
+        except ValidationError as e:
+            raise RequestValidationError([ErrorWrapper(e, ("body",))])
+        lines = OrderLines.from_products(order.products)
+        for product_id, quantity in lines.items():
+            if quantity > MAX_DB_INTEGER:
+                raise RequestValidationError(
+                    [ErrorWrapper(ValueError(f"Total quantity of product {product_id} is too large"), ("body", "products"))]
+                )
+        return order.status, lines
+    return Status(payload.get("status", Status.pending.value)), lines
+
+
+async def order_body(request: Request):
+    """Body dependency for order creation: the raw JSON parsed by parse_order_request."""
+    try:
+        payload = orjson.loads(await request.body())
+    except orjson.JSONDecodeError as e:
+        raise RequestValidationError([ErrorWrapper(e, ("body", e.pos))])
+    return parse_order_request(payload)
+
+
+# Documents the body read by order_body, which FastAPI can not infer from the signature
+ORDER_BODY_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": {"$ref": "#/components/schemas/CreateOrderRequest"}}},
+    }
+}
+
+
+MAX_ORDER_BATCH_SIZE = 500
+
+class CreateOrderBatchRequest(BaseModel):
+    orders: List[CreateOrderRequest]
+    atomic: bool = False
+
+    @validator('orders')
+    def check_orders(cls, orders):
+        if not orders:
+            raise ValueError('There must be at least one order in the batch')
+        if len(orders) > MAX_ORDER_BATCH_SIZE:
+            raise ValueError(f'A batch can contain at most {MAX_ORDER_BATCH_SIZE} orders')
+        return orders
+
+
+class ProductFormat(Enum):
+    json = "json"
+    ndjson = "ndjson"
+
+def check_product_fields(cls, fields):
+    if fields is None:
+        return fields
+    requested = list(dict.fromkeys(field.strip() for field in fields.split(',') if field.strip()))
+    unknown = [field for field in requested if field not in PRODUCT_FIELDS]
+    if not requested or unknown:
+        raise ValueError(f'fields must be a comma separated subset of {", ".join(PRODUCT_FIELDS)}')
+    return ','.join(requested)
+
+
+class ProductQueryRequest(BaseModel):
+    after_id: Optional[int] = None
+    limit: Optional[conint(ge=1, le=MAX_PRODUCTS_PAGE_SIZE)] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    in_stock: bool = False
+    name_prefix: Optional[str] = None
+    fields: Optional[str] = None
+    format: ProductFormat = ProductFormat.json
+
+    check_fields = validator('fields', allow_reuse=True)(check_product_fields)
+    check_prices = validator('min_price', 'max_price', allow_reuse=True)(check_amount)
+
+    @root_validator
+    def check_price_range(cls, values):
+        min_price = values.get('min_price')
+        max_price = values.get('max_price')
+        if min_price is not None and max_price is not None and min_price > max_price:
+            raise ValueError('min_price cannot be greater than max_price')
         return values
+
+    @property
+    def field_list(self):
+        return self.fields.split(',') if self.fields else None
+
+    @property
+    def is_paginated(self):
+        return self.after_id is not None or self.limit is not None
+
+
+MAX_SEARCH_PAGE_SIZE = 100
+
+class ProductSearchRequest(BaseModel):
+    q: constr(strip_whitespace=True, min_length=1, max_length=200)
+    limit: conint(ge=1, le=MAX_SEARCH_PAGE_SIZE) = 20
+    # X-Next-Cursor of the previous page: "<rank>,<product id>"
+    cursor: Optional[str] = None
+    fields: Optional[str] = None
+
+    check_fields = validator('fields', allow_reuse=True)(check_product_fields)
+
+    @validator('q')
+    def check_query(cls, q):
+        if not re.search(r'\w', q):
+            raise ValueError('q must contain at least one letter or digit')
+        return q
+
+    @validator('cursor')
+    def check_cursor(cls, cursor):
+        if cursor is None:
+            return cursor
+        try:
+            parse_search_cursor(cursor)
+        except ValueError:
+            raise ValueError('cursor must be the X-Next-Cursor value of a previous page')
+        return cursor
+
+    @property
+    def field_list(self):
+        return self.fields.split(',') if self.fields else None
+
+
+MAX_INVENTORY_CHANGES_PAGE_SIZE = 1000
+
+class InventoryChangesRequest(BaseModel):
+    # Id of the last change already seen; 0 reads the log from its start
+    since: conint(ge=0) = 0
+    limit: conint(ge=1, le=MAX_INVENTORY_CHANGES_PAGE_SIZE) = 100
+
+
+class InventoryStreamRequest(BaseModel):
+    # Without since (or a Last-Event-ID header) the stream starts at the end of the log
+    since: Optional[conint(ge=0)] = None
+    low_stock_threshold: Optional[conint(ge=0)] = None
+    low_stock_only: bool = False
+
+
+MAX_ORDERS_PAGE_SIZE = 1000
+
+class OrderQueryRequest(BaseModel):
+    status: Optional[Status] = None
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+    # X-Next-Cursor of the previous page: "<created_at ISO timestamp>,<order id>"
+    cursor: Optional[str] = None
+    limit: conint(ge=1, le=MAX_ORDERS_PAGE_SIZE) = 100
+    include_items: bool = False
+
+    @validator('cursor')
+    def check_cursor(cls, cursor):
+        if cursor is None:
+            return cursor
+        try:
+            parse_order_cursor(cursor)
+        except ValueError:
+            raise ValueError('cursor must be the X-Next-Cursor value of a previous page')
+        return cursor
+
+    @property
+    def cursor_position(self):
+        return parse_order_cursor(self.cursor) if self.cursor else None
+
+
+def parse_order_cursor(cursor):
+    created_at, order_id = cursor.rsplit(',', 1)
+    return datetime.fromisoformat(created_at), int(order_id)
+
+
+def format_order_cursor(created_at, order_id):
+    return f"{created_at.isoformat()},{order_id}"
+
+
+def parse_search_cursor(cursor):
+    rank, product_id = cursor.rsplit(',', 1)
+    return float(rank), int(product_id)
+
+
+def format_search_cursor(rank, product_id):
+    # repr round-trips the float exactly, so the next page resumes at the same rank
+    return f"{rank!r},{product_id}"
+
+
+def query_params(model):
+    """Expose a request model as query parameters, reporting its validator errors as 422s."""
+    def dependency(**values):
+        try:
+            return model(**values)
+        except ValidationError as e:
+            raise RequestValidationError(e.raw_errors)
+
+    dependency.__signature__ = inspect.signature(model)
+    return dependency
+
+
+class BulkProductFormat(Enum):
+    json = "application/json"
+    ndjson = "application/x-ndjson"
+    csv = "text/csv"
+
+    @classmethod
+    def from_content_type(cls, content_type):
+        media_type = (content_type or "application/json").split(";")[0].strip().lower()
+        for upload_format in cls:
+            if upload_format.value == media_type:
+                return upload_format
+        raise ValueError(f"Unsupported content type {media_type}")
+
+
+async def iter_lines(stream):
+    """Split an async byte stream into lines without buffering the whole body."""
+    buffer = bytearray()
+    async for chunk in stream:
+        # Only the new chunk can hold a newline; the carried over tail was already scanned
+        scan_from = len(buffer)
+        buffer += chunk
+        start = 0
+        while (end := buffer.find(b"\n", scan_from)) >= 0:
+            yield bytes(buffer[start:end])
+            start = scan_from = end + 1
+        del buffer[:start]
+    if buffer:
+        yield bytes(buffer)
+
+
+async def iter_ndjson_rows(stream):
+    """Yield one parsed object per non-blank line, or the parse error for malformed lines."""
+    async for line in iter_lines(stream):
+        if not line.strip():
+            continue
+        try:
+            yield orjson.loads(line)
+        except orjson.JSONDecodeError as e:
+            yield ValueError(f"Invalid JSON: {e}")
+
+
+async def iter_csv_rows(stream):
+    """Yield a dict per csv record, keyed by the header row, or an error for undecodable lines."""
+    header = None
+    pending = []
+    quotes = 0
+    async for line in iter_lines(stream):
+        try:
+            text = line.decode("utf-8")
+        except UnicodeDecodeError as e:
+            # Drops the record the line belongs to, like any other malformed row
+            pending, quotes = [], 0
+            yield ValueError(f"Invalid UTF-8: {e.reason} at byte {e.start}")
+            continue
+        # Quoted fields may span lines; feed the reader once a record is complete
+        pending.append(text + "\n")
+        quotes += text.count('"')
+        if quotes % 2:
+            continue
+        records = list(csv.reader(pending))
+        pending, quotes = [], 0
+        for record in records:
+            if not record:
+                continue
+            if header is None:
+                header = [column.strip() for column in record]
+            else:
+                yield dict(zip(header, record))
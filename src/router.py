@@ -1,58 +1,330 @@
-from fastapi import APIRouter
-from fastapi.responses import JSONResponse
-from src.service import ProductService, OrderService
-from src.request import CreateProductRequest, CreateOrderRequest
-from db import SESSION
-from src.exception import OrderValidationError,ProductNameDuplicateError
+import logging
+import orjson
+from typing import Optional
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse, PlainTextResponse, Response, StreamingResponse
+from sqlalchemy.orm import Session
+from src.service import ProductService, OrderService, IdempotencyService
+from src.request import CreateProductRequest, CreateOrderBatchRequest, ProductQueryRequest, ProductFormat, query_params
+from src.request import OrderQueryRequest, ORDER_BODY_OPENAPI, order_body
+from src.request import ProductSearchRequest, InventoryChangesRequest, InventoryStreamRequest
+from src.request import BulkProductFormat, iter_csv_rows, iter_ndjson_rows
+from config import config
+from db import get_engine, get_read_session, get_session, get_session_factory, pool_metrics, remember_write
+from src.jobs import get_order_queue
+from src.search import ProductSearchService
+from src.changes import InventoryChangeService
+from src.model import OrderStatus
+from src.cache import get_catalog_cache, get_idempotency_cache
+from src.compression import etag_matches, strong_etag
+from src.metrics import request_metrics
+from src.exception import OrderValidationError,ProductNameDuplicateError,OrderNotFoundError
+from src.exception import IdempotencyKeyConflictError, IdempotencyKeyInUseError
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 
 @router.get("/products")
-def get_all_products():
+def get_all_products(request: Request, args: ProductQueryRequest = Depends(query_params(ProductQueryRequest)), SESSION: Session = Depends(get_read_session)):
+    try:
+        # Checked before the catalog is loaded, so an unchanged catalog costs one index lookup
+        version = InventoryChangeService().catalog_version(SESSION)
+        headers = {"ETag": strong_etag(f"{version}:products:{args.json()}")}
+        if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+        if args.format == ProductFormat.ndjson:
+            return StreamingResponse(
+                ProductService().stream_products(SESSION=SESSION, filters=args),
+                media_type="application/x-ndjson",
+                headers=headers,
+            )
+        products, next_after_id = ProductService(cache=get_catalog_cache()).get_products_page(
+            SESSION=SESSION, filters=args, version=version
+        )
+        if next_after_id is not None:
+            headers["X-Next-Cursor"] = str(next_after_id)
+        return ORJSONResponse(status_code=200, content=products, headers=headers)
+    except Exception as e:
+        logger.exception("Failed to list products")
+        SESSION.rollback()
+        return ORJSONResponse(status_code=500, content=str(e))
+
+
+@router.get("/products/search")
+def search_products(args: ProductSearchRequest = Depends(query_params(ProductSearchRequest)), SESSION: Session = Depends(get_read_session)):
     try:
-        products = ProductService().get_all_products(SESSION=SESSION)
-        SESSION.close()
-        return JSONResponse(status_code=200, content=products)
+        products, next_cursor = ProductSearchService(index_max_age=config.CACHE_TTL).search(
+            SESSION=SESSION, request=args
+        )
+        headers = {}
+        if next_cursor is not None:
+            headers["X-Next-Cursor"] = next_cursor
+        return ORJSONResponse(status_code=200, content=products, headers=headers)
     except Exception as e:
-        print(e)
+        logger.exception("Failed to search products")
         SESSION.rollback()
-        return JSONResponse(status_code=500, content=str(e))
+        return ORJSONResponse(status_code=500, content=str(e))
 
 
 @router.post("/products")
-def create_product(args: CreateProductRequest):
+def create_product(args: CreateProductRequest, SESSION: Session = Depends(get_session)):
     try:
-        new_game = ProductService().create_product(
+        new_game = ProductService(cache=get_catalog_cache()).create_product(
             SESSION=SESSION,
             name=args.name,
             description=args.description,
             price=args.price,
             stock=args.stock,
         )
-        SESSION.close()
-        return JSONResponse(status_code=200, content=new_game)
+        return remember_write(ORJSONResponse(status_code=200, content=new_game))
     except ProductNameDuplicateError as e:
         SESSION.rollback()
-        return JSONResponse(status_code=409, content=str(e.message))
+        return ORJSONResponse(status_code=409, content=str(e.message))
     except Exception as e:
-        print(e)
+        logger.exception("Failed to create product")
         SESSION.rollback()
-        return JSONResponse(status_code=500, content=str(e))
+        return ORJSONResponse(status_code=500, content=str(e))
 
 
-@router.post("/orders")
-def create_order(args: CreateOrderRequest):
+@router.post("/products/bulk")
+async def bulk_create_products(request: Request, SESSION: Session = Depends(get_session)):
+    """Import products from a JSON array, NDJSON or csv body (chosen by Content-Type)."""
     try:
-        OrderService().create_order(
-            SESSION=SESSION, status=args.status.value, products=args.products
+        upload_format = BulkProductFormat.from_content_type(request.headers.get("content-type"))
+    except ValueError as e:
+        return ORJSONResponse(status_code=415, content=str(e))
+    if upload_format == BulkProductFormat.json:
+        try:
+            rows = orjson.loads(await request.body())
+        except orjson.JSONDecodeError as e:
+            return ORJSONResponse(status_code=400, content=f"Invalid JSON: {e}")
+        if not isinstance(rows, list):
+            return ORJSONResponse(status_code=400, content="Expected a JSON array of products")
+        rows = _iter_list(rows)
+    elif upload_format == BulkProductFormat.ndjson:
+        rows = iter_ndjson_rows(request.stream())
+    else:
+        rows = iter_csv_rows(request.stream())
+
+    service = ProductService(cache=get_catalog_cache())
+    report = {"inserted": 0, "failed": 0, "errors": []}
+
+    async def flush(batch, start_index):
+        inserted, errors = await run_in_threadpool(service.import_products, SESSION, batch, start_index)
+        report["inserted"] += inserted
+        report["failed"] += len(errors)
+        report["errors"].extend(errors)
+
+    try:
+        batch, start_index = [], 0
+        async for row in rows:
+            batch.append(row)
+            if len(batch) == config.BULK_IMPORT_BATCH_SIZE:
+                await flush(batch, start_index)
+                start_index += len(batch)
+                batch = []
+        if batch:
+            await flush(batch, start_index)
+        return remember_write(ORJSONResponse(status_code=200, content=report))
+    except Exception as e:
+        logger.exception("Bulk product import failed")
+        SESSION.rollback()
+        # Batches commit independently, so report what was already imported
+        return ORJSONResponse(status_code=500, content={**report, "error": str(e)})
+
+
+async def _iter_list(rows):
+    for row in rows:
+        yield row
+
+
+@router.get("/orders")
+def list_orders(args: OrderQueryRequest = Depends(query_params(OrderQueryRequest)), SESSION: Session = Depends(get_read_session)):
+    try:
+        orders, next_cursor = OrderService().list_orders(SESSION=SESSION, filters=args)
+        headers = {}
+        if next_cursor is not None:
+            headers["X-Next-Cursor"] = next_cursor
+        return ORJSONResponse(status_code=200, content=orders, headers=headers)
+    except Exception as e:
+        logger.exception("Failed to list orders")
+        SESSION.rollback()
+        return ORJSONResponse(status_code=500, content=str(e))
+
+
+@router.get("/orders/{order_id}")
+def get_order(order_id: int, include_items: bool = True, SESSION: Session = Depends(get_read_session)):
+    try:
+        order = OrderService().get_order(SESSION=SESSION, order_id=order_id, include_items=include_items)
+        return ORJSONResponse(status_code=200, content=order)
+    except OrderNotFoundError as e:
+        return ORJSONResponse(status_code=404, content=str(e.message))
+    except Exception as e:
+        logger.exception("Failed to get order")
+        SESSION.rollback()
+        return ORJSONResponse(status_code=500, content=str(e))
+
+
+@router.post("/orders", openapi_extra=ORDER_BODY_OPENAPI)
+def create_order(
+    background_tasks: BackgroundTasks,
+    body: tuple = Depends(order_body),
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+    SESSION: Session = Depends(get_session),
+):
+    status, lines = body
+    idempotency_service = IdempotencyService(cache=get_idempotency_cache(), ttl=config.IDEMPOTENCY_TTL)
+    idempotency = None
+    try:
+        if idempotency_key is not None:
+            request_hash = idempotency_service.hash_request({"status": status, "products": lines.as_dicts()})
+            replay = idempotency_service.get_response(SESSION, idempotency_key, request_hash)
+            if replay is not None:
+                return _replay_response(replay)
+            idempotency = (idempotency_service, idempotency_key, request_hash)
+            if IdempotencyService.purge_due(config.IDEMPOTENCY_CLEANUP_INTERVAL):
+                background_tasks.add_task(purge_idempotency_keys)
+        OrderService(cache=get_catalog_cache(), queue=get_order_queue()).create_order(
+            SESSION=SESSION, status=OrderStatus.pending.value, products=lines, idempotency=idempotency
         )
-        SESSION.close()
-        return JSONResponse(status_code=200, content={"message": "Order created successfully"})
+        return remember_write(ORJSONResponse(status_code=200, content=OrderService.CREATED_RESPONSE))
+    except IdempotencyKeyConflictError as e:
+        SESSION.rollback()
+        return ORJSONResponse(status_code=422, content=str(e.message))
+    except IdempotencyKeyInUseError as e:
+        # Lost the race against a concurrent retry; answer with the response it stored
+        replay = idempotency_service.get_response(SESSION, idempotency_key, idempotency[2])
+        if replay is not None:
+            return _replay_response(replay)
+        return ORJSONResponse(status_code=409, content=str(e.message))
     except OrderValidationError as e:
         SESSION.rollback()
-        return JSONResponse(status_code=409, content=str(e.message))
+        return ORJSONResponse(status_code=409, content=str(e.message))
     except Exception as e:
-        print(e)
+        logger.exception("Failed to create order")
         SESSION.rollback()
-        return JSONResponse(status_code=500, content=str(e))
+        return ORJSONResponse(status_code=500, content=str(e))
+
+
+def _replay_response(replay):
+    status_code, content = replay
+    return ORJSONResponse(status_code=status_code, content=content, headers={"Idempotent-Replayed": "true"})
+
+
+def purge_idempotency_keys():
+    session = get_session_factory()()
+    try:
+        IdempotencyService(ttl=config.IDEMPOTENCY_TTL).purge_expired(session)
+    except Exception:
+        logger.exception("Failed to purge expired idempotency keys")
+        session.rollback()
+    finally:
+        session.close()
+
+
+@router.post("/orders/batch")
+def create_orders_batch(args: CreateOrderBatchRequest, SESSION: Session = Depends(get_session)):
+    try:
+        results = OrderService(cache=get_catalog_cache(), queue=get_order_queue()).create_orders(
+            SESSION=SESSION, orders=args.orders, atomic=args.atomic
+        )
+        return remember_write(ORJSONResponse(status_code=200, content={"results": results}))
+    except OrderValidationError as e:
+        SESSION.rollback()
+        return ORJSONResponse(status_code=409, content=str(e.message))
+    except Exception as e:
+        logger.exception("Failed to create order batch")
+        SESSION.rollback()
+        return ORJSONResponse(status_code=500, content=str(e))
+
+
+@router.get("/inventory/changes")
+def list_inventory_changes(args: InventoryChangesRequest = Depends(query_params(InventoryChangesRequest)), SESSION: Session = Depends(get_read_session)):
+    """Stock changes after the `since` change id, oldest first; poll again with the last id seen."""
+    try:
+        changes = InventoryChangeService().list_changes(SESSION=SESSION, since=args.since, limit=args.limit)
+        headers = {}
+        if len(changes) == args.limit:
+            headers["X-Next-Cursor"] = str(changes[-1]["id"])
+        return ORJSONResponse(status_code=200, content=changes, headers=headers)
+    except Exception as e:
+        logger.exception("Failed to list inventory changes")
+        SESSION.rollback()
+        return ORJSONResponse(status_code=500, content=str(e))
+
+
+@router.get("/inventory/stream")
+async def stream_inventory_changes(
+    request: Request,
+    args: InventoryStreamRequest = Depends(query_params(InventoryStreamRequest)),
+    last_event_id: Optional[int] = Header(None),
+):
+    """Server-Sent Events for stock changes, with low_stock events at the threshold."""
+    service = InventoryChangeService()
+    session_factory = get_session_factory()
+    # A reconnecting EventSource sends the id of the last event it received
+    since = last_event_id if last_event_id is not None else args.since
+    try:
+        if since is None:
+            since = await run_in_threadpool(_latest_change_id, service, session_factory)
+    except Exception as e:
+        logger.exception("Failed to open inventory stream")
+        return ORJSONResponse(status_code=500, content=str(e))
+    threshold = args.low_stock_threshold if args.low_stock_threshold is not None else config.LOW_STOCK_THRESHOLD
+    return StreamingResponse(
+        service.stream(
+            session_factory,
+            since=since,
+            low_stock_threshold=threshold,
+            low_stock_only=args.low_stock_only,
+            is_disconnected=request.is_disconnected,
+            poll_interval=config.INVENTORY_STREAM_POLL_INTERVAL,
+            heartbeat_interval=config.INVENTORY_STREAM_HEARTBEAT_INTERVAL,
+        ),
+        media_type="text/event-stream",
+        # Proxies must pass events through as they come instead of buffering the response
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _latest_change_id(service, session_factory):
+    session = session_factory()
+    try:
+        return service.latest_id(session)
+    finally:
+        session.close()
+
+
+@router.get("/metrics")
+def get_metrics():
+    """Request, SQL and connection pool metrics in the Prometheus text format."""
+    if not config.METRICS_ENABLED:
+        return ORJSONResponse(status_code=404, content="Metrics are disabled")
+    pool = pool_metrics.snapshot()
+    gauges = {
+        "db_pool_checked_out": ("Connections currently checked out of the pool", pool["checked_out"]),
+        "db_pool_checkout_timeouts": ("Checkouts that timed out waiting for a connection", pool["timeouts"]),
+        "db_pool_connect_errors": ("Checkouts that failed to open a new connection", pool["connect_errors"]),
+        "db_pool_wait_seconds_total": ("Time spent waiting for pool connections", pool["wait_seconds_total"]),
+    }
+    return PlainTextResponse(request_metrics.render(gauges), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/metrics/pool")
+def get_pool_metrics():
+    metrics = pool_metrics.snapshot()
+    pool = get_engine().pool
+    metrics["pool_size"] = pool.size()
+    metrics["overflow"] = pool.overflow()
+    return ORJSONResponse(status_code=200, content=metrics)
+
+
+@router.get("/metrics/cache")
+def get_cache_metrics():
+    catalog_cache = get_catalog_cache()
+    if catalog_cache is None:
+        return ORJSONResponse(status_code=200, content={"enabled": False})
+    return ORJSONResponse(status_code=200, content={"enabled": True, **catalog_cache.stats.snapshot()})
@@ -1,8 +1,30 @@
 from marshmallow_sqlalchemy import SQLAlchemyAutoSchema
+from config import config
+from .inventory import total_stock
 from .model import Product
 
 
 class ProductSchema(SQLAlchemyAutoSchema):
     class Meta:
         model = Product
-        load_instance = True
\ No newline at end of file
+        load_instance = True
+
+
+# Keys are emitted in the same order as ProductSchema so both paths produce identical JSON
+PRODUCT_COLUMNS = {column.key: column for column in Product.__table__.columns}
+# With stock sharding on, "stock" is the base row plus the product's shards
+SHARDED_PRODUCT_COLUMNS = {**PRODUCT_COLUMNS, "stock": total_stock().label("stock")}
+
+
+def product_columns(fields=None):
+    """Columns to select for the given sparse field list, in wire order."""
+    columns = SHARDED_PRODUCT_COLUMNS if config.STOCK_SHARDING else PRODUCT_COLUMNS
+    if not fields:
+        return list(columns.values())
+    return [columns[field] for field in fields]
+
+
+def dump_product_rows(rows, fields=None):
+    """Serialize (column tuple) rows selected with product_columns(fields) without marshmallow."""
+    keys = tuple(column.key for column in product_columns(fields))
+    return [dict(zip(keys, row)) for row in rows]
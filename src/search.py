@@ -0,0 +1,197 @@
+"""Product search over name and description, ranked and keyset paginated.
+
+Every query word matches as a word prefix (full text), and names starting with the whole
+query match and rank first (prefix). On PostgreSQL matching runs in the database:
+products.search_vector is a generated tsvector (name weighted above description) with a GIN
+index, and a trigram GIN index on name serves the case-insensitive name prefix. Those objects
+only exist on PostgreSQL and are not declared on the model. Other databases (SQLite in tests
+and local runs) are searched through an in-process inverted index rebuilt whenever the
+catalog version (InventoryChangeService.catalog_version, read from the database) changes, so
+writes made through any worker are picked up.
+"""
+import heapq
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from sqlalchemy import Float, case, cast, func, literal_column, or_, select
+
+from src.changes import InventoryChangeService
+from src.model import Product
+from src.request import format_search_cursor, parse_search_cursor
+from src.schema import dump_product_rows, product_columns
+
+# Schema objects created by the search migration on PostgreSQL only; autogenerate skips them
+SEARCH_SCHEMA_OBJECTS = frozenset({"search_vector", "ix_products_search_vector", "ix_products_name_trgm"})
+
+# Rank weights, matching PostgreSQL's defaults for the A (name) and B (description) labels
+NAME_WEIGHT = 1.0
+DESCRIPTION_WEIGHT = 0.4
+# Added to the rank of products whose name starts with the whole query
+NAME_PREFIX_BOOST = 1.0
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Lower-cased words, split the way the 'simple' text search configuration does."""
+    return _TOKEN.findall(text.lower()) if text else []
+
+
+class InvertedIndex:
+    """Word postings for product names and descriptions, kept in memory."""
+
+    def __init__(self, rows):
+        postings = {}
+        names = []
+        for product_id, name, description in rows:
+            names.append((name.lower(), product_id))
+            for token in tokenize(name):
+                weights = postings.setdefault(token, {})
+                weights[product_id] = max(weights.get(product_id, 0), NAME_WEIGHT)
+            for token in tokenize(description):
+                weights = postings.setdefault(token, {})
+                weights[product_id] = max(weights.get(product_id, 0), DESCRIPTION_WEIGHT)
+        self.postings = postings
+        self.tokens = sorted(postings)
+        names.sort()
+        self.names = names
+
+    def _expand(self, term):
+        """Tokens starting with term."""
+        tokens = []
+        for position in range(bisect_left(self.tokens, term), len(self.tokens)):
+            token = self.tokens[position]
+            if not token.startswith(term):
+                break
+            tokens.append(token)
+        return tokens
+
+    def _prefix_matches(self, tokens, candidates=None):
+        """{product_id: best weight} over the postings of tokens, limited to candidates if given."""
+        postings = [self.postings[token] for token in tokens]
+        matches = {}
+        if candidates is not None:
+            for product_id in candidates:
+                weight = max(weights.get(product_id, 0) for weights in postings)
+                if weight:
+                    matches[product_id] = weight
+            return matches
+        for weights in postings:
+            for product_id, weight in weights.items():
+                if weight > matches.get(product_id, 0):
+                    matches[product_id] = weight
+        return matches
+
+    def search(self, query):
+        """{product_id: rank} for products matching every query word as a word prefix or
+        whose name starts with the whole query."""
+        expansions = []
+        for term in tokenize(query):
+            tokens = self._expand(term)
+            expansions.append((sum(len(self.postings[token]) for token in tokens), tokens))
+        # Rarest term first, so later terms only probe the products still in the running
+        expansions.sort(key=lambda expansion: expansion[0])
+        ranks = None
+        for size, tokens in expansions:
+            if ranks is None:
+                ranks = self._prefix_matches(tokens)
+            else:
+                candidates = ranks if len(ranks) * len(tokens) < size else None
+                matches = self._prefix_matches(tokens, candidates)
+                ranks = {product_id: rank + matches[product_id] for product_id, rank in ranks.items() if product_id in matches}
+            if not ranks:
+                break
+        ranks = ranks or {}
+        query = query.lower()
+        for position in range(bisect_left(self.names, (query,)), len(self.names)):
+            name, product_id = self.names[position]
+            if not name.startswith(query):
+                break
+            ranks[product_id] = ranks.get(product_id, 0.0) + NAME_PREFIX_BOOST
+        return ranks
+
+
+class IndexHolder:
+    """The process's inverted index and the catalog version it was built at."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+        self._version = None
+        self._built_at = 0.0
+
+    def get(self, SESSION, version, max_age):
+        with self._lock:
+            stale = time.monotonic() - self._built_at > max_age
+            if self._index is None or version != self._version or stale:
+                rows = SESSION.execute(select(Product.id, Product.name, Product.description)).all()
+                self._index = InvertedIndex(rows)
+                self._version = version
+                self._built_at = time.monotonic()
+            return self._index
+
+    def clear(self):
+        with self._lock:
+            self._index = None
+
+
+search_index = IndexHolder()
+
+
+class ProductSearchService:
+    def __init__(self, index_max_age=30):
+        self.index_max_age = index_max_age
+
+    def search(self, SESSION, request):
+        """Return one page of products ranked for request.q and the cursor of the next page."""
+        if SESSION.get_bind().dialect.name == "postgresql":
+            return self._search_database(SESSION, request)
+        return self._search_index(SESSION, request)
+
+    def _search_database(self, SESSION, request):
+        vector = literal_column("products.search_vector")
+        tsquery = func.to_tsquery("simple", " & ".join(f"{term}:*" for term in tokenize(request.q)))
+        name_prefix = Product.name.istartswith(request.q, autoescape=True)
+        rank = cast(
+            func.ts_rank_cd(vector, tsquery) + case((name_prefix, NAME_PREFIX_BOOST), else_=0.0), Float
+        ).label("rank")
+        ranked = select(*product_columns(request.field_list), Product.id.label("cursor_id"), rank).where(
+            or_(vector.op("@@")(tsquery), name_prefix)
+        ).subquery()
+        statement = select(ranked)
+        if request.cursor is not None:
+            after_rank, after_id = parse_search_cursor(request.cursor)
+            statement = statement.where(
+                or_(ranked.c.rank < after_rank, (ranked.c.rank == after_rank) & (ranked.c.cursor_id > after_id))
+            )
+        rows = SESSION.execute(
+            statement.order_by(ranked.c.rank.desc(), ranked.c.cursor_id).limit(request.limit)
+        ).all()
+        next_cursor = None
+        if len(rows) == request.limit:
+            next_cursor = format_search_cursor(rows[-1].rank, rows[-1].cursor_id)
+        return dump_product_rows([row[:-2] for row in rows], request.field_list), next_cursor
+
+    def _search_index(self, SESSION, request):
+        version = InventoryChangeService().catalog_version(SESSION)
+        ranks = search_index.get(SESSION, version, self.index_max_age).search(request.q)
+        keys = ((-rank, product_id) for product_id, rank in ranks.items())
+        if request.cursor is not None:
+            after_rank, after_id = parse_search_cursor(request.cursor)
+            keys = (key for key in keys if key > (-after_rank, after_id))
+        page = [(product_id, -negated_rank) for negated_rank, product_id in heapq.nsmallest(request.limit, keys)]
+        if not page:
+            return [], None
+        next_cursor = format_search_cursor(page[-1][1], page[-1][0]) if len(page) == request.limit else None
+        columns = product_columns(request.field_list)
+        rows = {
+            row[-1]: row[:-1]
+            for row in SESSION.execute(
+                select(*columns, Product.id).where(Product.id.in_([product_id for product_id, _ in page]))
+            ).all()
+        }
+        # Products deleted since the index was built drop out of the page
+        products = [rows[product_id] for product_id, _ in page if product_id in rows]
+        return dump_product_rows(products, request.field_list), next_cursor
@@ -1,59 +1,624 @@
-from src.model import Product, Order
-from src.schema import ProductSchema
+import asyncio
+import csv
+import hashlib
+import io
+import time
+from datetime import datetime, timedelta
+from decimal import ROUND_CEILING, ROUND_FLOOR
+import orjson
+from pydantic import ValidationError
+from sqlalchemy import BigInteger, Integer, and_, column, delete, func, insert, literal, or_, select, update, values
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.attributes import set_committed_value
+from config import config
+from src.changes import created_change, record_created, record_order
+from src.inventory import StockShardService, total_stock
+from src.model import Product, Order, OrderItem, OrderStatus, IdempotencyKey, to_cents
+from src.request import CreateProductRequest, OrderLines, format_order_cursor
+from src.schema import ProductSchema, PRODUCT_COLUMNS, product_columns, dump_product_rows
 from src.exception import OrderValidationError,ProductNameDuplicateError
+from src.exception import IdempotencyKeyConflictError, IdempotencyKeyInUseError, OrderNotFoundError
+
+
+def cents_literal(amount, rounding):
+    # Typed BigInteger, so Money's half-up rounding of bound amounts does not apply
+    return literal(to_cents(amount, rounding), BigInteger)
+
+
+def catalog_changed(cache):
+    """Post-commit hook of every product or stock write, sync or async: bumps the catalog
+    version so cached pages are reloaded."""
+    if cache is not None:
+        cache.invalidate()
 
 
 class ProductService:
-    def __init__(self):
-        pass
+    STREAM_BATCH_SIZE = 1000
+
+    def __init__(self, cache=None):
+        self.cache = cache
+
+    def get_all_products(self, SESSION, filters=None):
+        products, _ = self.get_products_page(SESSION, filters)
+        return products
+
+    def get_products_page(self, SESSION, filters=None, version=None):
+        """Return one keyset page of products and the cursor of the next page, if any.
+
+        A catalog `version` (InventoryChangeService.catalog_version) read for the response's
+        ETag is made part of the cache key, so the page is never older than its ETag says.
+        """
+        if self.cache is None:
+            return self._load_products_page(SESSION, filters)
+
+        def load():
+            products, next_after_id = self._load_products_page(SESSION, filters)
+            return {"products": products, "next_after_id": next_after_id}
+
+        page = self.cache.get_or_load(self._page_key(filters, version), load)
+        return page["products"], page["next_after_id"]
+
+    @staticmethod
+    def _page_key(filters, version):
+        key = "products:" + (filters.json() if filters is not None else "all")
+        return key if version is None else f"{version}:{key}"
 
-    def get_all_products(self, SESSION):
-        products = SESSION.query(Product).all()
-        return ProductSchema(many=True).dump(products)
+    def _load_products_page(self, SESSION, filters):
+        fields = filters.field_list if filters is not None else None
+        columns, cursor_index = self._page_columns(fields)
+        query = SESSION.query(*columns)
+        if filters is not None:
+            query = query.filter(*self._product_criteria(filters))
+            if filters.is_paginated:
+                query = query.order_by(Product.id)
+            if filters.limit is not None:
+                query = query.limit(filters.limit)
+        rows = query.all()
+        next_after_id = None
+        if filters is not None and filters.limit is not None and len(rows) == filters.limit:
+            next_after_id = rows[-1][cursor_index]
+        return dump_product_rows(rows, fields), next_after_id
+
+    def stream_products(self, SESSION, filters):
+        """Yield the filtered catalog as NDJSON chunks, holding one batch of rows in memory at a time."""
+        statement = self._stream_statement(filters)
+        keys = [column.key for column in product_columns(filters.field_list)]
+        for rows in SESSION.execute(statement).partitions():
+            yield b"".join(orjson.dumps(dict(zip(keys, row))) + b"\n" for row in rows)
+
+    def _stream_statement(self, filters):
+        statement = (
+            select(*product_columns(filters.field_list))
+            .where(*self._product_criteria(filters))
+            .order_by(Product.id)
+            .execution_options(yield_per=self.STREAM_BATCH_SIZE)
+        )
+        if filters.limit is not None:
+            statement = statement.limit(filters.limit)
+        return statement
+
+    @staticmethod
+    def _page_columns(fields):
+        # The id column is always selected so the next-page cursor can be read back, even
+        # when the client did not ask for it; dump_product_rows ignores the trailing extra
+        columns = product_columns(fields)
+        if PRODUCT_COLUMNS["id"] in columns:
+            return columns, columns.index(PRODUCT_COLUMNS["id"])
+        return columns + [PRODUCT_COLUMNS["id"]], len(columns)
+
+    @staticmethod
+    def _product_criteria(filters):
+        criteria = []
+        if filters.after_id is not None:
+            criteria.append(Product.id > filters.after_id)
+        # Bounds are compared in cents, rounded inwards so a sub-cent bound never admits a
+        # price outside the requested range
+        if filters.min_price is not None:
+            criteria.append(Product.price >= cents_literal(filters.min_price, ROUND_CEILING))
+        if filters.max_price is not None:
+            criteria.append(Product.price <= cents_literal(filters.max_price, ROUND_FLOOR))
+        if filters.in_stock:
+            criteria.append((total_stock() if config.STOCK_SHARDING else Product.stock) > 0)
+        if filters.name_prefix:
+            criteria.append(Product.name.startswith(filters.name_prefix, autoescape=True))
+        return criteria
 
     def create_product(self, SESSION, name, description, price, stock):
-        
-        existing_product = SESSION.query(Product).filter(Product.name == name).first()
-        if existing_product:
-            raise ProductNameDuplicateError("Product with same name already exists")
         new_product = Product(
-            name=name, description=description, price=price, stock=stock
+            name=name, description=description, price=price, stock=stock,
+            inventory_changes=[created_change(stock)],
         )
         SESSION.add(new_product)
-        SESSION.commit()
+        try:
+            SESSION.commit()
+        except IntegrityError:
+            # The unique index on products.name is the only constraint an insert can violate
+            SESSION.rollback()
+            raise ProductNameDuplicateError("Product with same name already exists")
+        catalog_changed(self.cache)
         return ProductSchema().dump(new_product)
 
+    def import_products(self, SESSION, rows, start_index=0):
+        """Validate and insert one batch of raw product rows, committing once for the batch.
+
+        Returns the number of inserted products and a list of {"index", "error"} entries for
+        rejected rows, where index is the position of the row in the whole upload.
+        """
+        errors = []
+        valid = {}
+        for index, row in enumerate(rows, start=start_index):
+            if isinstance(row, Exception):
+                errors.append({"index": index, "error": str(row)})
+                continue
+            try:
+                product = CreateProductRequest.parse_obj(row)
+            except ValidationError as e:
+                errors.append({"index": index, "error": format_validation_error(e)})
+                continue
+            if product.name in valid:
+                errors.append({"index": index, "error": "Duplicate product name in upload"})
+                continue
+            valid[product.name] = (index, product)
+
+        if valid:
+            existing = SESSION.execute(
+                select(Product.__table__.c.name).where(Product.__table__.c.name.in_(list(valid)))
+            ).scalars()
+            for name in existing:
+                index, _ = valid.pop(name)
+                errors.append({"index": index, "error": "Product with same name already exists"})
+
+        if valid:
+            new_products = [product.dict() for _, product in valid.values()]
+            if SESSION.get_bind().dialect.name == "postgresql":
+                self._copy_products(SESSION, new_products)
+            else:
+                SESSION.execute(insert(Product.__table__).values(new_products))
+            record_created(SESSION, list(valid))
+            SESSION.commit()
+            catalog_changed(self.cache)
+        errors.sort(key=lambda error: error["index"])
+        return len(valid), errors
+
+    @staticmethod
+    def _copy_products(SESSION, new_products):
+        buffer = io.StringIO()
+        # Quoting strings keeps empty descriptions distinct from NULL in COPY's csv format
+        writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC)
+        writer.writerows(
+            (product["name"], product["description"], to_cents(product["price"]), product["stock"])
+            for product in new_products
+        )
+        buffer.seek(0)
+        cursor = SESSION.connection().connection.cursor()
+        try:
+            cursor.copy_expert(
+                "COPY products (name, description, price_cents, stock) FROM STDIN WITH (FORMAT csv)", buffer
+            )
+        finally:
+            cursor.close()
+
     def get_products_by_ids(self, SESSION, product_ids):
         products = SESSION.query(Product).filter(Product.id.in_(product_ids)).all()
         return products
 
+    def reserve_stock(self, SESSION, quantities):
+        """Decrement stock for {product_id: quantity} in the current transaction.
+
+        Each decrement is a conditional UPDATE, so stock is never read and written back from
+        Python and can not go negative under concurrent orders. Rows are locked in product id
+        order to rule out deadlocks between orders sharing products. Returns the ids that did
+        not have enough stock; the caller must roll back when any are returned.
+
+        With STOCK_SHARDING on, products whose stock is sharded are reserved from their
+        shards after the unsharded ones.
+        """
+        if config.STOCK_SHARDING:
+            shard_counts = StockShardService().shard_counts(SESSION, quantities)
+            if shard_counts:
+                unsharded = {product_id: quantity for product_id, quantity in quantities.items() if product_id not in shard_counts}
+                sharded = {product_id: quantities[product_id] for product_id in shard_counts}
+                out_of_stock = self._reserve_unsharded(SESSION, unsharded) if unsharded else []
+                out_of_stock += StockShardService().reserve(SESSION, sharded, shard_counts)
+                return sorted(out_of_stock)
+        return self._reserve_unsharded(SESSION, quantities)
+
+    def _reserve_unsharded(self, SESSION, quantities):
+        if SESSION.get_bind().dialect.name == "postgresql":
+            SESSION.execute(self._lock_products_statement(quantities))
+            reserved = set(SESSION.execute(self._batch_reserve_statement(quantities)).scalars())
+            return [product_id for product_id in sorted(quantities) if product_id not in reserved]
+        out_of_stock = []
+        for product_id in sorted(quantities):
+            result = SESSION.execute(self._reserve_statement(product_id, quantities[product_id]))
+            if result.rowcount != 1:
+                out_of_stock.append(product_id)
+        return out_of_stock
+
+    @staticmethod
+    def _reserve_statement(product_id, quantity):
+        products = Product.__table__
+        return (
+            update(products)
+            .where(products.c.id == product_id, products.c.stock >= quantity)
+            .values(stock=products.c.stock - quantity)
+        )
+
+    @staticmethod
+    def _lock_products_statement(quantities):
+        return (
+            select(Product.__table__.c.id)
+            .where(Product.__table__.c.id.in_(sorted(quantities)))
+            .order_by(Product.__table__.c.id)
+            .with_for_update()
+        )
+
+    @staticmethod
+    def _batch_reserve_statement(quantities):
+        # UPDATE products ... FROM (VALUES (:id, :quantity), ...) RETURNING products.id
+        products = Product.__table__
+        lines = values(column("id", Integer), column("quantity", Integer), name="lines").data(
+            sorted(quantities.items())
+        )
+        return (
+            update(products)
+            .where(products.c.id == lines.c.id, products.c.stock >= lines.c.quantity)
+            .values(stock=products.c.stock - lines.c.quantity)
+            .returning(products.c.id)
+        )
+
+    async def get_all_products_async(self, SESSION, filters=None):
+        products, _ = await self.get_products_page_async(SESSION, filters)
+        return products
+
+    async def get_products_page_async(self, SESSION, filters=None, version=None):
+        """Async get_products_page, sharing its cache entries."""
+        if self.cache is None:
+            return await self._load_products_page_async(SESSION, filters)
+
+        async def load():
+            products, next_after_id = await self._load_products_page_async(SESSION, filters)
+            return {"products": products, "next_after_id": next_after_id}
+
+        page = await self.cache.get_or_load_async(self._page_key(filters, version), load)
+        return page["products"], page["next_after_id"]
+
+    async def _load_products_page_async(self, SESSION, filters):
+        fields = filters.field_list if filters is not None else None
+        columns, cursor_index = self._page_columns(fields)
+        statement = select(*columns)
+        if filters is not None:
+            statement = statement.where(*self._product_criteria(filters))
+            if filters.is_paginated:
+                statement = statement.order_by(Product.id)
+            if filters.limit is not None:
+                statement = statement.limit(filters.limit)
+        rows = (await SESSION.execute(statement)).all()
+        next_after_id = None
+        if filters is not None and filters.limit is not None and len(rows) == filters.limit:
+            next_after_id = rows[-1][cursor_index]
+        return dump_product_rows(rows, fields), next_after_id
+
+    async def stream_products_async(self, SESSION, filters):
+        statement = self._stream_statement(filters)
+        keys = [column.key for column in product_columns(filters.field_list)]
+        result = await SESSION.stream(statement)
+        async for rows in result.partitions():
+            yield b"".join(orjson.dumps(dict(zip(keys, row))) + b"\n" for row in rows)
+
+    async def create_product_async(self, SESSION, name, description, price, stock):
+        new_product = Product(
+            name=name, description=description, price=price, stock=stock,
+            inventory_changes=[created_change(stock)],
+        )
+        SESSION.add(new_product)
+        try:
+            await SESSION.commit()
+        except IntegrityError:
+            await SESSION.rollback()
+            raise ProductNameDuplicateError("Product with same name already exists")
+        # In a thread, as the Redis backend makes a blocking round trip
+        await asyncio.to_thread(catalog_changed, self.cache)
+        return ProductSchema().dump(new_product)
+
+    async def get_products_by_ids_async(self, SESSION, product_ids):
+        result = await SESSION.execute(select(Product).filter(Product.id.in_(product_ids)))
+        return result.scalars().all()
+
+
+def format_validation_error(error):
+    return "; ".join(
+        err["msg"] if err["loc"] == ("__root__",) else f"{'.'.join(map(str, err['loc']))}: {err['msg']}"
+        for err in error.errors()
+    )
+
+
+class PaymentService:
+    """Payment provider stub; a real integration charges the customer here."""
+
+    def charge(self, order_id, amount):
+        return True
+
 
 class OrderService:
-    def __init__(self):
-        pass
+    CREATED_RESPONSE = {"message": "Order created successfully"}
+    ORDER_COLUMNS = (Order.id, Order.status, Order.total_price, Order.created_at)
+
+    def __init__(self, cache=None, queue=None, payments=None):
+        self.cache = cache
+        # Pending orders are handed to this queue for complete_order to run in a worker
+        self.queue = queue
+        self.payments = payments or PaymentService()
 
-    def create_order(self, SESSION, status, products):
-        product_ids = [product.product_id for product in products]
+    def get_order(self, SESSION, order_id, include_items=True):
+        row = SESSION.execute(select(*self.ORDER_COLUMNS).where(Order.id == order_id)).first()
+        if row is None:
+            raise OrderNotFoundError(f"Order {order_id} not found")
+        return self._dump_orders(SESSION, [row], include_items)[0]
+
+    def list_orders(self, SESSION, filters):
+        """Return one page of orders, newest first, and the cursor of the next page, if any."""
+        statement = select(*self.ORDER_COLUMNS)
+        if filters.status is not None:
+            statement = statement.where(Order.status == OrderStatus(filters.status.value))
+        if filters.created_after is not None:
+            statement = statement.where(Order.created_at >= filters.created_after)
+        if filters.created_before is not None:
+            statement = statement.where(Order.created_at < filters.created_before)
+        if filters.cursor_position is not None:
+            created_at, order_id = filters.cursor_position
+            statement = statement.where(
+                or_(Order.created_at < created_at, and_(Order.created_at == created_at, Order.id < order_id))
+            )
+        statement = statement.order_by(Order.created_at.desc(), Order.id.desc()).limit(filters.limit)
+        rows = SESSION.execute(statement).all()
+        next_cursor = None
+        if len(rows) == filters.limit:
+            next_cursor = format_order_cursor(rows[-1].created_at, rows[-1].id)
+        return self._dump_orders(SESSION, rows, filters.include_items), next_cursor
+
+    @staticmethod
+    def _dump_orders(SESSION, rows, include_items):
+        orders = [
+            {
+                "id": row.id,
+                "status": row.status.value,
+                "total_price": row.total_price,
+                "created_at": row.created_at,
+            }
+            for row in rows
+        ]
+        if include_items and orders:
+            # One query for the whole page rather than one per order
+            orders_by_id = {order["id"]: order for order in orders}
+            for order in orders:
+                order["items"] = []
+            items = SESSION.execute(
+                select(OrderItem.order_id, OrderItem.product_id, OrderItem.quantity, OrderItem.unit_price)
+                .where(OrderItem.order_id.in_(orders_by_id))
+                .order_by(OrderItem.id)
+            )
+            for order_id, product_id, quantity, unit_price in items:
+                orders_by_id[order_id]["items"].append(
+                    {"product_id": product_id, "quantity": quantity, "unit_price": unit_price}
+                )
+        return orders
+
+    def create_order(self, SESSION, status, products, idempotency=None):
+        """Place an order; idempotency is an (IdempotencyService, key, request_hash) triple or None.
+
+        products is an OrderLines or a list of lines with product_id and quantity.
+        """
+        lines = OrderLines.from_products(products)
+        products_data = ProductService().get_products_by_ids(SESSION, lines.product_ids)
+        products_data_map = {product.id: product for product in products_data}
+        self._place_order(SESSION, status, lines, products_data_map)
+        if idempotency is None:
+            SESSION.commit()
+        else:
+            idempotency_service, key, request_hash = idempotency
+            idempotency_service.commit_with_response(SESSION, key, request_hash, 200, self.CREATED_RESPONSE)
+        catalog_changed(self.cache)
+        return True
+
+    def create_orders(self, SESSION, orders, atomic=False):
+        """Place many orders with one product lookup and a single commit.
+
+        With atomic=True the first invalid order fails the whole batch. Otherwise each order
+        runs in its own savepoint and failures are reported next to the created orders.
+        """
+        product_ids = list({product.product_id for order in orders for product in order.products})
         products_data = ProductService().get_products_by_ids(SESSION, product_ids)
         products_data_map = {product.id: product for product in products_data}
-        out_of_stock_products = []
-        total_price = 0
-        for product in products:
-            if product.product_id not in products_data_map:
-                raise OrderValidationError(f"Product {product.product_id} not found")
-            current_product=products_data_map[product.product_id]
-            if product.quantity > current_product.stock:
-                out_of_stock_products.append(product.product_id)
+        results = []
+        for index, order in enumerate(orders):
+            try:
+                lines = OrderLines.from_products(order.products)
+                if atomic:
+                    new_order = self._place_order(SESSION, OrderStatus.pending.value, lines, products_data_map)
+                else:
+                    with SESSION.begin_nested():
+                        new_order = self._place_order(SESSION, OrderStatus.pending.value, lines, products_data_map)
+            except OrderValidationError as e:
+                if atomic:
+                    raise OrderValidationError(f"Order {index}: {e.message}")
+                results.append({"index": index, "status": "failed", "error": e.message})
             else:
-                total_price += product.quantity * current_product.price
-                current_product.stock -= product.quantity
-                SESSION.add(current_product)
+                results.append({"index": index, "status": "created", "order_id": new_order.id})
+        SESSION.commit()
+        if any(result["status"] == "created" for result in results):
+            catalog_changed(self.cache)
+        return results
+
+    def _place_order(self, SESSION, status, lines, products_data_map):
+        """Reserve stock and write the order with its items and inventory changes, leaving the
+        commit to the caller."""
+        quantities = self._order_quantities(lines, products_data_map)
+        out_of_stock_products = ProductService().reserve_stock(SESSION, quantities)
         if len(out_of_stock_products) > 0:
             raise OrderValidationError(
                 f"Products {out_of_stock_products} are out of stock"
             )
-        _products=[{"product_id":product.product_id,"quantity":product.quantity} for product in products]
-        new_order = Order(status=status, products=_products, total_price=total_price)
+        new_order = Order(status=status, total_price=0)
         SESSION.add(new_order)
-        SESSION.commit()
+        SESSION.flush()
+        SESSION.execute(insert(OrderItem.__table__), self._order_items(new_order.id, lines, products_data_map))
+        set_committed_value(new_order, "total_price", SESSION.execute(self._total_statement(new_order.id)).scalar_one())
+        record_order(SESSION, new_order.id)
+        if self.queue is not None and status in (OrderStatus.pending, OrderStatus.pending.value):
+            self.queue.enqueue(SESSION, new_order.id)
+        return new_order
+
+    def complete_order(self, SESSION, order_id):
+        """Post-process a pending order: take payment, confirm its stock and mark it completed.
+
+        Runs in a worker inside the caller's transaction; raising leaves the order pending so
+        the job is retried.
+        """
+        order = SESSION.execute(select(Order).where(Order.id == order_id).with_for_update()).scalar_one_or_none()
+        if order is None or order.status == OrderStatus.completed:
+            return False
+        if not self.payments.charge(order.id, order.total_price):
+            raise OrderValidationError(f"Payment for order {order.id} was declined")
+        self._confirm_stock(SESSION, order.id)
+        order.status = OrderStatus.completed
+        return True
+
+    @staticmethod
+    def _confirm_stock(SESSION, order_id):
+        # Stock was reserved when the order was placed; make sure every line still has its product
+        missing = SESSION.execute(
+            select(OrderItem.product_id)
+            .outerjoin(Product, Product.id == OrderItem.product_id)
+            .where(OrderItem.order_id == order_id, Product.id.is_(None))
+        ).scalars().all()
+        if missing:
+            raise OrderValidationError(f"Products {missing} of order {order_id} no longer exist")
+
+    @staticmethod
+    def _order_quantities(lines, products_data_map):
+        """Return the quantity ordered per product id, checking every product exists."""
+        quantities = dict(lines.items())
+        for product_id in quantities:
+            if product_id not in products_data_map:
+                raise OrderValidationError(f"Product {product_id} not found")
+        return quantities
+
+    @staticmethod
+    def _total_statement(order_id):
+        """UPDATE setting the order total to SUM(unit_price_cents * quantity) over its items.
+
+        The database adds the just written items up in integer cents, so the total is exact
+        however many lines the order has and no line is priced in Python.
+        """
+        orders = Order.__table__
+        items = OrderItem.__table__
+        total = (
+            select(func.coalesce(func.sum(items.c.unit_price * items.c.quantity), 0))
+            .where(items.c.order_id == order_id)
+            .scalar_subquery()
+        )
+        return update(orders).where(orders.c.id == order_id).values(total_price=total).returning(orders.c.total_price)
+
+    @staticmethod
+    def _order_items(order_id, lines, products_data_map):
+        # Inserted with one executemany; on PostgreSQL SQLAlchemy batches it into multi-row
+        # INSERT ... VALUES statements without hitting bound parameter limits on huge orders
+        return [
+            {
+                "order_id": order_id,
+                "product_id": product_id,
+                "quantity": quantity,
+                "unit_price": products_data_map[product_id].price,
+            }
+            for product_id, quantity in lines.items()
+        ]
+
+    async def create_order_async(self, SESSION, status, products, idempotency=None):
+        lines = OrderLines.from_products(products)
+        products_data = await ProductService().get_products_by_ids_async(SESSION, lines.product_ids)
+        products_data_map = {product.id: product for product in products_data}
+        await SESSION.run_sync(self._place_order, status, lines, products_data_map)
+        if idempotency is None:
+            await SESSION.commit()
+        else:
+            idempotency_service, key, request_hash = idempotency
+            await SESSION.run_sync(
+                idempotency_service.commit_with_response, key, request_hash, 200, self.CREATED_RESPONSE
+            )
+        await asyncio.to_thread(catalog_changed, self.cache)
+        return True
+
+
+class IdempotencyService:
+    """Stores responses by Idempotency-Key so client retries replay instead of re-executing."""
+
+    _last_purge = 0.0
+
+    def __init__(self, cache=None, ttl=86400):
+        self.cache = cache
+        self.ttl = ttl
+
+    @staticmethod
+    def hash_request(payload):
+        return hashlib.sha256(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+    def get_response(self, SESSION, key, request_hash):
+        """Return the stored (status_code, body) for key, or None if the request is new.
+
+        The in-process cache answers repeated retries without a query; otherwise this is a
+        single primary key lookup.
+        """
+        stored = self.cache.get(key) if self.cache is not None else None
+        if stored is None:
+            row = SESSION.get(IdempotencyKey, key)
+            if row is None:
+                return None
+            if row.created_at < datetime.utcnow() - timedelta(seconds=self.ttl):
+                # Expired but not purged yet; free the key for this request
+                SESSION.delete(row)
+                SESSION.flush()
+                return None
+            stored = (row.request_hash, row.status_code, row.response)
+            if self.cache is not None:
+                self.cache.set(key, stored)
+        stored_hash, status_code, response = stored
+        if stored_hash != request_hash:
+            raise IdempotencyKeyConflictError("Idempotency-Key was already used for a different request")
+        return status_code, response
+
+    def commit_with_response(self, SESSION, key, request_hash, status_code, response):
+        """Record the response in the caller's transaction and commit both together."""
+        SESSION.add(IdempotencyKey(key=key, request_hash=request_hash, status_code=status_code, response=response))
+        try:
+            SESSION.commit()
+        except IntegrityError:
+            # A concurrent request with the same key committed first; this one must not apply
+            SESSION.rollback()
+            raise IdempotencyKeyInUseError("A request with this Idempotency-Key was already processed")
+        if self.cache is not None:
+            self.cache.set(key, (request_hash, status_code, response))
+
+    def purge_expired(self, SESSION, batch_size=1000):
+        """Delete expired keys in batches using the created_at index; returns the number deleted."""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.ttl)
+        table = IdempotencyKey.__table__
+        deleted = 0
+        while True:
+            keys = SESSION.execute(
+                select(table.c.key).where(table.c.created_at < cutoff).order_by(table.c.created_at).limit(batch_size)
+            ).scalars().all()
+            if not keys:
+                return deleted
+            SESSION.execute(delete(table).where(table.c.key.in_(keys)))
+            SESSION.commit()
+            deleted += len(keys)
+
+    @classmethod
+    def purge_due(cls, interval):
+        """True at most once per interval per process, to schedule purge_expired."""
+        now = time.monotonic()
+        if now - cls._last_purge < interval:
+            return False
+        cls._last_purge = now
         return True
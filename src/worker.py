@@ -0,0 +1,96 @@
+"""Order completion workers: python -m src.worker [--concurrency N]
+
+Each worker thread claims a batch of queued order jobs, completes every order in its own
+savepoint and commits the batch. Run as many processes as needed; with the database queue
+they never claim the same job twice.
+"""
+import argparse
+import logging
+import signal
+import threading
+
+from config import config
+from db import get_session_factory
+from src.jobs import get_order_queue
+from src.service import OrderService
+
+logger = logging.getLogger(__name__)
+
+
+class OrderWorker:
+    def __init__(self, queue, session_factory, batch_size=10, poll_interval=1.0, order_service=None):
+        self.queue = queue
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.order_service = order_service or OrderService()
+
+    def run_once(self):
+        """Process one batch of jobs; returns how many were claimed."""
+        session = self.session_factory()
+        try:
+            jobs = self.queue.claim(session, self.batch_size)
+            for job in jobs:
+                try:
+                    with session.begin_nested():
+                        self.order_service.complete_order(session, job.order_id)
+                except Exception as e:
+                    logger.warning("Completing order %s failed (attempt %d): %s", job.order_id, job.attempts + 1, e)
+                    self.queue.fail(session, job, e)
+                else:
+                    self.queue.complete(session, job)
+            session.commit()
+            return len(jobs)
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def run(self, stop_event):
+        while not stop_event.is_set():
+            try:
+                claimed = self.run_once()
+            except Exception:
+                logger.exception("Order worker batch failed")
+                claimed = 0
+            # Keep draining while batches come back full, otherwise wait for new jobs
+            if claimed < self.batch_size:
+                stop_event.wait(self.poll_interval)
+
+
+def start_workers(concurrency, stop_event):
+    worker = OrderWorker(
+        get_order_queue(),
+        get_session_factory(),
+        batch_size=config.WORKER_BATCH_SIZE,
+        poll_interval=config.WORKER_POLL_INTERVAL,
+    )
+    threads = [
+        threading.Thread(target=worker.run, args=(stop_event,), name=f"order-worker-{i}", daemon=True)
+        for i in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run order completion workers")
+    parser.add_argument("--concurrency", type=int, default=config.WORKER_CONCURRENCY)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    stop_event = threading.Event()
+    # Finish the batch in hand, then exit
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+    threads = start_workers(args.concurrency, stop_event)
+    logger.info("Started %d order workers", len(threads))
+    for thread in threads:
+        while thread.is_alive():
+            thread.join(timeout=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import pytest
+import os, sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import db
+from db import Base
+import src.model  # noqa: F401  registers the models on Base.metadata
+
+
+@pytest.fixture
+def database_url(tmp_path):
+    # Fresh SQLite database with every table created
+    url = f"sqlite:///{tmp_path / 'store.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    engine.dispose()
+    return url
+
+
+@pytest.fixture
+def engine(database_url):
+    # Sized for the threaded tests; the timeout lets concurrent SQLite writers wait for the lock
+    engine = create_engine(database_url, pool_size=16, connect_args={"timeout": 30})
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    return sessionmaker(bind=engine)
+
+
+@pytest.fixture
+def session(session_factory):
+    with session_factory() as session:
+        yield session
+
+
+@pytest.fixture
+def cache_backend():
+    # CACHE_BACKEND for app_client; override or parametrize it by this name
+    return "memory"
+
+
+@pytest.fixture
+def app_client(database_url, cache_backend, monkeypatch):
+    # Test client for main:app running against database_url
+    from fastapi.testclient import TestClient
+    from main import app
+    from src.cache import get_catalog_cache
+    from src.search import search_index
+
+    monkeypatch.setenv("DATABASE_URL", database_url)
+    monkeypatch.setenv("CACHE_BACKEND", cache_backend)
+    db.reset_engines()
+    get_catalog_cache.cache_clear()
+    search_index.clear()
+    yield TestClient(app)
+    monkeypatch.undo()
+    db.reset_engines()
+    get_catalog_cache.cache_clear()
+    search_index.clear()
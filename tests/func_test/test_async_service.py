@@ -0,0 +1,164 @@
+import asyncio
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from db import create_async_db_engine, to_async_url
+from src.service import ProductService, OrderService
+from src.exception import OrderValidationError, ProductNameDuplicateError
+
+
+class InputProduct:
+    def __init__(self, product_id, quantity):
+        self.product_id = product_id
+        self.quantity = quantity
+
+
+@pytest.fixture
+def run_with_session(database_url):
+    # Run a coroutine against the fresh database through aiosqlite, standing in for asyncpg
+    def run(coroutine_fn):
+        async def main():
+            engine = create_async_db_engine(to_async_url(database_url))
+            try:
+                async with async_sessionmaker(bind=engine, expire_on_commit=False)() as session:
+                    return await coroutine_fn(session)
+            finally:
+                await engine.dispose()
+
+        return asyncio.run(main())
+
+    return run
+
+
+def test_to_async_url():
+    assert to_async_url("postgresql://user:pw@db/store").drivername == "postgresql+asyncpg"
+    assert to_async_url("postgresql+psycopg2://user:pw@db/store").drivername == "postgresql+asyncpg"
+    assert to_async_url("sqlite:///store.db").drivername == "sqlite+aiosqlite"
+    with pytest.raises(ValueError):
+        to_async_url("mysql://user:pw@db/store")
+
+
+def test_create_and_get_products_async(run_with_session):
+    """
+    Test case for creating and listing products through the async service path.
+    """
+    async def scenario(session):
+        service = ProductService()
+        created = await service.create_product_async(session, "Product 1", "First", 10.0, 5)
+        await service.create_product_async(session, "Product 2", "Second", 20.0, 3)
+        return created, await service.get_all_products_async(session)
+
+    created, products = run_with_session(scenario)
+
+    assert created["name"] == "Product 1"
+    assert created["id"] is not None
+    assert [product["name"] for product in products] == ["Product 1", "Product 2"]
+    assert products[1]["price"] == 20.0
+
+
+def test_create_product_async_duplicate_name_failure(run_with_session):
+    """
+    Test case for failure when a product with the same name already exists.
+    """
+    async def scenario(session):
+        service = ProductService()
+        await service.create_product_async(session, "Product 1", "First", 10.0, 5)
+        await service.create_product_async(session, "Product 1", "Again", 10.0, 5)
+
+    with pytest.raises(ProductNameDuplicateError):
+        run_with_session(scenario)
+
+
+def test_create_order_async_success(run_with_session):
+    """
+    Test case for successfully creating an order through the async service path.
+    """
+    async def scenario(session):
+        await ProductService().create_product_async(session, "Product 1", "First", 50.0, 5)
+        await ProductService().create_product_async(session, "Product 2", "Second", 30.0, 2)
+        result = await OrderService().create_order_async(
+            session, status="pending", products=[InputProduct(1, 2), InputProduct(2, 1)]
+        )
+        return result, await ProductService().get_all_products_async(session)
+
+    result, products = run_with_session(scenario)
+
+    assert result is True
+    assert [product["stock"] for product in products] == [3, 1]
+
+
+def test_create_order_async_out_of_stock_failure(run_with_session):
+    """
+    Test case for failure when a product is out of stock.
+    """
+    async def scenario(session):
+        await ProductService().create_product_async(session, "Product 1", "First", 50.0, 1)
+        await OrderService().create_order_async(session, status="pending", products=[InputProduct(1, 2)])
+
+    with pytest.raises(OrderValidationError) as excinfo:
+        run_with_session(scenario)
+    assert str(excinfo.value.message) == "Products [1] are out of stock"
+
+
+def test_async_writes_invalidate_cached_catalog(run_with_session, session_factory):
+    """
+    Test case for async product and order writes bumping the catalog version cached reads use.
+    """
+    from src.cache import CatalogCache, LRUTTLCache
+
+    cache = CatalogCache(LRUTTLCache(max_size=16, ttl=60))
+    reader = ProductService(cache=cache)
+
+    def cached_stock():
+        with session_factory() as session:
+            return [product["stock"] for product in reader.get_all_products(session)]
+
+    async def scenario(session):
+        await ProductService(cache=cache).create_product_async(session, "Product 1", "First", 50.0, 5)
+        first = cached_stock()
+        await OrderService(cache=cache).create_order_async(session, status="pending", products=[InputProduct(1, 2)])
+        return first, cached_stock()
+
+    first, after_order = run_with_session(scenario)
+
+    assert first == [5]
+    assert after_order == [3]
+    assert cache.version == 2
+
+
+def test_async_listing_uses_the_catalog_cache_and_etag(run_with_session, session_factory, mocker):
+    """
+    Test case for async GET /products reading through the same cache entries and answering
+    with the same ETag as the sync route.
+    """
+    from starlette.requests import Request
+    from src import async_router, router
+    from src.cache import CatalogCache, LRUTTLCache
+    from src.request import ProductQueryRequest
+
+    cache = CatalogCache(LRUTTLCache(max_size=16, ttl=60))
+    mocker.patch.object(async_router, "get_catalog_cache", return_value=cache)
+    mocker.patch.object(router, "get_catalog_cache", return_value=cache)
+    args = ProductQueryRequest(limit=10)
+
+    def request(headers=()):
+        return Request({"type": "http", "method": "GET", "path": "/products", "query_string": b"limit=10", "headers": list(headers)})
+
+    async def scenario(session):
+        await ProductService(cache=cache).create_product_async(session, "Product 1", "First", 50.0, 5)
+        response = await async_router.get_all_products_async(request(), args, session)
+        etag = response.headers["etag"]
+        cached = await async_router.get_all_products_async(request(), args, session)
+        revalidated = await async_router.get_all_products_async(request([(b"if-none-match", etag.encode())]), args, session)
+        return response, cached, revalidated.status_code
+
+    response, cached, revalidated = run_with_session(scenario)
+    assert response.body == cached.body
+    assert (cache.stats.misses, cache.stats.hits) == (1, 1)
+    assert revalidated == 304
+
+    with session_factory() as session:
+        sync_response = router.get_all_products(request(), args, session)
+    # The sync route finds the page the async one cached, under the same ETag
+    assert sync_response.body == response.body
+    assert sync_response.headers["etag"] == response.headers["etag"]
+    assert (cache.stats.misses, cache.stats.hits) == (1, 2)
@@ -0,0 +1,110 @@
+import pytest
+from unittest.mock import MagicMock
+from src.cache import CatalogCache, LRUTTLCache, RedisCache
+from src.service import ProductService, OrderService
+from src.model import Product
+
+
+class FakeRedis:
+    # Minimal stand-in for the redis client commands the cache uses
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def incr(self, key):
+        self.data[key] = str(int(self.data.get(key, 0)) + 1).encode()
+        return int(self.data[key])
+
+
+@pytest.fixture(params=["memory", "redis"])
+def catalog_cache(request):
+    if request.param == "redis":
+        return CatalogCache(RedisCache(FakeRedis(), ttl=30))
+    return CatalogCache(LRUTTLCache(max_size=16, ttl=30))
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUTTLCache(max_size=2, ttl=30)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats.evictions == 1
+
+
+def test_lru_cache_expires_entries(mocker):
+    clock = mocker.patch("src.cache.time.monotonic", return_value=100.0)
+    cache = LRUTTLCache(max_size=2, ttl=30)
+    cache.set("a", 1)
+
+    clock.return_value = 129.0
+    assert cache.get("a") == 1
+    clock.return_value = 131.0
+    assert cache.get("a") is None
+    assert cache.stats.expirations == 1
+    assert len(cache) == 0
+
+
+def test_catalog_cache_read_through(catalog_cache):
+    loader = MagicMock(return_value={"products": [{"id": 1}], "next_after_id": None})
+
+    assert catalog_cache.get_or_load("products:all", loader) == {"products": [{"id": 1}], "next_after_id": None}
+    assert catalog_cache.get_or_load("products:all", loader) == {"products": [{"id": 1}], "next_after_id": None}
+
+    loader.assert_called_once()
+    assert catalog_cache.stats.snapshot()["hits"] == 1
+    assert catalog_cache.stats.snapshot()["misses"] == 1
+
+
+def test_catalog_cache_invalidate(catalog_cache):
+    loader = MagicMock(side_effect=[{"products": [], "next_after_id": None}, {"products": [{"id": 1}], "next_after_id": None}])
+    catalog_cache.get_or_load("products:all", loader)
+
+    assert catalog_cache.invalidate() == 1
+    assert catalog_cache.get_or_load("products:all", loader)["products"] == [{"id": 1}]
+    assert loader.call_count == 2
+
+
+def test_product_service_serves_cached_pages(catalog_cache):
+    """
+    Test case for GET /products reads being served from the cache until a product is created.
+    """
+    session = MagicMock()
+    session.query.return_value.all.return_value = [(1, "Product 1", None, 10.0, 5)]
+    service = ProductService(cache=catalog_cache)
+
+    assert service.get_all_products(session)[0]["name"] == "Product 1"
+    assert service.get_all_products(session)[0]["name"] == "Product 1"
+    assert session.query.call_count == 1
+
+    session.query.return_value.filter.return_value.first.return_value = None
+    service.create_product(session, "Product 2", "Second", 20.0, 1)
+    session.query.return_value.all.return_value = [(1, "Product 1", None, 10.0, 5), (2, "Product 2", "Second", 20.0, 1)]
+
+    assert len(service.get_all_products(session)) == 2
+
+
+def test_order_service_invalidates_cache(catalog_cache, mocker):
+    """
+    Test case for order creation invalidating cached catalog stock.
+    """
+    class InputProduct:
+        product_id = 1
+        quantity = 1
+
+    mock_product_service = mocker.patch("src.service.ProductService")
+    mock_product_service.return_value.get_products_by_ids.return_value = [Product(id=1, name="Product 1", price=10.0, stock=5)]
+    mock_product_service.return_value.reserve_stock.return_value = []
+
+    OrderService(cache=catalog_cache).create_order(MagicMock(), status="pending", products=[InputProduct()])
+
+    assert catalog_cache.version == 1
@@ -0,0 +1,152 @@
+import pytest
+from datetime import datetime
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+from src.compression import CompressionMiddleware, accepted_encodings, etag_matches
+from src.model import InventoryChange, Product
+
+
+def compressed_app(**options):
+    async def small(request):
+        return PlainTextResponse("ok")
+
+    async def large(request):
+        return PlainTextResponse("x" * 5000, headers={"ETag": '"v1"'})
+
+    def streamed(media_type):
+        async def stream(request):
+            async def chunks():
+                for i in range(3):
+                    yield f"line {i}\n" * 200
+            return StreamingResponse(chunks(), media_type=media_type)
+        return stream
+
+    app = Starlette(routes=[
+        Route("/small", small),
+        Route("/large", large),
+        Route("/stream", streamed("text/csv")),
+        Route("/ndjson", streamed("application/x-ndjson")),
+        Route("/events", streamed("text/event-stream")),
+    ])
+    return TestClient(CompressionMiddleware(app, minimum_size=1000, **options))
+
+
+@pytest.fixture
+def catalog(engine, app_client):
+    with engine.begin() as connection:
+        connection.execute(insert(Product.__table__), [{"name": f"P{i}", "description": "x" * 50, "price": 1.0, "stock": 5} for i in range(50)])
+    return app_client
+
+
+def test_accepted_encodings_honour_quality_values():
+    assert accepted_encodings("gzip, br;q=0.5, deflate;q=0") == {"gzip": 1.0, "br": 0.5}
+    assert accepted_encodings(None) == {}
+
+
+def test_etag_matches_compressed_variants():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('"other", W/"abc-gzip"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"abd"', '"abc"')
+    assert not etag_matches(None, '"abc"')
+
+
+def test_gzip_compresses_large_responses_only():
+    client = compressed_app()
+
+    response = client.get("/large", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] == '"v1-gzip"'
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.text == "x" * 5000
+
+    response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.text == "ok"
+
+    response = client.get("/large", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"] == '"v1"'
+
+
+def test_streamed_responses_are_compressed_chunk_by_chunk():
+    client = compressed_app()
+    response = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.text == "".join(f"line {i}\n" * 200 for i in range(3))
+
+
+@pytest.mark.parametrize("path", ["/ndjson", "/events"])
+def test_line_streams_are_not_compressed(path):
+    """
+    Test case for NDJSON and Server-Sent Events reaching the client as plain lines.
+    """
+    response = compressed_app().get(path, headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.text == "".join(f"line {i}\n" * 200 for i in range(3))
+
+
+def test_brotli_is_preferred_when_installed():
+    pytest.importorskip("brotli")
+    client = compressed_app()
+    response = client.get("/large", headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers["content-encoding"] == "br"
+    assert response.text == "x" * 5000
+
+
+def test_unchanged_catalog_is_answered_with_304_without_loading_it(catalog):
+    """
+    Test case for revalidating the product listing before and after the catalog changes.
+    """
+    response = catalog.get("/products?limit=50", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    etag = response.headers["etag"]
+    assert etag.endswith('-gzip"')
+
+    response = catalog.get("/products?limit=50", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    # Only the catalog version is read
+    assert '"1 queries"' in response.headers["server-timing"]
+
+    # Another query string is another representation
+    assert catalog.get("/products?limit=10", headers={"If-None-Match": etag}).status_code == 200
+
+    response = catalog.post("/products", json={"name": "new", "description": "", "price": 2.0, "stock": 1})
+    assert response.status_code == 200
+    response = catalog.get("/products?limit=50", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+@pytest.mark.parametrize("cache_backend", ["none", "memory"])
+def test_etag_follows_writes_without_a_shared_cache(catalog, engine):
+    """
+    Test case for the ETag coming from the database, so it is the same in every worker and
+    changes with writes the local cache never saw.
+    """
+    from src.cache import get_catalog_cache
+
+    response = catalog.get("/products?name_prefix=Else")
+    assert response.json() == []
+    etag = response.headers["etag"]
+
+    # A fresh cache, as in another worker, agrees on the validator
+    get_catalog_cache.cache_clear()
+    assert catalog.get("/products?name_prefix=Else", headers={"If-None-Match": etag}).status_code == 304
+
+    # A write this process's cache is not told about, as from another worker
+    with engine.begin() as connection:
+        connection.execute(insert(Product.__table__), [{"id": 1000, "name": "Elsewhere", "price": 1.0, "stock": 5}])
+        connection.execute(insert(InventoryChange.__table__), [
+            {"product_id": 1000, "reason": "created", "delta": 5, "stock": 5, "created_at": datetime.utcnow()}
+        ])
+    response = catalog.get("/products?name_prefix=Else", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert [product["name"] for product in response.json()] == ["Elsewhere"]
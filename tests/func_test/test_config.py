@@ -0,0 +1,53 @@
+import json
+import subprocess
+import pytest
+import os, sys
+import db
+from config import get_config
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../'))
+
+
+@pytest.fixture
+def settings_env(tmp_path, monkeypatch):
+    # Point the settings at a scratch env.json and rebuild engines/settings around the test
+    env_file = tmp_path / "env.json"
+    env_file.write_text(json.dumps({"DATABASE_URL": f"sqlite:///{tmp_path / 'file.db'}", "POOL_SIZE": 3}))
+    monkeypatch.setenv("ENV_FILE", str(env_file))
+    db.reset_engines()
+    yield tmp_path
+    monkeypatch.undo()
+    db.reset_engines()
+
+
+def test_environment_variables_override_env_file(settings_env, monkeypatch):
+    assert get_config().POOL_SIZE == 3
+    assert get_config() is get_config()
+
+    monkeypatch.setenv("POOL_SIZE", "7")
+    assert get_config().POOL_SIZE == 3
+    get_config.cache_clear()
+    assert get_config().POOL_SIZE == 7
+
+
+def test_reset_engines_switches_database(settings_env, monkeypatch):
+    """
+    Test case for pointing the app at another database without patching db module globals.
+    """
+    assert db.get_engine().url.database == str(settings_env / "file.db")
+    assert db.get_engine() is db.get_engine()
+
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{settings_env / 'other.db'}")
+    db.reset_engines()
+
+    assert db.get_engine().url.database == str(settings_env / "other.db")
+    assert db.get_session_factory().kw["bind"] is db.get_engine()
+
+
+def test_importing_the_app_does_not_read_settings(tmp_path):
+    """
+    Test case for importing the routers working without any env.json or database.
+    """
+    code = "import src.router, src.async_router, db; from config import get_config; assert get_config.cache_info().currsize == 0"
+    env = {**os.environ, "ENV_FILE": str(tmp_path / "missing.json"), "PYTHONPATH": ROOT}
+    subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env=env, check=True)
@@ -0,0 +1,103 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError, TimeoutError
+import db
+from db import create_db_engine, get_session, pool_metrics
+
+
+@pytest.fixture
+def sqlite_engine(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'pool.db'}", pool_size=2, max_overflow=0, pool_timeout=0.1)
+    yield engine
+    engine.dispose()
+
+
+def test_get_session_closes_session(mocker):
+    """
+    Test case for the request-scoped session being closed once the request is done.
+    """
+    session = mocker.MagicMock()
+    mocker.patch.object(db, "get_session_factory", return_value=mocker.MagicMock(return_value=session))
+
+    dependency = get_session()
+    assert next(dependency) is session
+    session.close.assert_not_called()
+
+    with pytest.raises(StopIteration):
+        next(dependency)
+    session.close.assert_called_once()
+
+
+def test_get_session_returns_a_new_session_per_request():
+    """
+    Test case for every request getting its own session instead of a shared one.
+    """
+    first, second = get_session(), get_session()
+    try:
+        assert next(first) is not next(second)
+    finally:
+        first.close()
+        second.close()
+
+
+def test_pool_metrics_track_checkouts(sqlite_engine):
+    """
+    Test case for pool checkout/checkin counters.
+    """
+    pool_metrics.reset()
+    with sqlite_engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+        assert pool_metrics.snapshot()["checked_out"] == 1
+
+    metrics = pool_metrics.snapshot()
+    assert metrics["checkouts"] == 1
+    assert metrics["checkins"] == 1
+    assert metrics["checked_out"] == 0
+    assert metrics["wait_count"] == 1
+
+
+def test_pool_metrics_track_timeouts(sqlite_engine):
+    """
+    Test case for exhausting the pool and timing out while waiting for a connection.
+    """
+    pool_metrics.reset()
+    first, second = sqlite_engine.connect(), sqlite_engine.connect()
+    try:
+        with pytest.raises(TimeoutError):
+            sqlite_engine.connect()
+    finally:
+        first.close()
+        second.close()
+
+    metrics = pool_metrics.snapshot()
+    assert metrics["timeouts"] == 1
+    assert metrics["wait_seconds_max"] >= 0.1
+
+
+def test_pool_metrics_separate_connect_errors_from_timeouts(tmp_path):
+    """
+    Test case for a failing connect being counted as a connect error, not a checkout timeout.
+    """
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'missing' / 'pool.db'}", pool_size=2, max_overflow=0, pool_timeout=0.1)
+    pool_metrics.reset()
+    try:
+        with pytest.raises(OperationalError):
+            engine.connect()
+    finally:
+        engine.dispose()
+
+    metrics = pool_metrics.snapshot()
+    assert metrics["timeouts"] == 0
+    assert metrics["connect_errors"] == 1
+
+
+def test_warm_up_pool_fills_the_pool(sqlite_engine):
+    """
+    Test case for startup warm-up leaving pool_size idle connections in the pool.
+    """
+    from db import warm_up_pool
+
+    warm_up_pool(sqlite_engine, 2)
+
+    assert sqlite_engine.pool.checkedin() == 2
+    assert sqlite_engine.pool.checkedout() == 0
@@ -0,0 +1,84 @@
+import pytest
+from datetime import datetime, timedelta
+from src.cache import LRUTTLCache
+from src.model import IdempotencyKey, Order, Product
+from src.service import IdempotencyService, OrderService
+from src.exception import IdempotencyKeyConflictError, IdempotencyKeyInUseError
+
+
+class InputProduct:
+    def __init__(self, product_id, quantity):
+        self.product_id = product_id
+        self.quantity = quantity
+
+
+@pytest.fixture
+def session_factory(session_factory):
+    with session_factory() as session:
+        session.add(Product(id=1, name="Product 1", price=10.0, stock=5))
+        session.commit()
+    return session_factory
+
+
+def test_replay_returns_stored_response(session_factory):
+    """
+    Test case for a retried order being answered from the store without placing it again.
+    """
+    service = IdempotencyService(cache=LRUTTLCache(max_size=10, ttl=60), ttl=60)
+    request_hash = service.hash_request({"status": "pending", "products": [{"product_id": 1, "quantity": 2}]})
+
+    with session_factory() as session:
+        assert service.get_response(session, "key-1", request_hash) is None
+        OrderService().create_order(
+            session, "pending", [InputProduct(1, 2)], idempotency=(service, "key-1", request_hash)
+        )
+
+    with session_factory() as session:
+        assert service.get_response(session, "key-1", request_hash) == (200, OrderService.CREATED_RESPONSE)
+        assert session.get(Product, 1).stock == 3
+        assert session.query(Order).count() == 1
+
+    # Without the in-process cache the stored row answers the replay
+    uncached = IdempotencyService(ttl=60)
+    with session_factory() as session:
+        assert uncached.get_response(session, "key-1", request_hash) == (200, OrderService.CREATED_RESPONSE)
+
+
+def test_key_reused_for_different_request(session_factory):
+    service = IdempotencyService(ttl=60)
+    with session_factory() as session:
+        service.commit_with_response(session, "key-1", "a" * 64, 200, {"message": "ok"})
+        with pytest.raises(IdempotencyKeyConflictError):
+            service.get_response(session, "key-1", "b" * 64)
+
+
+def test_concurrent_duplicate_is_rolled_back(session_factory):
+    """
+    Test case for the losing request of two concurrent retries not placing a second order.
+    """
+    service = IdempotencyService(ttl=60)
+    with session_factory() as session:
+        service.commit_with_response(session, "key-1", "a" * 64, 200, OrderService.CREATED_RESPONSE)
+
+    with session_factory() as session:
+        with pytest.raises(IdempotencyKeyInUseError):
+            OrderService().create_order(session, "pending", [InputProduct(1, 2)], idempotency=(service, "key-1", "a" * 64))
+        assert session.get(Product, 1).stock == 5
+        assert session.query(Order).count() == 0
+
+
+def test_expired_keys_are_ignored_and_purged(session_factory):
+    service = IdempotencyService(ttl=60)
+    expired_at = datetime.utcnow() - timedelta(seconds=120)
+    with session_factory() as session:
+        session.add_all([
+            IdempotencyKey(key=f"old-{i}", request_hash="a" * 64, status_code=200, response={}, created_at=expired_at)
+            for i in range(5)
+        ])
+        session.add(IdempotencyKey(key="fresh", request_hash="a" * 64, status_code=200, response={}))
+        session.commit()
+
+        assert service.get_response(session, "old-0", "b" * 64) is None
+        session.commit()
+        assert service.purge_expired(session, batch_size=2) == 4
+        assert [row.key for row in session.query(IdempotencyKey)] == ["fresh"]
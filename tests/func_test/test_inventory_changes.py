@@ -0,0 +1,143 @@
+import asyncio
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+import orjson
+from src.changes import InventoryChangeService, is_low_stock
+from src.model import InventoryChange, Product
+
+
+@pytest.fixture
+def cache_backend():
+    return "none"
+
+
+def test_writes_append_inventory_changes(app_client):
+    """
+    Test case for product creation, bulk import and orders logging their stock changes in order.
+    """
+    assert app_client.post("/products", json={"name": "Lamp", "description": "", "price": 9.5, "stock": 12}).status_code == 200
+    response = app_client.post(
+        "/products/bulk", data=orjson.dumps([{"name": "Desk", "description": "", "price": 90, "stock": 3}]),
+        headers={"Content-Type": "application/json"},
+    )
+    assert response.json()["inserted"] == 1
+    assert app_client.post("/orders", json={"status": "pending", "products": [
+        {"product_id": 1, "quantity": 2}, {"product_id": 2, "quantity": 1}, {"product_id": 1, "quantity": 1},
+    ]}).status_code == 200
+    # A rejected order changes no stock and logs nothing
+    assert app_client.post("/orders", json={"status": "pending", "products": [{"product_id": 2, "quantity": 5}]}).status_code == 409
+
+    changes = app_client.get("/inventory/changes").json()
+    assert [(c["id"], c["product_id"], c["order_id"], c["reason"], c["delta"], c["stock"]) for c in changes] == [
+        (1, 1, None, "created", 12, 12),
+        (2, 2, None, "created", 3, 3),
+        (3, 1, 1, "ordered", -3, 9),
+        (4, 2, 1, "ordered", -1, 2),
+    ]
+
+    response = app_client.get("/inventory/changes?since=1&limit=2")
+    assert [change["id"] for change in response.json()] == [2, 3]
+    assert response.headers["X-Next-Cursor"] == "3"
+    response = app_client.get("/inventory/changes?since=3&limit=2")
+    assert [change["id"] for change in response.json()] == [4]
+    assert "X-Next-Cursor" not in response.headers
+    assert app_client.get("/inventory/changes?since=-1").status_code == 422
+
+
+def test_purge_keeps_the_newest_change_and_ids_are_not_reused(engine, session):
+    """
+    Test case for a cursor at the newest change still working after old changes are purged.
+    """
+    old = datetime.utcnow() - timedelta(days=30)
+    with engine.begin() as connection:
+        connection.execute(insert(Product.__table__), [{"id": 1, "name": "Lamp", "price": 1.0, "stock": 5}])
+        connection.execute(insert(InventoryChange.__table__), [
+            {"product_id": 1, "reason": "ordered", "delta": -1, "stock": 5, "created_at": old} for _ in range(3)
+        ])
+    service = InventoryChangeService()
+
+    assert service.latest_id(session) == 3
+    # The newest change stays, so the catalog version does not go back
+    assert service.purge_older_than(session, days=7) == 2
+    assert service.catalog_version(session) == "3"
+
+    session.execute(InventoryChange.__table__.delete())
+    session.add(InventoryChange(product_id=1, reason="ordered", delta=-1, stock=4))
+    session.commit()
+    # AUTOINCREMENT hands out 4, so a consumer that last saw 3 still receives it
+    assert [change["id"] for change in service.list_changes(session, 3, 10)] == [4]
+
+
+def test_postgresql_reads_changes_in_commit_order():
+    from sqlalchemy.dialects import postgresql
+    from unittest.mock import MagicMock
+
+    session = MagicMock()
+    session.get_bind.return_value.dialect.name = "postgresql"
+    session.execute.return_value = []
+
+    assert InventoryChangeService().list_changes(session, 12, 100) == []
+
+    (statement,) = session.execute.call_args[0]
+    sql = " ".join(str(statement.compile(dialect=postgresql.dialect())).split())
+    assert "inventory_changes.txid < txid_snapshot_xmin(txid_current_snapshot())" in sql
+    assert "(inventory_changes.txid, inventory_changes.id) > (coalesce((SELECT previous.txid" in sql
+    assert "ORDER BY inventory_changes.txid, inventory_changes.id LIMIT" in sql
+
+
+def test_postgresql_catalog_version_counts_changes_committed_ahead():
+    from sqlalchemy.dialects import postgresql
+    from unittest.mock import MagicMock
+
+    session = MagicMock()
+    session.get_bind.return_value.dialect.name = "postgresql"
+    session.execute.return_value.first.return_value = (7, 42)
+    session.execute.return_value.scalar.return_value = 2
+
+    # Change 42 of transaction 7 is the last below the horizon; two more committed since
+    assert InventoryChangeService().catalog_version(session) == "42+2"
+    (statement,) = session.execute.call_args[0]
+    sql = " ".join(str(statement.compile(dialect=postgresql.dialect())).split())
+    assert "WHERE (inventory_changes.txid, inventory_changes.id) > (%(param_1)s, %(param_2)s)" in sql
+
+
+def test_stream_sends_changes_and_low_stock_events(engine, session_factory):
+    with engine.begin() as connection:
+        connection.execute(insert(Product.__table__), [{"id": 1, "name": "Lamp", "price": 1.0, "stock": 4}])
+        connection.execute(insert(InventoryChange.__table__), [
+            {"id": 1, "product_id": 1, "reason": "created", "delta": 20, "stock": 20, "created_at": datetime.utcnow()},
+            {"id": 2, "product_id": 1, "reason": "ordered", "delta": -8, "stock": 12, "created_at": datetime.utcnow()},
+            {"id": 3, "product_id": 1, "reason": "ordered", "delta": -8, "stock": 4, "created_at": datetime.utcnow()},
+        ])
+    polls = []
+
+    async def is_disconnected():
+        polls.append(1)
+        return len(polls) > 1
+
+    async def collect(**options):
+        stream = InventoryChangeService().stream(
+            session_factory, low_stock_threshold=5, is_disconnected=is_disconnected, poll_interval=0, **options
+        )
+        return b"".join([chunk async for chunk in stream]).decode()
+
+    body = asyncio.run(collect(since=1, low_stock_only=False))
+    events = body.split("\n\n")
+    assert events[0] == "retry: 0"
+    assert events[1].startswith("id: 2\nevent: inventory_change\ndata: ")
+    # The low_stock event closes the change it belongs to, so it carries the id for resuming
+    assert events[2].startswith("event: inventory_change\ndata: ")
+    assert events[3].startswith("id: 3\nevent: low_stock\ndata: ")
+    assert orjson.loads(events[3].split("data: ", 1)[1])["stock"] == 4
+
+    polls.clear()
+    body = asyncio.run(collect(since=0, low_stock_only=True))
+    assert [event.split("\n")[:2] for event in body.split("\n\n")[1:-1]] == [["id: 3", "event: low_stock"]]
+
+
+def test_low_stock_is_reported_when_crossing_the_threshold():
+    assert is_low_stock({"reason": "ordered", "delta": -3, "stock": 5}, 5)
+    assert not is_low_stock({"reason": "ordered", "delta": -1, "stock": 4}, 5)
+    assert not is_low_stock({"reason": "ordered", "delta": -3, "stock": 6}, 5)
+    assert is_low_stock({"reason": "created", "delta": 2, "stock": 2}, 5)
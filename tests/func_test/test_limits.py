@@ -0,0 +1,76 @@
+import pytest
+from fastapi.testclient import TestClient
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route, Router
+from fastapi.exceptions import RequestValidationError
+from src.limits import BodySizeLimitMiddleware
+from src.request import CreateOrderRequest, parse_order_request
+
+
+@pytest.fixture
+def client():
+    async def echo(request):
+        return PlainTextResponse(str(len(await request.body())))
+
+    app = Router(routes=[Route("/orders", echo, methods=["POST"]), Route("/products/bulk", echo, methods=["POST"])])
+    return TestClient(BodySizeLimitMiddleware(app, max_size=100, paths=["/orders"]))
+
+
+@pytest.fixture
+def max_lines(monkeypatch):
+    from config import get_config
+
+    monkeypatch.setenv("ORDER_MAX_LINES", "3")
+    get_config.cache_clear()
+    yield 3
+    monkeypatch.undo()
+    get_config.cache_clear()
+
+
+def test_oversized_bodies_are_rejected(client):
+    """
+    Test case for declared and streamed bodies over the limit being answered with 413.
+    """
+    assert client.post("/orders", data=b"x" * 100).text == "100"
+
+    response = client.post("/orders", data=b"x" * 101)
+    assert response.status_code == 413
+    assert response.json() == "Request body is larger than 100 bytes"
+
+    # Without Content-Length the body is counted as it is read
+    response = client.post("/orders", data=(chunk for chunk in [b"x" * 60, b"x" * 60]))
+    assert response.status_code == 413
+
+    # A body within the limit reaches the route in full, however it was sent
+    assert client.post("/orders", data=(chunk for chunk in [b"x" * 40, b"x" * 60])).text == "100"
+
+    # Other routes are not limited
+    assert client.post("/products/bulk", data=b"x" * 1000).text == "1000"
+
+
+def test_order_endpoints_reject_oversized_bodies():
+    from config import config
+    from main import app
+
+    client = TestClient(app)
+    chunk = b" " * (config.ORDER_MAX_BODY_BYTES // 2 + 1)
+    response = client.post("/orders", data=(part for part in [chunk, chunk]), headers={"Content-Type": "application/json"})
+    assert response.status_code == 413
+
+    # The batch body is parsed by FastAPI, which must never see the oversized body
+    response = client.post("/orders/batch", data=(part for part in [chunk, chunk]), headers={"Content-Type": "application/json"})
+    assert response.status_code == 413
+    assert response.json() == f"Request body is larger than {config.ORDER_MAX_BODY_BYTES} bytes"
+
+
+def test_order_line_count_is_limited(max_lines):
+    lines = [{"product_id": i, "quantity": 1} for i in range(1, 5)]
+
+    assert len(parse_order_request({"products": lines[:3]})[1]) == 3
+    with pytest.raises(RequestValidationError) as excinfo:
+        parse_order_request({"products": lines})
+    assert excinfo.value.errors()[0]["msg"] == "An order can contain at most 3 lines"
+
+    # Orders inside a batch are held to the same limit
+    with pytest.raises(ValueError):
+        CreateOrderRequest(products=lines)
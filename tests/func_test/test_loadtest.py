@@ -0,0 +1,75 @@
+import pytest
+from benchmarks.loadtest import compare_reports, generate_traffic, percentile, summarize
+
+
+def test_generated_traffic_is_deterministic():
+    mix = {"list": 1, "order": 1}
+    assert generate_traffic(50, mix, 100, seed=1) == generate_traffic(50, mix, 100, seed=1)
+    assert {entry["path"].split("?")[0] for entry in generate_traffic(50, mix, 100, seed=1)} == {"/products", "/orders"}
+
+
+def test_summarize_reports_percentiles_per_route():
+    samples = [("GET /products", 200, ms / 1000) for ms in range(1, 101)] + [("POST /orders", 409, 0.005)]
+    report = summarize(samples, elapsed=2.0)
+
+    products = report["routes"]["GET /products"]
+    assert (products["p50_ms"], products["p95_ms"], products["p99_ms"]) == pytest.approx((50, 95, 99))
+    assert products["throughput_rps"] == 50
+    assert report["routes"]["POST /orders"]["statuses"] == {"409": 1}
+    assert percentile([], 0.5) == 0.0
+
+
+def test_compare_flags_regressions_beyond_threshold():
+    baseline = summarize([("GET /products", 200, 0.010)] * 10, elapsed=1.0)
+    slower = summarize([("GET /products", 200, 0.012)] * 10, elapsed=1.0)
+
+    assert compare_reports(baseline, slower, threshold=10)[1] is True
+    assert compare_reports(baseline, slower, threshold=25)[1] is False
+
+
+def test_traffic_recorder_round_trips_json_and_raw_bodies(tmp_path):
+    """
+    Test case for recorded requests, JSON or not, being replayed with the same body.
+    """
+    import asyncio
+    import httpx
+    from starlette.applications import Starlette
+    from starlette.responses import PlainTextResponse
+    from starlette.routing import Route
+    from benchmarks.loadtest import TrafficRecorder, read_traffic, replay
+
+    received = []
+
+    async def echo(request):
+        received.append((request.headers.get("content-type"), await request.body()))
+        return PlainTextResponse("ok")
+
+    app = Starlette(routes=[Route("/echo", echo, methods=["GET", "POST"])])
+    recorder = TrafficRecorder(app, str(tmp_path / "traffic.jsonl"))
+    requests = [
+        {"method": "POST", "path": "/echo", "json": {"a": 1}},
+        {"method": "POST", "path": "/echo", "data": {"name": "lamp"}},
+        {"method": "POST", "path": "/echo", "content": b"\xff{not json", "headers": {"Content-Type": "application/json"}},
+        {"method": "GET", "path": "/echo?limit=5"},
+    ]
+
+    async def record():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=recorder), base_url="http://test") as client:
+            for request in requests:
+                assert (await client.request(request.pop("method"), request.pop("path"), **request)).status_code == 200
+
+    asyncio.run(record())
+    recorder.close()
+    sent, received[:] = list(received), []
+
+    entries = read_traffic(str(tmp_path / "traffic.jsonl"))
+    assert [entry["path"] for entry in entries] == ["/echo", "/echo", "/echo", "/echo?limit=5"]
+    assert entries[0]["body"] == {"a": 1}
+    assert entries[1]["content_type"] == "application/x-www-form-urlencoded"
+    assert entries[2]["body"] is None
+    assert entries[2]["body_base64"]
+
+    samples = asyncio.run(replay(entries, concurrency=1, app=app))
+    assert [status for _, status, _ in samples] == [200] * 4
+    assert [body for _, body in received] == [body for _, body in sent]
+    assert received[1][0] == "application/x-www-form-urlencoded"
@@ -0,0 +1,71 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+from db import create_db_engine, get_read_session, get_session
+from src.metrics import Histogram, RequestMetrics, RequestStats, request_metrics
+from src.model import Product
+
+
+@pytest.fixture
+def client(database_url):
+    # Test client whose requests run against an instrumented SQLite engine
+    from main import app
+
+    engine = create_db_engine(database_url)
+    with engine.begin() as connection:
+        connection.execute(insert(Product.__table__), [{"name": f"P{i}", "description": "", "price": 1.0, "stock": 5} for i in range(3)])
+    session_factory = sessionmaker(bind=engine)
+
+    def test_session():
+        session = session_factory()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    app.dependency_overrides[get_session] = test_session
+    app.dependency_overrides[get_read_session] = test_session
+    request_metrics.reset()
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+    engine.dispose()
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        histogram.observe(value)
+
+    assert list(histogram.cumulative()) == [(0.1, 1), (1.0, 3), (float("inf"), 4)]
+    assert histogram.count == 4
+
+
+def test_request_metrics_flags_repeated_statements():
+    """
+    Test case for a request running one statement past the threshold being counted as N+1.
+    """
+    metrics = RequestMetrics(n_plus_one_threshold=3)
+    stats = RequestStats()
+    stats.statements["SELECT * FROM products WHERE id = ?"] = 3
+    metrics.request_started()
+    metrics.request_finished("GET", "/orders", 200, 0.01, stats)
+
+    assert metrics.in_flight == 0
+    assert 'http_request_n_plus_one_total{method="GET",route="/orders"} 1' in metrics.render()
+
+
+def test_responses_carry_server_timing_and_are_exposed_on_metrics(client):
+    response = client.get("/products?limit=2")
+    assert response.status_code == 200
+    assert response.headers["server-timing"].startswith("db;dur=")
+    # The catalog version read for the ETag, then the page
+    assert '"2 queries"' in response.headers["server-timing"]
+    client.get("/products/does-not-exist")
+
+    body = client.get("/metrics").text
+    assert 'http_responses_total{method="GET",route="/products",status="200"} 1' in body
+    assert 'http_responses_total{method="GET",route="unmatched",status="404"} 1' in body
+    assert 'http_request_sql_queries_total{method="GET",route="/products"} 2' in body
+    assert 'http_request_duration_seconds_count{method="GET",route="/products"} 1' in body
+    assert "db_pool_checked_out" in body
@@ -0,0 +1,73 @@
+import pytest
+import os
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config as AlembicConfig
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine
+from db import Base
+import src.model  # noqa: F401  registers the models on Base.metadata
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../'))
+
+
+@pytest.fixture
+def alembic_config(tmp_path):
+    database_url = f"sqlite:///{tmp_path / 'migrations.db'}"
+    alembic_config = AlembicConfig(os.path.join(ROOT, "alembic.ini"))
+    alembic_config.set_main_option("script_location", os.path.join(ROOT, "alembic"))
+    alembic_config.set_main_option("sqlalchemy.url", database_url)
+    return alembic_config
+
+
+def test_migrations_match_models(alembic_config):
+    """
+    Test case for the migration history producing exactly the schema declared by the models.
+    """
+    command.upgrade(alembic_config, "head")
+
+    engine = create_engine(alembic_config.get_main_option("sqlalchemy.url"))
+    with engine.connect() as connection:
+        diff = compare_metadata(MigrationContext.configure(connection), Base.metadata)
+    engine.dispose()
+
+    assert diff == []
+
+
+def test_migrations_downgrade_to_base(alembic_config):
+    command.upgrade(alembic_config, "head")
+    command.downgrade(alembic_config, "base")
+    command.upgrade(alembic_config, "head")
+
+
+def test_order_items_backfill_round_trip(alembic_config):
+    """
+    Test case for JSON line items being backfilled in batches and restored on downgrade.
+    """
+    import json
+    from sqlalchemy import text
+
+    command.upgrade(alembic_config, "3c8f27f61f41")
+    engine = create_engine(alembic_config.get_main_option("sqlalchemy.url"))
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO products (id, name, price, stock) VALUES (1, 'A', 2.5, 1), (2, 'B', 4.0, 1)"))
+        for order_id in range(1, 4):
+            connection.execute(
+                text("INSERT INTO orders (id, products, total_price, status) VALUES (:id, :products, 0, 'pending')"),
+                {"id": order_id, "products": '[{"product_id": 1, "quantity": %d}, {"product_id": 2, "quantity": 1}]' % order_id},
+            )
+
+    command.upgrade(alembic_config, "166dff9ea904")
+    with engine.connect() as connection:
+        items = connection.execute(text("SELECT order_id, product_id, quantity, unit_price FROM order_items ORDER BY id")).all()
+    assert [tuple(item) for item in items] == [
+        (1, 1, 1, 2.5), (1, 2, 1, 4.0),
+        (2, 1, 2, 2.5), (2, 2, 1, 4.0),
+        (3, 1, 3, 2.5), (3, 2, 1, 4.0),
+    ]
+
+    command.downgrade(alembic_config, "3c8f27f61f41")
+    with engine.connect() as connection:
+        restored = connection.execute(text("SELECT products FROM orders WHERE id = 2")).scalar()
+    engine.dispose()
+    assert json.loads(restored) == [{"product_id": 1, "quantity": 2}, {"product_id": 2, "quantity": 1}]
@@ -0,0 +1,102 @@
+import pytest
+from datetime import datetime
+from sqlalchemy.dialects import postgresql
+from src.jobs import DatabaseOrderQueue, MemoryOrderQueue
+from src.model import Order, OrderJob, OrderStatus, Product
+from src.request import CreateOrderRequest, OrderLines
+from src.service import OrderService
+from src.worker import OrderWorker
+
+
+@pytest.fixture
+def session_factory(session_factory):
+    # One product in stock, shared by the API side and the worker
+    with session_factory() as session:
+        session.add(Product(id=1, name="Product 1", price=10.0, stock=100))
+        session.commit()
+    return session_factory
+
+
+def place_orders(session_factory, queue, count):
+    orders = [CreateOrderRequest(products=[{"product_id": 1, "quantity": 1}]) for _ in range(count)]
+    with session_factory() as session:
+        OrderService(queue=queue).create_orders(session, orders)
+
+
+def order_statuses(session_factory):
+    with session_factory() as session:
+        return [order.status for order in session.query(Order).order_by(Order.id)]
+
+
+@pytest.mark.parametrize("queue_class", [DatabaseOrderQueue, MemoryOrderQueue])
+def test_worker_completes_queued_orders(session_factory, queue_class):
+    """
+    Test case for orders being accepted as pending and completed by a worker batch.
+    """
+    queue = queue_class(max_attempts=3)
+    place_orders(session_factory, queue, 3)
+    assert order_statuses(session_factory) == [OrderStatus.pending] * 3
+
+    worker = OrderWorker(queue, session_factory, batch_size=2)
+    assert worker.run_once() == 2
+    assert worker.run_once() == 1
+    assert worker.run_once() == 0
+
+    assert order_statuses(session_factory) == [OrderStatus.completed] * 3
+    with session_factory() as session:
+        assert session.query(OrderJob).count() == 0
+
+
+def test_failed_jobs_are_retried_with_backoff_then_given_up(session_factory, mocker):
+    queue = DatabaseOrderQueue(max_attempts=2)
+    place_orders(session_factory, queue, 1)
+    payments = mocker.MagicMock()
+    payments.charge.return_value = False
+    worker = OrderWorker(queue, session_factory, order_service=OrderService(payments=payments))
+
+    assert worker.run_once() == 1
+    with session_factory() as session:
+        job = session.query(OrderJob).one()
+        assert (job.status, job.attempts) == (OrderJob.QUEUED, 1)
+        assert job.available_at > datetime.utcnow()
+        assert "declined" in job.last_error
+        # Not due yet
+        assert worker.run_once() == 0
+        job.available_at = datetime.utcnow()
+        session.commit()
+
+    assert worker.run_once() == 1
+    with session_factory() as session:
+        assert session.query(OrderJob).one().status == OrderJob.FAILED
+    assert order_statuses(session_factory) == [OrderStatus.pending]
+
+
+def test_memory_queue_only_publishes_committed_orders(session_factory):
+    queue = MemoryOrderQueue(max_attempts=3)
+    with session_factory() as session:
+        service = OrderService(queue=queue)
+        products = {1: session.get(Product, 1)}
+        order = OrderLines.from_products(CreateOrderRequest(products=[{"product_id": 1, "quantity": 1}]).products)
+        service._place_order(session, "pending", order, products)
+        session.rollback()
+        assert len(queue) == 0
+
+        with session.begin_nested():
+            service._place_order(session, "pending", order, products)
+        try:
+            with session.begin_nested():
+                service._place_order(session, "pending", order, products)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        session.commit()
+
+    assert len(queue) == 1
+
+
+def test_database_queue_claims_with_skip_locked(mocker):
+    session = mocker.MagicMock()
+    DatabaseOrderQueue(max_attempts=1).claim(session, 5)
+
+    statement = session.execute.call_args[0][0]
+    assert "FOR UPDATE SKIP LOCKED" in str(statement.compile(dialect=postgresql.dialect()))
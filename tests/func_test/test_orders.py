@@ -1,10 +1,8 @@
 import pytest
 from unittest.mock import MagicMock
-import os, sys
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
-from src.service import OrderService
-from src.model import Order,Product
-from src.exception import OrderValidationError
+from src.service import OrderService, ProductService
+from src.model import InventoryChange,Order,OrderItem,OrderStatus,Product
+from src.exception import OrderNotFoundError, OrderValidationError
 
 @pytest.fixture
 def mock_session():
@@ -43,6 +41,7 @@ def test_create_order_success(mock_session, mock_product_service, sample_product
     """
     # Mock ProductService to return the products from the database
     mock_product_service.return_value.get_products_by_ids.return_value = database_products
+    mock_product_service.return_value.reserve_stock.return_value = []
 
     # Initialize OrderService
     service = OrderService()
@@ -56,16 +55,33 @@ def test_create_order_success(mock_session, mock_product_service, sample_product
         mock_session, [1, 2]
     )
 
-    # Ensure that the database products' stock is updated
-    assert database_products[0].stock == 3  # Reduced by 2
-    assert database_products[1].stock == 1  # Reduced by 1
+    # Ensure that stock is reserved in the database rather than mutated in memory
+    mock_product_service.return_value.reserve_stock.assert_called_once_with(mock_session, {1: 2, 2: 1})
+    assert database_products[0].stock == 5
+    assert database_products[1].stock == 2
 
     # Verify that the new order is added to the session
     added_order = mock_session.add.call_args[0][0]
     assert isinstance(added_order, Order)
     assert added_order.status == "Pending"
-    assert added_order.total_price == 130.0  # (2 * 50) + (1 * 30)
-    assert added_order.products == [{"product_id": 1, "quantity": 2}, {"product_id": 2, "quantity": 1}]
+
+    # Verify that the line items are written with a single multi-row insert
+    mock_session.flush.assert_called_once()
+    statement, items = mock_session.execute.call_args_list[-3][0]
+    assert statement.table is OrderItem.__table__
+    assert items == [
+        {"order_id": added_order.id, "product_id": 1, "quantity": 2, "unit_price": 50.0},
+        {"order_id": added_order.id, "product_id": 2, "quantity": 1, "unit_price": 30.0},
+    ]
+
+    # The total is summed by the database from the written items, in cents
+    (total,) = mock_session.execute.call_args_list[-2][0]
+    assert total.table is Order.__table__
+    assert "sum(order_items.unit_price_cents * order_items.quantity)" in str(total)
+
+    # The stock taken is logged from the written items in the same transaction
+    (change_log,) = mock_session.execute.call_args[0]
+    assert change_log.table is InventoryChange.__table__
 
     # Ensure the session was committed
     mock_session.commit.assert_called_once()
@@ -98,11 +114,10 @@ def test_create_order_out_of_stock_failure(mock_session, mock_product_service, s
     """
     Test case for failure when a product is out of stock.
     """
-    # Reduce the stock of one product to cause an out-of-stock error
-    database_products[1].stock = 0  # Product ID 2 is out of stock
-
     # Mock ProductService to return the products from the database
     mock_product_service.return_value.get_products_by_ids.return_value = database_products
+    # Product ID 2 is out of stock, so its conditional update does not match
+    mock_product_service.return_value.reserve_stock.return_value = [2]
 
     # Initialize OrderService
     service = OrderService()
@@ -116,3 +131,188 @@ def test_create_order_out_of_stock_failure(mock_session, mock_product_service, s
     mock_product_service.return_value.get_products_by_ids.assert_called_once_with(
         mock_session, [1, 2]
     )
+    mock_session.commit.assert_not_called()
+
+
+@pytest.fixture
+def store_session(session):
+    # Real SQLite session with two products for batch order tests
+    session.add_all([
+        Product(id=1, name="Product 1", price=50.0, stock=5),
+        Product(id=2, name="Product 2", price=30.0, stock=2),
+    ])
+    session.commit()
+    return session
+
+
+def batch_of(*orders):
+    from src.request import CreateOrderRequest
+
+    return [
+        CreateOrderRequest(status="pending", products=[{"product_id": p, "quantity": q} for p, q in lines])
+        for lines in orders
+    ]
+
+
+def test_create_orders_partial_success(store_session, mocker):
+    """
+    Test case for a batch where failing orders are rolled back to their savepoint only.
+    """
+    lookup = mocker.spy(ProductService, "get_products_by_ids")
+    orders = batch_of([(1, 2), (2, 1)], [(2, 2)], [(3, 1)], [(1, 3), (2, 1)])
+
+    results = OrderService().create_orders(store_session, orders)
+
+    assert results == [
+        {"index": 0, "status": "created", "order_id": 1},
+        {"index": 1, "status": "failed", "error": "Products [2] are out of stock"},
+        {"index": 2, "status": "failed", "error": "Product 3 not found"},
+        {"index": 3, "status": "created", "order_id": 2},
+    ]
+    lookup.assert_called_once()
+    assert [product.stock for product in store_session.query(Product).order_by(Product.id)] == [0, 0]
+    # (2 * 50) + (1 * 30) and (3 * 50) + (1 * 30), summed by the database
+    assert [order.total_price for order in store_session.query(Order).order_by(Order.id)] == [130.0, 180.0]
+    assert store_session.query(OrderItem).count() == 4
+
+
+def test_create_orders_atomic_failure(store_session):
+    """
+    Test case for an atomic batch failing as a whole when one order is invalid.
+    """
+    with pytest.raises(OrderValidationError) as excinfo:
+        OrderService().create_orders(store_session, batch_of([(1, 2)], [(2, 3)]), atomic=True)
+    store_session.rollback()
+
+    assert excinfo.value.message == "Order 1: Products [2] are out of stock"
+    assert [product.stock for product in store_session.query(Product).order_by(Product.id)] == [5, 2]
+    assert store_session.query(Order).count() == 0
+
+
+def test_large_order_total_is_exact(store_session):
+    """
+    Test case for thousands of order lines adding up to an exact total stored in cents.
+    """
+    from sqlalchemy import text
+
+    store_session.add(Product(id=3, name="Product 3", price=0.1, stock=5000))
+    store_session.commit()
+
+    OrderService().create_orders(store_session, batch_of([(3, 1)] * 3000), atomic=True)
+
+    # Summing 0.1 three thousand times in floats gives 299.9999999999997
+    assert store_session.query(Order.total_price).scalar() == 300.0
+    assert store_session.execute(text("SELECT total_price_cents FROM orders")).scalar() == 30000
+    assert store_session.execute(text("SELECT SUM(unit_price_cents * quantity) FROM order_items")).scalar() == 30000
+
+
+@pytest.fixture
+def order_history(store_session):
+    # Five orders a minute apart, alternating status, each with one line item
+    from datetime import datetime, timedelta
+
+    start = datetime(2026, 1, 1)
+    for i in range(5):
+        order = Order(
+            id=i + 1,
+            status=OrderStatus.pending if i % 2 == 0 else OrderStatus.completed,
+            total_price=50.0,
+            created_at=start + timedelta(minutes=i),
+        )
+        store_session.add(order)
+        store_session.flush()
+        store_session.add(OrderItem(order_id=order.id, product_id=1, quantity=1, unit_price=50.0))
+    store_session.commit()
+    return store_session
+
+
+def test_list_orders_keyset_pages_by_status(order_history):
+    """
+    Test case for walking pending orders newest first with the returned cursor.
+    """
+    from src.request import OrderQueryRequest
+
+    first_page, cursor = OrderService().list_orders(order_history, OrderQueryRequest(status="pending", limit=2))
+    assert [order["id"] for order in first_page] == [5, 3]
+    assert "items" not in first_page[0]
+
+    second_page, cursor = OrderService().list_orders(
+        order_history, OrderQueryRequest(status="pending", limit=2, cursor=cursor)
+    )
+    assert [order["id"] for order in second_page] == [1]
+    assert cursor is None
+
+
+def test_list_orders_filters_by_creation_time_and_includes_items(order_history):
+    from datetime import datetime
+    from src.request import OrderQueryRequest
+
+    filters = OrderQueryRequest(
+        created_after=datetime(2026, 1, 1, 0, 1), created_before=datetime(2026, 1, 1, 0, 3), include_items=True
+    )
+    orders, _ = OrderService().list_orders(order_history, filters)
+
+    assert [order["id"] for order in orders] == [3, 2]
+    assert orders[0]["items"] == [{"product_id": 1, "quantity": 1, "unit_price": 50.0}]
+
+
+def test_get_order(order_history):
+    order = OrderService().get_order(order_history, 2)
+    assert order["status"] == "completed"
+    assert len(order["items"]) == 1
+
+    with pytest.raises(OrderNotFoundError):
+        OrderService().get_order(order_history, 99)
+
+
+def test_parse_order_request_merges_lines_in_one_pass(mocker):
+    """
+    Test case for well-formed order bodies skipping per-line model validation.
+    """
+    from src.request import CreateOrderRequest, Status, parse_order_request
+
+    model = mocker.spy(CreateOrderRequest, "parse_obj")
+    status, lines = parse_order_request({"products": [
+        {"product_id": 2, "quantity": 1},
+        {"product_id": 1, "quantity": 2},
+        {"product_id": 2, "quantity": 3},
+    ]})
+
+    assert status == Status.pending
+    assert (lines.product_ids, lines.quantities) == ([2, 1], [4, 2])
+    model.assert_not_called()
+
+    # Values needing coercion are left to the model and end up the same
+    status, lines = parse_order_request({"status": "completed", "products": [{"product_id": "2", "quantity": 1.0}]})
+    assert status == Status.completed
+    assert (lines.product_ids, lines.quantities) == ([2], [1])
+    model.assert_called_once()
+
+
+def test_parse_order_request_reports_model_errors():
+    from fastapi.exceptions import RequestValidationError
+    from src.request import parse_order_request
+
+    with pytest.raises(RequestValidationError) as excinfo:
+        parse_order_request({"products": [{"product_id": 1, "quantity": 1}, {"product_id": 1, "quantity": -1}]})
+    assert excinfo.value.errors() == [
+        {"loc": ("body", "products", 1, "__root__"), "msg": "Quantity cannot be negative", "type": "value_error"}
+    ]
+
+    with pytest.raises(RequestValidationError) as excinfo:
+        parse_order_request({"products": [{"product_id": 1, "quantity": 2 ** 31 - 1}, {"product_id": 1, "quantity": 1}]})
+    assert excinfo.value.errors()[0]["msg"] == "Total quantity of product 1 is too large"
+
+
+@pytest.mark.parametrize("status", [[], {}, ["pending"], 1])
+def test_create_order_rejects_non_string_status(status):
+    """
+    Test case for a status that is not a string being a 422 validation error, not a 500.
+    """
+    from fastapi.testclient import TestClient
+    from main import app
+
+    response = TestClient(app).post("/orders", json={"status": status, "products": [{"product_id": 1, "quantity": 1}]})
+
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["body", "status"]
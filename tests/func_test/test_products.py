@@ -1,11 +1,8 @@
 import pytest
 from unittest.mock import MagicMock
-import os, sys
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
-
 from src.service import ProductService
 from src.model import Product
-from src.schema import ProductSchema 
+from src.schema import ProductSchema, product_columns
 from src.exception import ProductNameDuplicateError
 @pytest.fixture
 def mock_session():
@@ -15,10 +12,10 @@ def mock_session():
 
 @pytest.fixture
 def sample_products():
-    # Return a list of sample Product instances
+    # Return sample product rows as selected by the column-based read path
     return [
-        Product(name="Product 1", price=10.0),
-        Product(name="Product 2", price=20.0),
+        (1, "Product 1", None, 10.0, 5),
+        (2, "Product 2", None, 20.0, 3),
     ]
 
 def test_get_all_products(mock_session, sample_products):
@@ -34,7 +31,7 @@ def test_get_all_products(mock_session, sample_products):
     assert result[1]["price"] == 20.0  # Check product price
     
     # Ensure the session query method was called correctly
-    mock_session.query.assert_called_once_with(Product)
+    mock_session.query.assert_called_once_with(*product_columns())
     mock_session.query.return_value.all.assert_called_once()
 
 def test_get_all_products_failure(mock_session):
@@ -48,7 +45,7 @@ def test_get_all_products_failure(mock_session):
 
     # Assertions for failure case
     assert result == []  # Expecting an empty list
-    mock_session.query.assert_called_once_with(Product)
+    mock_session.query.assert_called_once_with(*product_columns())
     mock_session.query.return_value.all.assert_called_once()
 
 
@@ -65,7 +62,7 @@ def test_get_all_products_exception_handling(mock_session):
 
     # Assertions for exception handling
     assert str(excinfo.value) == "Database connection error"
-    mock_session.query.assert_called_once_with(Product)
+    mock_session.query.assert_called_once_with(*product_columns())
 
 
 @pytest.fixture
@@ -86,9 +83,6 @@ def test_create_product_success(mock_session, sample_product):
     """
     service = ProductService()
 
-    # Mock the query to simulate no existing product with the same name
-    mock_session.query.return_value.filter.return_value.first.return_value = None
-
     # Mock adding and committing the product
     mock_session.add.return_value = None
     mock_session.commit.return_value = None
@@ -112,16 +106,20 @@ def test_create_product_success(mock_session, sample_product):
     assert added_product.price == sample_product.price
     assert added_product.stock == sample_product.stock
     mock_session.commit.assert_called_once()
+    # Duplicates are detected by the unique index, not by a lookup before the insert
+    mock_session.query.assert_not_called()
 
 
 def test_create_product_duplicate_name_failure(mock_session, sample_product):
     """
     Test case for failure when a product with the same name already exists.
     """
+    from sqlalchemy.exc import IntegrityError
+
     service = ProductService()
 
-    # Mock the query to simulate an existing product with the same name
-    mock_session.query.return_value.filter.return_value.first.return_value = sample_product
+    # Mock the commit to simulate the unique index on the name rejecting the insert
+    mock_session.commit.side_effect = IntegrityError("INSERT INTO products", {}, Exception("UNIQUE constraint failed: products.name"))
 
     # Call the method and expect a ProductNameDuplicateError
     with pytest.raises(ProductNameDuplicateError) as excinfo:
@@ -132,7 +130,236 @@ def test_create_product_duplicate_name_failure(mock_session, sample_product):
     # Assertions
     assert str(excinfo.value) == "Product with same name already exists"
 
-    # Ensure query was called and no product was added or committed
-    mock_session.query.assert_called_once()
-    mock_session.add.assert_not_called()
-    mock_session.commit.assert_not_called()
\ No newline at end of file
+    # Ensure the failed insert was rolled back without a lookup query
+    mock_session.query.assert_not_called()
+    mock_session.commit.assert_called_once()
+    mock_session.rollback.assert_called_once()
+
+
+def test_create_product_duplicate_name_is_rejected_by_index(catalog_session):
+    """
+    Test case for the unique index on products.name rejecting duplicate names.
+    """
+    with pytest.raises(ProductNameDuplicateError):
+        ProductService().create_product(catalog_session, "Product 1", "Duplicate", 1.0, 1)
+
+    assert catalog_session.query(Product).filter(Product.name == "Product 1").count() == 1
+    assert ProductService().create_product(catalog_session, "Product 11", "New", 1.0, 1)["id"] == 12
+
+@pytest.fixture
+def catalog_session(session):
+    # Real SQLite session seeded with a small catalog for query tests
+    session.add_all(
+        Product(name=f"Product {i}", description=f"Item {i}", price=float(i * 10), stock=i % 3)
+        for i in range(1, 11)
+    )
+    session.add(Product(name="Rug_1", description="Rug", price=5.0, stock=1))
+    session.commit()
+    return session
+
+
+def test_get_products_page_keyset_pagination(catalog_session):
+    """
+    Test case for walking the catalog page by page with the keyset cursor.
+    """
+    from src.request import ProductQueryRequest
+
+    seen = []
+    after_id = None
+    while True:
+        page, after_id = ProductService().get_products_page(
+            catalog_session, ProductQueryRequest(after_id=after_id, limit=4)
+        )
+        seen.extend(product["id"] for product in page)
+        if after_id is None:
+            break
+
+    assert seen == list(range(1, 12))
+
+
+def test_get_products_page_filters_and_fields(catalog_session):
+    """
+    Test case for price range, stock and name prefix filters with sparse fields.
+    """
+    from src.request import ProductQueryRequest
+
+    filters = ProductQueryRequest(min_price=20, max_price=80, in_stock=True, name_prefix="Product", fields="id,stock")
+    page, next_after_id = ProductService().get_products_page(catalog_session, filters)
+
+    assert next_after_id is None
+    assert page == [
+        {"id": 2, "stock": 2},
+        {"id": 4, "stock": 1},
+        {"id": 5, "stock": 2},
+        {"id": 7, "stock": 1},
+        {"id": 8, "stock": 2},
+    ]
+
+
+def test_price_filters_round_sub_cent_bounds_inwards(catalog_session):
+    """
+    Test case for sub-cent price bounds never admitting a price outside the requested range.
+    """
+    from src.request import ProductQueryRequest
+
+    catalog_session.add(Product(name="Boundary", price=3.25, stock=1))
+    catalog_session.commit()
+
+    def names(**bounds):
+        page, _ = ProductService().get_products_page(catalog_session, ProductQueryRequest(name_prefix="Boundary", **bounds))
+        return [product["name"] for product in page]
+
+    assert names(max_price=3.245) == []
+    assert names(max_price=3.25) == ["Boundary"]
+    assert names(min_price=3.255) == []
+    assert names(min_price=3.245) == ["Boundary"]
+
+
+@pytest.mark.parametrize("query, message", [
+    ("min_price=inf", "min_price must be a finite number"),
+    ("min_price=nan", "min_price must be a finite number"),
+    ("max_price=-Infinity", "max_price must be a finite number"),
+    ("max_price=1e300", "max_price is too large"),
+    ("min_price=92233720368547758.08", "min_price is too large"),
+])
+def test_unstorable_price_filters_are_rejected(query, message):
+    """
+    Test case for non-finite prices and prices beyond BIGINT cents being a 422, not a 500.
+    """
+    from fastapi.testclient import TestClient
+    from main import app
+
+    response = TestClient(app).get(f"/products?{query}")
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["msg"] == message
+
+
+@pytest.mark.parametrize("price, message", [
+    ("1e300", "price is too large"),
+    ("Infinity", "price must be a finite number"),
+    ("NaN", "price must be a finite number"),
+])
+def test_unstorable_product_prices_are_rejected(price, message):
+    from fastapi.testclient import TestClient
+    from main import app
+
+    body = '{"name": "Huge", "description": "", "price": %s, "stock": 1}' % price
+    response = TestClient(app).post("/products", data=body, headers={"Content-Type": "application/json"})
+    assert response.status_code == 422
+    assert response.json()["detail"] == [{"loc": ["body", "price"], "msg": message, "type": "value_error"}]
+
+
+def test_get_products_page_name_prefix_is_escaped(catalog_session):
+    """
+    Test case for LIKE wildcards in the name prefix being matched literally.
+    """
+    from src.request import ProductQueryRequest
+
+    page, _ = ProductService().get_products_page(catalog_session, ProductQueryRequest(name_prefix="Rug_"))
+    assert [product["name"] for product in page] == ["Rug_1"]
+    page, _ = ProductService().get_products_page(catalog_session, ProductQueryRequest(name_prefix="Product_"))
+    assert page == []
+
+
+def test_stream_products_ndjson(catalog_session, mocker):
+    """
+    Test case for streaming the catalog as NDJSON in bounded batches.
+    """
+    import json
+    from src.request import ProductQueryRequest
+
+    mocker.patch.object(ProductService, "STREAM_BATCH_SIZE", 3)
+    chunks = list(ProductService().stream_products(catalog_session, ProductQueryRequest(fields="id")))
+
+    assert len(chunks) == 4
+    rows = [json.loads(line) for chunk in chunks for line in chunk.splitlines()]
+    assert rows == [{"id": i} for i in range(1, 12)]
+
+    rows = [json.loads(line) for chunk in ProductService().stream_products(catalog_session, ProductQueryRequest(fields="id,price")) for line in chunk.splitlines()]
+    assert rows[:2] == [{"id": 1, "price": catalog_session.get(Product, 1).price}, {"id": 2, "price": catalog_session.get(Product, 2).price}]
+
+
+def test_product_rows_match_product_schema(catalog_session):
+    """
+    Test case for the column-based serializer producing the same JSON as ProductSchema.
+    """
+    import json
+    from fastapi.responses import JSONResponse, ORJSONResponse
+    from src.request import ProductQueryRequest
+
+    catalog_session.add(Product(name="Caf\u00e9 \u2615", description=None, price=0.1, stock=0))
+    catalog_session.commit()
+    expected = JSONResponse(content=ProductSchema(many=True).dump(catalog_session.query(Product).order_by(Product.id).all())).body
+
+    page, _ = ProductService().get_products_page(catalog_session, ProductQueryRequest())
+    assert ORJSONResponse(content=page).body == expected
+
+    page, _ = ProductService().get_products_page(catalog_session, ProductQueryRequest(fields="price,name"))
+    assert page == json.loads(
+        JSONResponse(content=ProductSchema(many=True, only=["price", "name"]).dump(catalog_session.query(Product).all())).body
+    )
+    assert list(page[0]) == ["price", "name"]
+
+
+def test_import_products_reports_rejected_rows(catalog_session):
+    """
+    Test case for bulk import inserting valid rows and reporting the rest per row.
+    """
+    rows = [
+        {"name": "New 1", "description": "First", "price": "12.5", "stock": "4"},
+        {"name": "Product 1", "description": "Clashes with the catalog", "price": 1, "stock": 1},
+        {"name": "New 1", "description": "Clashes with the upload", "price": 1, "stock": 1},
+        {"name": "New 2", "description": "Negative", "price": -1, "stock": 1},
+        {"name": "New 3", "description": "Bad stock", "price": 1, "stock": "many"},
+        ValueError("Invalid JSON"),
+        {"name": "New 4", "description": "", "price": 0, "stock": 0},
+        {"name": "New 5", "description": "Sub-cent", "price": "1.005", "stock": 1},
+    ]
+
+    inserted, errors = ProductService().import_products(catalog_session, rows, start_index=100)
+
+    assert inserted == 2
+    assert errors == [
+        {"index": 101, "error": "Product with same name already exists"},
+        {"index": 102, "error": "Duplicate product name in upload"},
+        {"index": 103, "error": "Price cannot be negative"},
+        {"index": 104, "error": "stock: value is not a valid integer"},
+        {"index": 105, "error": "Invalid JSON"},
+        {"index": 107, "error": "Price cannot have more than 2 decimal places"},
+    ]
+    imported = catalog_session.query(Product).filter(Product.name.in_(["New 1", "New 4"])).order_by(Product.id).all()
+    assert [(product.name, product.price, product.stock) for product in imported] == [("New 1", 12.5, 4), ("New 4", 0.0, 0)]
+
+
+def test_bulk_upload_parsers():
+    """
+    Test case for the streaming NDJSON and csv upload parsers splitting records across chunks.
+    """
+    import asyncio
+    from src.request import iter_csv_rows, iter_lines, iter_ndjson_rows
+
+    async def stream(*chunks):
+        for chunk in chunks:
+            yield chunk
+
+    async def collect(rows):
+        return [row async for row in rows]
+
+    ndjson_rows = asyncio.run(collect(iter_ndjson_rows(stream(b'{"name": "a"}\n{"na', b'me": "b"}\n\nnot json\n'))))
+    assert ndjson_rows[:2] == [{"name": "a"}, {"name": "b"}]
+    assert isinstance(ndjson_rows[2], ValueError)
+
+    csv_rows = asyncio.run(collect(iter_csv_rows(stream(b'name,description,price,stock\r\na,"two\n', b'lines",1.5,2\r\nb,,3,4'))))
+    assert csv_rows == [
+        {"name": "a", "description": "two\nlines", "price": "1.5", "stock": "2"},
+        {"name": "b", "description": "", "price": "3", "stock": "4"},
+    ]
+
+    # A line that is not UTF-8 is reported in its place and the upload carries on
+    csv_rows = asyncio.run(collect(iter_csv_rows(stream(b'name,description,price,stock\nCaf\xe9,,1,1\nb,,3,4\n'))))
+    assert isinstance(csv_rows[0], ValueError)
+    assert csv_rows[1] == {"name": "b", "description": "", "price": "3", "stock": "4"}
+
+    # One line arriving over many chunks is joined back exactly once
+    lines = asyncio.run(collect(iter_lines(stream(*[b"x" * 10] * 1000, b"\nend"))))
+    assert lines == [b"x" * 10000, b"end"]
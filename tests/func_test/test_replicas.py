@@ -0,0 +1,87 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert
+import db
+from db import Base, ReplicaSet
+from src.model import Product
+
+
+def seed(url, names):
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(Product.__table__), [{"name": name, "description": "", "price": 1.0, "stock": 5} for name in names])
+    engine.dispose()
+
+
+@pytest.fixture
+def replicated(tmp_path, monkeypatch):
+    # A primary and a replica holding different rows, so responses show which one served them
+    primary_url = f"sqlite:///{tmp_path / 'primary.db'}"
+    replica_url = f"sqlite:///{tmp_path / 'replica.db'}"
+    seed(primary_url, ["primary"])
+    seed(replica_url, ["replica"])
+    monkeypatch.setenv("DATABASE_URL", primary_url)
+    monkeypatch.setenv("REPLICA_DATABASE_URLS", replica_url)
+    monkeypatch.setenv("CACHE_BACKEND", "none")
+    db.reset_engines()
+    from src.cache import get_catalog_cache
+    get_catalog_cache.cache_clear()
+    yield tmp_path
+    monkeypatch.undo()
+    db.reset_engines()
+    get_catalog_cache.cache_clear()
+
+
+def product_names(response):
+    assert response.status_code == 200
+    return [product["name"] for product in response.json()]
+
+
+def test_reads_use_replica_until_client_writes(replicated):
+    from main import app
+
+    client = TestClient(app)
+    assert product_names(client.get("/products?limit=10")) == ["replica"]
+
+    response = client.post("/products", json={"name": "new", "description": "", "price": 2.0, "stock": 1})
+    assert response.status_code == 200
+    assert db.READ_PRIMARY_COOKIE in response.cookies
+
+    # Read-your-writes: this client now reads from the primary, which has its new product
+    assert product_names(client.get("/products?limit=10")) == ["primary", "new"]
+    assert product_names(TestClient(app).get("/products?limit=10")) == ["replica"]
+
+
+def test_writes_and_locking_reads_go_to_primary(replicated):
+    session = db.get_session_factory()()
+    session.info["replica"] = db.get_replica_set().pick()
+    try:
+        assert [p.name for p in session.query(Product).all()] == ["replica"]
+        assert [p.name for p in session.query(Product).with_for_update().all()] == ["primary"]
+        session.add(Product(name="written", description="", price=1.0, stock=1))
+        session.commit()
+    finally:
+        session.close()
+
+    with create_engine(f"sqlite:///{replicated / 'primary.db'}").connect() as connection:
+        assert connection.exec_driver_sql("SELECT count(*) FROM products WHERE name = 'written'").scalar() == 1
+
+
+def test_replica_set_skips_unhealthy_and_lagging_replicas(tmp_path, mocker):
+    """
+    Test case for round-robin routing over the replicas that pass the health check.
+    """
+    healthy = [create_engine(f"sqlite:///{tmp_path / name}") for name in ("a.db", "b.db")]
+    broken = create_engine(f"sqlite:///{tmp_path / 'missing' / 'c.db'}")
+    replicas = ReplicaSet(healthy + [broken], max_lag=5, check_interval=60)
+
+    assert [replicas.pick() for _ in range(4)] == healthy * 2
+
+    lags = {healthy[0]: 30.0, healthy[1]: 0.0, broken: 0.0}
+    mocker.patch.object(db, "replica_lag", side_effect=lags.get)
+    assert replicas.check() == [healthy[1], broken]
+
+    mocker.patch.object(db, "replica_lag", side_effect=Exception("down"))
+    replicas.check()
+    assert replicas.pick() is None
@@ -0,0 +1,101 @@
+import pytest
+from unittest.mock import MagicMock
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql
+from src.model import Product
+from src.request import ProductSearchRequest
+from src.search import InvertedIndex, ProductSearchService
+
+CATALOG = [
+    (1, "Red Shoes", "Leather running shoes"),
+    (2, "Blue Shirt", "Cotton shirt, red stitching"),
+    (3, "Shoe Polish", "Keeps red shoes shiny"),
+    (4, "Redwood Table", "Solid wood"),
+    (5, "Toolshed", "Garden storage"),
+]
+
+
+@pytest.fixture
+def client(engine, app_client):
+    with engine.begin() as connection:
+        connection.execute(insert(Product.__table__), [
+            {"id": product_id, "name": name, "description": description, "price": 1.0, "stock": 1}
+            for product_id, name, description in CATALOG
+        ])
+    return app_client
+
+
+def test_inverted_index_ranks_prefix_and_full_text_matches():
+    ranks = InvertedIndex(CATALOG).search("red sho")
+
+    # Name matches outrank description matches; a name starting with the query ranks first
+    assert sorted(ranks, key=lambda product_id: (-ranks[product_id], product_id)) == [1, 3]
+    assert ranks[1] == pytest.approx(3.0)
+    assert ranks[3] == pytest.approx(1.4)
+    # Names starting with the whole query match even when it ends mid-word
+    assert set(InvertedIndex(CATALOG).search("Toolsh")) == {5}
+
+
+def test_search_endpoint_pages_ranked_results(client):
+    """
+    Test case for keyset pages following the rank order without gaps or repeats.
+    """
+    response = client.get("/products/search?q=red&limit=2&fields=id,name")
+    assert response.status_code == 200
+    assert response.json() == [{"id": 1, "name": "Red Shoes"}, {"id": 4, "name": "Redwood Table"}]
+
+    cursor = response.headers["X-Next-Cursor"]
+    response = client.get(f"/products/search?q=red&limit=2&fields=id&cursor={cursor}")
+    assert response.json() == [{"id": 2}, {"id": 3}]
+    response = client.get(f"/products/search?q=red&limit=2&fields=id&cursor={response.headers['X-Next-Cursor']}")
+    assert response.json() == []
+    assert "X-Next-Cursor" not in response.headers
+
+    assert client.get("/products/search?q=%20-%20").status_code == 422
+    assert client.get("/products/search?q=red&cursor=nope").status_code == 422
+
+
+def test_search_index_follows_catalog_writes(client):
+    assert client.get("/products/search?q=lamp").json() == []
+    response = client.post("/products", json={"name": "Desk Lamp", "description": "", "price": 9.5, "stock": 1})
+    assert response.status_code == 200
+    assert [product["name"] for product in client.get("/products/search?q=lamp").json()] == ["Desk Lamp"]
+
+
+@pytest.mark.parametrize("cache_backend", ["none"])
+def test_search_index_is_rebuilt_only_when_the_catalog_changes(client, engine, mocker):
+    """
+    Test case for the index following the database's catalog version: reused between
+    searches without any cache backend, and rebuilt for a write made by another worker.
+    """
+    from datetime import datetime
+    from src.model import InventoryChange
+
+    builds = mocker.spy(InvertedIndex, "__init__")
+    for _ in range(3):
+        assert client.get("/products/search?q=lamp").json() == []
+    assert builds.call_count == 1
+
+    with engine.begin() as connection:
+        connection.execute(insert(Product.__table__), [{"id": 6, "name": "Floor Lamp", "price": 1.0, "stock": 1}])
+        connection.execute(insert(InventoryChange.__table__), [
+            {"product_id": 6, "reason": "created", "delta": 1, "stock": 1, "created_at": datetime.utcnow()}
+        ])
+    for _ in range(2):
+        assert [product["name"] for product in client.get("/products/search?q=lamp").json()] == ["Floor Lamp"]
+    assert builds.call_count == 2
+
+
+def test_postgresql_search_uses_text_search_and_trigram_match():
+    session = MagicMock()
+    session.get_bind.return_value.dialect.name = "postgresql"
+    session.execute.return_value.all.return_value = []
+
+    ProductSearchService().search(session, ProductSearchRequest(q="red sho", cursor="1.4,3"))
+
+    statement = session.execute.call_args[0][0]
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+    assert "products.search_vector @@ to_tsquery" in sql
+    assert "products.name ILIKE" in sql
+    assert "ORDER BY anon_1.rank DESC, anon_1.cursor_id" in sql
+    assert statement.compile(dialect=postgresql.dialect()).params["to_tsquery_2"] == "red:* & sho:*"
@@ -0,0 +1,22 @@
+import signal
+import time
+import os
+from server import GracefulServer, build_uvicorn_config, worker_count
+
+
+def test_worker_count_defaults_to_cpu_count():
+    assert worker_count(3) == 3
+    assert worker_count(0) == (os.cpu_count() or 1)
+
+
+def test_shutdown_signal_forces_exit_after_drain_timeout():
+    """
+    Test case for open connections being abandoned once the graceful timeout expires.
+    """
+    server = GracefulServer(build_uvicorn_config("127.0.0.1", 0, 1), graceful_timeout=0.05)
+    server.handle_exit(signal.SIGTERM, None)
+
+    assert server.should_exit is True
+    assert server.force_exit is False
+    time.sleep(0.2)
+    assert server.force_exit is True
@@ -0,0 +1,168 @@
+import threading
+import pytest
+from src.model import Order, Product, ProductStockShard
+from src.inventory import StockShardService
+from src.service import OrderService, ProductService
+from src.exception import OrderValidationError
+
+
+class InputProduct:
+    def __init__(self, product_id, quantity):
+        self.product_id = product_id
+        self.quantity = quantity
+
+
+@pytest.fixture
+def session_factory(session_factory):
+    with session_factory() as session:
+        session.add_all([
+            Product(id=1, name="Hot SKU", price=10.0, stock=50),
+            Product(id=2, name="Other SKU", price=5.0, stock=1000),
+        ])
+        session.commit()
+    return session_factory
+
+
+def test_reserve_stock_decrements_atomically(session_factory):
+    """
+    Test case for reservations only succeeding while enough stock is left.
+    """
+    with session_factory() as session:
+        assert ProductService().reserve_stock(session, {2: 10, 1: 50}) == []
+        assert ProductService().reserve_stock(session, {1: 1, 2: 1}) == [1]
+        session.commit()
+        assert [product.stock for product in session.query(Product).order_by(Product.id)] == [0, 989]
+
+
+def test_create_order_aggregates_repeated_products(session_factory):
+    """
+    Test case for the same product listed twice being checked against its combined quantity.
+    """
+    with session_factory() as session:
+        with pytest.raises(OrderValidationError) as excinfo:
+            OrderService().create_order(
+                session, status="pending", products=[InputProduct(1, 30), InputProduct(1, 30)]
+            )
+        session.rollback()
+        assert excinfo.value.message == "Products [1] are out of stock"
+        assert session.get(Product, 1).stock == 50
+
+
+def test_concurrent_orders_never_oversell(session_factory):
+    """
+    Stress test: many threads ordering the same hot SKU must sell exactly the available stock.
+    """
+    attempts_per_thread, threads_count = 25, 16
+    results = {"ok": 0, "out_of_stock": 0, "errors": []}
+    lock = threading.Lock()
+
+    def place_orders():
+        for _ in range(attempts_per_thread):
+            session = session_factory()
+            try:
+                OrderService().create_order(
+                    session, status="pending", products=[InputProduct(2, 1), InputProduct(1, 1)]
+                )
+                outcome = "ok"
+            except OrderValidationError:
+                session.rollback()
+                outcome = "out_of_stock"
+            except Exception as e:
+                session.rollback()
+                outcome = e
+            finally:
+                session.close()
+            with lock:
+                if isinstance(outcome, Exception):
+                    results["errors"].append(outcome)
+                else:
+                    results[outcome] += 1
+
+    threads = [threading.Thread(target=place_orders) for _ in range(threads_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results["errors"] == []
+    assert results["ok"] == 50
+    assert results["out_of_stock"] == attempts_per_thread * threads_count - 50
+    with session_factory() as session:
+        assert session.get(Product, 1).stock == 0
+        assert session.get(Product, 2).stock == 950
+        assert session.query(Order).count() == 50
+
+
+@pytest.fixture
+def sharding(monkeypatch):
+    from config import get_config
+
+    monkeypatch.setenv("STOCK_SHARDING", "true")
+    get_config.cache_clear()
+    yield StockShardService()
+    monkeypatch.undo()
+    get_config.cache_clear()
+
+
+def shard_stocks(session, product_id):
+    return [shard.stock for shard in session.query(ProductStockShard).filter_by(product_id=product_id).order_by(ProductStockShard.shard)]
+
+
+def test_sharded_stock_is_summed_for_reads(session_factory, sharding):
+    from src.request import ProductQueryRequest
+
+    with session_factory() as session:
+        sharding.shard_product(session, 1, 4)
+        session.commit()
+        assert shard_stocks(session, 1) == [13, 13, 12, 12]
+        assert session.get(Product, 1).stock == 0
+
+        products = ProductService().get_all_products(session, ProductQueryRequest(in_stock=True))
+        assert [(product["id"], product["stock"]) for product in products] == [(1, 50), (2, 1000)]
+
+
+def test_sharded_reservation_falls_back_to_draining_all_shards(session_factory, sharding):
+    """
+    Test case for a quantity larger than any single shard still being reserved exactly.
+    """
+    with session_factory() as session:
+        sharding.shard_product(session, 1, 4)
+        assert ProductService().reserve_stock(session, {1: 5, 2: 1}) == []
+        assert sum(shard_stocks(session, 1)) == 45
+
+        assert ProductService().reserve_stock(session, {1: 40}) == []
+        assert sum(shard_stocks(session, 1)) == 5
+        assert ProductService().reserve_stock(session, {1: 6}) == [1]
+        assert sum(shard_stocks(session, 1)) == 5
+
+        assert sharding.rebalance(session, 1) is True
+        assert sorted(shard_stocks(session, 1)) == [1, 1, 1, 2]
+        sharding.unshard_product(session, 1)
+        assert session.get(Product, 1).stock == 5
+        assert shard_stocks(session, 1) == []
+
+
+def test_concurrent_orders_never_oversell_sharded_stock(session_factory, sharding):
+    with session_factory() as session:
+        sharding.shard_product(session, 1, 8)
+        session.commit()
+    sold = []
+
+    def place_orders():
+        for _ in range(10):
+            with session_factory() as session:
+                try:
+                    OrderService().create_order(session, status="pending", products=[InputProduct(1, 1)])
+                    sold.append(1)
+                except OrderValidationError:
+                    session.rollback()
+
+    threads = [threading.Thread(target=place_orders) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(sold) == 50
+    with session_factory() as session:
+        assert shard_stocks(session, 1) == [0] * 8